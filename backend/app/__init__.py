@@ -49,9 +49,11 @@ def register_blueprints(app):
     """Register application blueprints"""
     from .routes.gif_routes import bp as gif_bp
     from .routes.utility_routes import bp as util_bp
+    from .routes.upload_routes import bp as upload_bp
 
     app.register_blueprint(gif_bp)
     app.register_blueprint(util_bp)
+    app.register_blueprint(upload_bp)
 
     app.logger.info("Registered API blueprints")
 
@@ -62,7 +64,20 @@ def register_error_handlers(app):
     register_error_handlers(app)
     app.logger.info("Registered error handlers")
 
-app = create_app()
+def __getattr__(name):
+    # The module-level app is created on first access rather than on import,
+    # so processes that only need app.core (render pool children are started
+    # with spawn and import it afresh) skip logging setup, directory creation
+    # and blueprint registration.
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
+    from .core import jobs
+
+    app = create_app()
+    jobs.ensure_workers()
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 8000)))
@@ -8,11 +8,19 @@ class Config:
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', '/tmp/uploads')
     GIF_OUTPUT_DIR = os.getenv('GIF_OUTPUT_DIR', '/tmp/gifs')
     MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 100 * 1024 * 1024))
+    MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', 2 * 1024 * 1024 * 1024))
     
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
     
     WHISPER_MODEL = os.getenv('WHISPER_MODEL', 'base')
     MAX_VIDEO_DURATION = int(os.getenv('MAX_VIDEO_DURATION', 600))
+    YOUTUBE_INFO_TTL = int(os.getenv('YOUTUBE_INFO_TTL', 300))
+    YOUTUBE_INGEST_MODE = os.getenv('YOUTUBE_INGEST_MODE', 'full')
+    SOURCE_CACHE_DIR = os.getenv('SOURCE_CACHE_DIR', '/tmp/source_cache')
+    SOURCE_CACHE_MAX_BYTES = int(os.getenv('SOURCE_CACHE_MAX_BYTES', 10 * 1024 * 1024 * 1024))
+    SOURCE_RETENTION_HOURS = float(os.getenv('SOURCE_RETENTION_HOURS', 24))
+    FRAME_PROXY_MAX_BYTES = int(os.getenv('FRAME_PROXY_MAX_BYTES', 1024 * 1024 * 1024))
+    FRAME_PROXY_CACHE_BYTES = int(os.getenv('FRAME_PROXY_CACHE_BYTES', 4 * 1024 * 1024 * 1024))
     
     MAX_GIF_DURATION = int(os.getenv('MAX_GIF_DURATION', 15))
     
@@ -21,6 +29,34 @@ class Config:
         int(os.getenv('GIF_RESOLUTION_HEIGHT', 360))
     )
     GIF_FPS = int(os.getenv('GIF_FPS', 12))
+    GIF_RESIZE_MODE = os.getenv('GIF_RESIZE_MODE', 'fit')
+    GIF_ENGINE = os.getenv('GIF_ENGINE', 'moviepy')
+    GIF_ENCODER = os.getenv('GIF_ENCODER', 'palette')
+    GIF_ENCODE_THREADS = int(os.getenv('GIF_ENCODE_THREADS', 4))
+    GIF_DEDUPE_THRESHOLD = float(os.getenv('GIF_DEDUPE_THRESHOLD', 1.5))
+    CAPTION_FONT = os.getenv('CAPTION_FONT', 'arial.ttf')
+    
+    JOB_QUEUE_BACKEND = os.getenv('JOB_QUEUE_BACKEND', 'sqlite')
+    JOB_DB_PATH = os.getenv('JOB_DB_PATH', '/tmp/gif_jobs.sqlite3')
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+    JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1.0))
+    JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', 60))
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 2))
+    JOB_EVENTS_POLL_INTERVAL = float(os.getenv('JOB_EVENTS_POLL_INTERVAL', 0.5))
+    # Each open progress stream holds a web worker thread (gunicorn gthread,
+    # threads=2) for up to this long, so keep it short.
+    JOB_EVENTS_STREAM_SECONDS = float(os.getenv('JOB_EVENTS_STREAM_SECONDS', 15))
+    
+    ADMISSION_DB_PATH = os.getenv('ADMISSION_DB_PATH', '/tmp/gif_admission.sqlite3')
+    ADMISSION_CPU_BUDGET = int(os.getenv('ADMISSION_CPU_BUDGET', 0))
+    ADMISSION_MEMORY_BUDGET = int(os.getenv('ADMISSION_MEMORY_BUDGET', 0))
+    ADMISSION_QUEUE_MAX = int(os.getenv('ADMISSION_QUEUE_MAX', 8))
+    ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 120))
+    ADMISSION_TICKET_LEASE = float(os.getenv('ADMISSION_TICKET_LEASE', 600))
+    
+    RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', 0))
+    RENDER_CPU_BUDGET = int(os.getenv('RENDER_CPU_BUDGET', os.cpu_count() or 1))
+    WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', max(2, (os.cpu_count() or 1) // 2)))
     
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     DEBUG = os.getenv('DEBUG', 'False') == 'True'
@@ -0,0 +1,363 @@
+import os
+import math
+import time
+import sqlite3
+import logging
+from collections import namedtuple
+from contextlib import contextmanager
+import psutil
+from app.config import configuration
+from app.core import media_info, preflight
+from app.services import youtube_service
+from app.utils.error_handlers import OverloadedError
+
+logger = logging.getLogger(__name__)
+
+# What one pipeline run holds while it runs: cores, bytes of memory, and the
+# seconds it is expected to take.
+Cost = namedtuple("Cost", "cpu memory seconds")
+
+GIB = 1024 ** 3
+
+# Per Whisper model family: cores one transcription keeps busy, its peak
+# resident memory, and CPU seconds per second of audio. Rough CPU figures;
+# they only need to rank requests and keep the node out of swap.
+WHISPER_COSTS = {
+    "tiny": (1, 1 * GIB, 0.1),
+    "base": (1, 1.5 * GIB, 0.2),
+    "small": (2, 2.5 * GIB, 0.6),
+    "medium": (4, 5.5 * GIB, 1.8),
+    "turbo": (4, 6 * GIB, 1.0),
+    "large": (4, 10 * GIB, 4.0),
+}
+
+# Download, selection and rendering on top of transcription.
+PIPELINE_OVERHEAD_SECONDS = 20
+
+# Seconds between checks of a queued ticket.
+POLL_INTERVAL = 0.5
+
+# Longest Retry-After sent.
+MAX_RETRY_AFTER = 600
+
+
+def whisper_cost(model_name):
+    """Cost row of a Whisper model name (base, base.en, large-v3, ...); unknown models cost like large."""
+    family = model_name.split(".")[0].split("-")[0]
+    return WHISPER_COSTS.get(family, WHISPER_COSTS["large"])
+
+
+def budgets():
+    """The node's (cores, bytes) budgets; 0 in the config derives them from the machine."""
+    cpu = configuration.ADMISSION_CPU_BUDGET or os.cpu_count() or 1
+    memory = configuration.ADMISSION_MEMORY_BUDGET or int(psutil.virtual_memory().total * 0.75)
+    return cpu, memory
+
+
+def estimate(duration, model_name=None, max_duration=None):
+    """
+    Estimate the cost of running the pipeline over ``duration`` seconds of
+    video with ``model_name`` (WHISPER_MODEL by default). An unknown duration
+    counts as ``max_duration`` (MAX_VIDEO_DURATION by default), the longest
+    the pipeline accepts. A cost is capped at the budgets, so any request can
+    run on an otherwise idle node.
+    """
+    max_duration = configuration.MAX_VIDEO_DURATION if max_duration is None else max_duration
+    duration = min(duration, max_duration) if duration else max_duration
+    cores, memory, seconds_per_second = whisper_cost(model_name or configuration.WHISPER_MODEL)
+    cpu_budget, memory_budget = budgets()
+    return Cost(
+        cpu=min(cores, cpu_budget),
+        memory=min(memory, memory_budget),
+        seconds=duration * seconds_per_second + PIPELINE_OVERHEAD_SECONDS,
+    )
+
+
+def probe_duration(youtube_url=None, video_path=None):
+    """
+    Duration of a request's source without downloading it: the container
+    header of a saved upload, or the YouTube info dict (which the download
+    then reuses from youtube_service's cache). None if it cannot be read;
+    the pipeline reports such sources itself.
+    """
+    try:
+        if video_path:
+            return media_info.probe(video_path, timeout=preflight.HEADER_PROBE_TIMEOUT).duration
+        if youtube_url:
+            return youtube_service.extract_info(youtube_url).get("duration")
+    except Exception as e:
+        logger.info(f"Could not probe the duration for admission: {e}")
+    return None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Ledger:
+    """
+    Node-wide record of admitted work in a local SQLite database
+    (ADMISSION_DB_PATH), so every web worker admits against the same budgets.
+
+    Each admitted request holds a ticket, "running" while it uses its share
+    of the budgets and "queued" while it waits for one. Queued tickets start
+    strictly in order, so large requests are not starved by small ones.
+    Tickets of processes that died are dropped. A background job's ticket
+    belongs to the web worker that submitted it, and lapses after
+    ADMISSION_TICKET_LEASE seconds, until a job worker takes it over.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or configuration.ADMISSION_DB_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS tickets ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, state TEXT NOT NULL,"
+                " cpu REAL NOT NULL, memory INTEGER NOT NULL, seconds REAL NOT NULL,"
+                " pid INTEGER, created_at REAL NOT NULL, started_at REAL)"
+            )
+            if "lease_until" not in {row[1] for row in db.execute("PRAGMA table_info(tickets)")}:
+                db.execute("ALTER TABLE tickets ADD COLUMN lease_until REAL")
+            db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    @contextmanager
+    def _transaction(self):
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            for ticket_id, pid, lease_until in db.execute("SELECT id, pid, lease_until FROM tickets").fetchall():
+                if pid is None or not _alive(pid):
+                    db.execute("DELETE FROM tickets WHERE id = ?", (ticket_id,))
+                    logger.warning(f"Dropped admission ticket {ticket_id} of exited process {pid}")
+                elif lease_until is not None and lease_until < now:
+                    db.execute("DELETE FROM tickets WHERE id = ?", (ticket_id,))
+                    logger.warning(f"Dropped admission ticket {ticket_id}: no job worker took it over")
+            yield db
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _tickets(db):
+        rows = db.execute(
+            "SELECT id, state, cpu, memory, seconds, started_at FROM tickets ORDER BY id"
+        ).fetchall()
+        running = [row for row in rows if row[1] == "running"]
+        queued = [row for row in rows if row[1] == "queued"]
+        return running, queued
+
+    @staticmethod
+    def _count(db, name):
+        db.execute(
+            "INSERT INTO counters VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,)
+        )
+
+    @staticmethod
+    def _fits(running, cpu, memory):
+        cpu_budget, memory_budget = budgets()
+        return (
+            sum(row[2] for row in running) + cpu <= cpu_budget
+            and sum(row[3] for row in running) + memory <= memory_budget
+        )
+
+    @staticmethod
+    def _retry_after(running, cost, now):
+        """
+        Seconds until ``cost`` (the next request to start) fits, assuming
+        running requests end when estimated; overdue ones count as ending now.
+        """
+        cpu_budget, memory_budget = budgets()
+        cpu = sum(row[2] for row in running)
+        memory = sum(row[3] for row in running)
+        wait = 0.0
+        for _, _, ticket_cpu, ticket_memory, seconds, started_at in sorted(running, key=lambda row: row[5] + row[4]):
+            if cpu + cost[0] <= cpu_budget and memory + cost[1] <= memory_budget:
+                break
+            wait = max(wait, started_at + seconds - now)
+            cpu -= ticket_cpu
+            memory -= ticket_memory
+        return min(MAX_RETRY_AFTER, max(1, math.ceil(wait)))
+
+    def admit(self, cost, owned=True):
+        """
+        Start a request costing ``cost`` now if it fits and nothing is queued,
+        else queue it if fewer than ADMISSION_QUEUE_MAX are waiting.
+
+        ``owned`` tickets belong to this process and are dropped if it dies.
+        Pass False for work another process will run (background jobs): the
+        ticket is then also dropped unless a wait() takes it over within
+        ADMISSION_TICKET_LEASE seconds.
+
+        Returns:
+            The ticket ID; wait() for it before running the request.
+
+        Raises:
+            OverloadedError: With the seconds to wait before retrying.
+        """
+        now = time.time()
+        lease_until = None if owned else now + configuration.ADMISSION_TICKET_LEASE
+        retry_after = None
+        with self._transaction() as db:
+            running, queued = self._tickets(db)
+            if not queued and self._fits(running, cost.cpu, cost.memory):
+                state = "running"
+            elif len(queued) < configuration.ADMISSION_QUEUE_MAX:
+                state = "queued"
+            else:
+                # Committed with the counter; raised once the transaction is done.
+                self._count(db, "rejected_queue_full")
+                retry_after = self._retry_after(running, queued[0][2:4], now)
+            if retry_after is None:
+                ticket_id = self._insert(db, state, cost, lease_until)
+        if retry_after is not None:
+            logger.warning(f"Rejected a request: {len(queued)} queued, retry after {retry_after}s")
+            raise OverloadedError(retry_after)
+        return ticket_id
+
+    def _insert(self, db, state, cost, lease_until=None):
+        now = time.time()
+        ticket_id = db.execute(
+            "INSERT INTO tickets (state, cpu, memory, seconds, pid, created_at, started_at, lease_until)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (state, cost.cpu, int(cost.memory), cost.seconds, os.getpid(), now,
+             now if state == "running" else None, lease_until),
+        ).lastrowid
+        self._count(db, "admitted" if state == "running" else "queued")
+        return ticket_id
+
+    def _try_start(self, ticket_id):
+        """
+        Start a queued ticket if it is first in line and fits; returns False
+        while it must wait, and None if the ticket was dropped.
+        """
+        with self._transaction() as db:
+            row = db.execute("SELECT state, cpu, memory, lease_until FROM tickets WHERE id = ?", (ticket_id,)).fetchone()
+            if row is None:
+                return None
+            state, cpu, memory, lease_until = row
+            if lease_until is not None:
+                # A job worker has taken the job over.
+                db.execute("UPDATE tickets SET pid = ?, lease_until = NULL WHERE id = ?", (os.getpid(), ticket_id))
+            if state == "running":
+                return True
+            running, queued = self._tickets(db)
+            if queued[0][0] != ticket_id or not self._fits(running, cpu, memory):
+                return False
+            db.execute(
+                "UPDATE tickets SET state = 'running', started_at = ? WHERE id = ?", (time.time(), ticket_id)
+            )
+            self._count(db, "admitted")
+            return True
+
+    def wait(self, ticket_id, timeout=None, cost=None):
+        """
+        Block until the ticket is running, for at most ``timeout`` seconds.
+
+        A job whose ticket was dropped (its lease lapsed, or the worker
+        running it died) queues again at the back with ``cost``, past
+        ADMISSION_QUEUE_MAX since it was admitted once already.
+
+        Returns:
+            The ID of the running ticket, to release() afterwards.
+
+        Raises:
+            OverloadedError: If it timed out; the ticket is released.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            started = self._try_start(ticket_id)
+            if started is None:
+                if cost is None:
+                    logger.warning(f"Admission ticket {ticket_id} no longer exists; running without it")
+                    return ticket_id
+                with self._transaction() as db:
+                    running, queued = self._tickets(db)
+                    state = "running" if not queued and self._fits(running, cost.cpu, cost.memory) else "queued"
+                    logger.warning(f"Admission ticket {ticket_id} was dropped; queueing again")
+                    ticket_id = self._insert(db, state, cost)
+                continue
+            if started:
+                return ticket_id
+            if deadline is not None and time.monotonic() >= deadline:
+                with self._transaction() as db:
+                    db.execute("DELETE FROM tickets WHERE id = ?", (ticket_id,))
+                    self._count(db, "rejected_wait_timeout")
+                    running, queued = self._tickets(db)
+                    retry_after = self._retry_after(running, queued[0][2:4] if queued else (0, 0), time.time())
+                logger.warning(f"Admission ticket {ticket_id} timed out after {timeout}s in the queue")
+                raise OverloadedError(retry_after)
+            time.sleep(POLL_INTERVAL)
+
+    def release(self, ticket_id):
+        with self._connect() as db:
+            db.execute("DELETE FROM tickets WHERE id = ?", (ticket_id,))
+
+    def stats(self):
+        """Current load and lifetime counters, for metrics."""
+        with self._transaction() as db:
+            running, queued = self._tickets(db)
+            counters = dict(db.execute("SELECT name, value FROM counters").fetchall())
+        cpu_budget, memory_budget = budgets()
+        return {
+            "running": len(running),
+            "queued": len(queued),
+            "queue_max": configuration.ADMISSION_QUEUE_MAX,
+            "cpu_in_use": sum(row[2] for row in running),
+            "cpu_budget": cpu_budget,
+            "memory_in_use": sum(row[3] for row in running),
+            "memory_budget": memory_budget,
+            "counters": counters,
+        }
+
+
+_ledger = None
+_ledger_path = None
+
+
+def get_ledger():
+    """Return the Ledger at ADMISSION_DB_PATH."""
+    global _ledger, _ledger_path
+
+    if _ledger is None or _ledger_path != configuration.ADMISSION_DB_PATH:
+        _ledger = Ledger()
+        _ledger_path = configuration.ADMISSION_DB_PATH
+    return _ledger
+
+
+def request_cost(youtube_url=None, video_path=None, probe_url=True):
+    """
+    Probe a request's source and estimate its cost. With ``probe_url`` False
+    a YouTube source is priced at MAX_VIDEO_DURATION without asking YouTube,
+    for callers that must answer at once.
+    """
+    if youtube_url and not probe_url:
+        return estimate(None)
+    return estimate(probe_duration(youtube_url, video_path))
+
+
+@contextmanager
+def held(ticket_id, timeout=None, cost=None):
+    """Wait for the ticket to start (see Ledger.wait), hold it while the block runs, then release it."""
+    ledger = get_ledger()
+    try:
+        ticket_id = ledger.wait(ticket_id, timeout, cost)
+        yield
+    finally:
+        ledger.release(ticket_id)
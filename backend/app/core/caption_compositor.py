@@ -0,0 +1,75 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class CaptionCompositor:
+    """
+    Alpha-blend a fixed RGBA caption into the bottom band of video frames.
+
+    The caption is premultiplied once at construction and trimmed to the rows that
+    actually contain ink. Each call then blends only those rows of the frame, in
+    place, through a preallocated scratch buffer, so no full-frame arrays are
+    allocated per frame. Frames from media_info.open_video are writable for this;
+    read-only frames (frame proxy views, or frames other readers share) are
+    copied first. Instances keep per-instance scratch state and must not be
+    shared between threads.
+
+    The same frame object passed again is returned as composited the first
+    time, since readers hand out their last frame again for repeated times.
+
+    Usable directly as a moviepy frame transform: ``clip.fl_image(compositor)``.
+    """
+
+    def __init__(self, caption_image, frame_size):
+        """
+        Args:
+            caption_image: RGBA PIL image (or HxWx4 uint8 array) of the caption.
+            frame_size: (width, height) of the frames that will be composited.
+        """
+        frame_width, frame_height = frame_size
+        rgba = np.asarray(caption_image, dtype=np.float32)
+        if rgba.ndim != 3 or rgba.shape[2] != 4:
+            raise ValueError("Caption image must be RGBA")
+
+        # Anchored bottom-centre like the moviepy ImageClip it replaces; anything that
+        # falls outside the frame is cropped.
+        top = frame_height - rgba.shape[0]
+        left = (frame_width - rgba.shape[1]) // 2
+        rgba = rgba[max(0, -top):, max(0, -left):][:, :frame_width]
+        top, left = max(0, top), max(0, left)
+
+        inked_rows = np.flatnonzero(rgba[..., 3].any(axis=1))
+        if inked_rows.size == 0:
+            self._rows = None
+            return
+        first, last = inked_rows[0], inked_rows[-1] + 1
+        rgba = rgba[first:last]
+
+        alpha = rgba[..., 3:4] / 255.0
+        # +0.5 so the unsafe float->uint8 cast on write-back rounds instead of truncating.
+        self._premultiplied = rgba[..., :3] * alpha + 0.5
+        self._inverse_alpha = 1.0 - alpha
+        self._scratch = np.empty_like(self._premultiplied)
+        self._last = (None, None)
+        self._rows = slice(top + first, top + last)
+        self._cols = slice(left, left + rgba.shape[1])
+
+    def __call__(self, frame):
+        """Blend the caption into ``frame`` and return it (copied only if read-only)."""
+        if self._rows is None:
+            return frame
+        last_frame, last_result = self._last
+        if frame is last_frame:
+            return last_result
+        source = frame
+        if not frame.flags.writeable:
+            frame = frame.copy()
+
+        band = frame[self._rows, self._cols]
+        np.multiply(band, self._inverse_alpha, out=self._scratch)
+        np.add(self._scratch, self._premultiplied, out=self._scratch)
+        np.copyto(band, self._scratch, casting="unsafe")
+        self._last = (source, frame)
+        return frame
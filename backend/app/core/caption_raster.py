@@ -0,0 +1,115 @@
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+from app.config import configuration
+
+logger = logging.getLogger(__name__)
+
+WORD_WIDTH_CACHE_SIZE = 8192
+CAPTION_CACHE_SIZE = 128
+
+
+@dataclass(frozen=True)
+class CaptionStyle:
+    """Visual parameters of a caption; hashable so it can be part of cache keys."""
+    font_name: str = configuration.CAPTION_FONT
+    fill: str = "white"
+    stroke_width: int = 2
+    stroke_fill: str = "black"
+    line_spacing: int = 5
+    vertical_padding: int = 10
+
+
+DEFAULT_STYLE = CaptionStyle()
+
+
+@lru_cache(maxsize=32)
+def get_font(font_name, size):
+    """
+    Load a TrueType font once per process for each (font, size) pair.
+    Falls back to Pillow's bundled font at the same size if the font is missing.
+    """
+    try:
+        return ImageFont.truetype(font_name, size)
+    except OSError:
+        logger.warning(f"Font '{font_name}' not found; falling back to default font.")
+        return ImageFont.load_default(size)
+
+
+@lru_cache(maxsize=WORD_WIDTH_CACHE_SIZE)
+def word_width(font, word):
+    """Advance width of a single word (or the space character) in the given font."""
+    return font.getlength(word)
+
+
+def wrap_text(text, font, max_width):
+    """
+    Greedily break text into lines no wider than max_width.
+
+    Each word is measured once (and cached across captions), and line widths are
+    kept as running sums, so wrapping is linear in the number of words. A word that
+    is wider than max_width on its own gets a line to itself.
+    """
+    space = word_width(font, " ")
+    lines = []
+    current_words = []
+    current_width = 0.0
+
+    for word in text.split():
+        width = word_width(font, word)
+        candidate = current_width + space + width if current_words else width
+        if candidate <= max_width or not current_words:
+            current_words.append(word)
+            current_width = candidate
+        else:
+            lines.append(" ".join(current_words))
+            current_words = [word]
+            current_width = width
+    if current_words:
+        lines.append(" ".join(current_words))
+    return lines
+
+
+def caption_font_size(height):
+    """Font size used for captions on a video of the given height."""
+    return max(20, int(height * 0.05))
+
+
+def render_caption(text, video_size, style=DEFAULT_STYLE):
+    """
+    Return the caption for a video of ``video_size`` as an RGBA PIL image.
+
+    Rendered bitmaps are kept in a process-wide LRU keyed by (text, width, font
+    size, style); callers must treat the returned image as read-only.
+    """
+    width, height = video_size
+    return _render_caption_cached(text, int(width), caption_font_size(height), style)
+
+
+@lru_cache(maxsize=CAPTION_CACHE_SIZE)
+def _render_caption_cached(text, width, font_size, style):
+    font = get_font(style.font_name, font_size)
+    lines = wrap_text(text, font, int(width * 0.9))
+
+    line_height = font_size + style.line_spacing
+    text_height = len(lines) * line_height + style.vertical_padding * 2
+
+    text_img = Image.new("RGBA", (width, text_height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(text_img)
+
+    # Lines are centre-anchored, so the first centre sits half a line below the padding.
+    y_text = style.vertical_padding + font_size // 2
+    for line in lines:
+        draw.text(
+            (width // 2, y_text),
+            line,
+            font=font,
+            fill=style.fill,
+            anchor="mm",
+            stroke_width=style.stroke_width,
+            stroke_fill=style.stroke_fill,
+        )
+        y_text += line_height
+
+    return text_img
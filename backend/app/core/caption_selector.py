@@ -39,6 +39,72 @@ def select_key_moments(transcript_segments, theme_prompt, max_moments=3):
         raise CaptionSelectionError(f"Caption selection error: {str(e)}")
 
 
+def select_key_moments_batch(transcript_segments, theme_prompts, max_moments=3):
+    """
+    Select key moments for several themes over one transcript. With Gemini
+    every theme is answered by a single call; themes it returns nothing for
+    fall back to native NLP-based selection, as in select_key_moments.
+
+    Returns:
+        A list in the same order as ``theme_prompts`` of moment lists.
+    """
+    try:
+        if configuration.GEMINI_API_KEY:
+            logger.info(f"Using Gemini for moment selection across {len(theme_prompts)} themes")
+            selected = gemini_service.select_key_moments_batch(
+                transcript_segments,
+                theme_prompts,
+                max_moments
+            )
+        else:
+            logger.info("Using fallback NLP for moment selection")
+            selected = [[] for _ in theme_prompts]
+        for index, theme_prompt in enumerate(theme_prompts):
+            if not selected[index]:
+                if configuration.GEMINI_API_KEY:
+                    logger.warning(f"Gemini returned no moments for '{theme_prompt}', falling back to NLP method.")
+                selected[index] = select_moments_fallback(
+                    transcript_segments,
+                    theme_prompt,
+                    max_moments
+                )
+        return selected
+    except Exception as e:
+        logger.error(f"Moment selection failed: {str(e)}")
+        raise CaptionSelectionError(f"Caption selection error: {str(e)}")
+
+
+def dedupe_moments(theme_prompts, selected, min_overlap=0.5):
+    """
+    Merge the moments chosen for several themes into one list of unique
+    moments, so a moment picked by more than one theme is rendered once.
+
+    Two moments are the same when they overlap by at least ``min_overlap`` of
+    the shorter one; the first one seen (by theme order, then rank) is kept.
+
+    Args:
+        theme_prompts: The themes, in order.
+        selected: Moment lists per theme, as returned by select_key_moments_batch.
+
+    Returns:
+        The unique moments, each a copy with a "themes" list of the prompts
+        that selected it.
+    """
+    unique = []
+    for theme_prompt, moments in zip(theme_prompts, selected):
+        for moment in moments:
+            for kept in unique:
+                overlap = min(kept["end"], moment["end"]) - max(kept["start"], moment["start"])
+                shorter = min(kept["end"] - kept["start"], moment["end"] - moment["start"])
+                if overlap > 0 and overlap >= min_overlap * shorter:
+                    if theme_prompt not in kept["themes"]:
+                        kept["themes"].append(theme_prompt)
+                    break
+            else:
+                unique.append({**moment, "themes": [theme_prompt]})
+    return unique
+
+
 def analyze_transcript_content(transcript, prompt):
     """Analyze transcript content using Gemini if available; else a simple fallback."""
     try:
@@ -0,0 +1,62 @@
+import os
+import logging
+import tempfile
+from app.core import scaling
+from app.utils.ffmpeg_tools import run_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+
+def build_filtergraph(fps, size, scaled_size=None):
+    """
+    Build the filtergraph that scales the source to ``scaled_size`` (letterboxed
+    to ``size`` if they differ), overlays the caption image (second input) along
+    the bottom edge and runs a two-pass palette over the result.
+    """
+    return (
+        f"[0:v]fps={fps},{scaling.scale_filter(scaled_size or size, size)}[base];"
+        "[base][1:v]overlay=0:H-h:format=auto,split[a][b];"
+        "[a]palettegen=stats_mode=diff[palette];"
+        "[b][palette]paletteuse=dither=bayer:bayer_scale=5:diff_mode=rectangle[out]"
+    )
+
+
+def render_gif(video_path, start, end, caption_image, output_path, fps, size, scaled_size=None):
+    """
+    Render a captioned GIF with a single ffmpeg invocation.
+
+    The source is seeked before decoding, trimmed to the requested range, scaled,
+    composited with the pre-rendered caption and palette-quantized entirely inside
+    ffmpeg, so no frames pass through Python.
+
+    Args:
+        video_path: Path to the source video.
+        start: Start time in seconds.
+        end: End time in seconds.
+        caption_image: RGBA PIL image of the caption, as wide as the output.
+        output_path: Where the GIF is written.
+        fps: Output frame rate.
+        size: Output (width, height).
+        scaled_size: Size the source is scaled to before letterboxing to ``size``;
+            defaults to ``size``.
+    """
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
+        caption_path = temp_file.name
+
+    try:
+        caption_image.save(caption_path)
+        run_ffmpeg([
+            "-ss", f"{start:.3f}",
+            "-t", f"{end - start:.3f}",
+            "-i", video_path,
+            "-i", caption_path,
+            "-filter_complex", build_filtergraph(fps, size, scaled_size),
+            "-map", "[out]",
+            "-an",
+            "-loop", "0",
+            output_path,
+        ])
+    finally:
+        os.remove(caption_path)
+
+    return output_path
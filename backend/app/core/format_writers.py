@@ -0,0 +1,136 @@
+import logging
+import numpy as np
+from PIL import Image
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+from app.config import configuration
+from app.core import gif_encoder
+from app.utils.validation import OUTPUT_FORMATS
+
+logger = logging.getLogger(__name__)
+
+WEBP_QUALITY = 75
+WEBP_METHOD = 4
+MP4_CRF = 23
+MP4_PRESET = "veryfast"
+
+
+def extension_for(output_format):
+    return OUTPUT_FORMATS[output_format][0]
+
+
+def mimetype_for(filename):
+    """Mimetype of a generated file, from its extension (GIF if unknown)."""
+    extension = filename.rsplit(".", 1)[-1].lower()
+    for format_extension, mimetype in OUTPUT_FORMATS.values():
+        if extension == format_extension:
+            return mimetype
+    return "image/gif"
+
+
+class PillowAnimationWriter:
+    """
+    Buffering writer for Pillow's animated WebP and APNG encoders, with the same
+    append_data/close interface as the GIF writers.
+
+    Near-duplicate frames are merged into their predecessor's duration exactly as
+    for GIFs, since both formats store a duration per frame.
+    """
+
+    def __init__(self, output_path, fps, output_format, dedupe_threshold=None):
+        self.output_path = output_path
+        self.fps = fps
+        self.output_format = output_format
+        self.dedupe_threshold = (
+            configuration.GIF_DEDUPE_THRESHOLD if dedupe_threshold is None else dedupe_threshold
+        )
+        self._frames = []
+
+    def append_data(self, frame):
+        self._frames.append(np.ascontiguousarray(frame[..., :3], dtype=np.uint8))
+
+    def close(self):
+        if self._frames is None:
+            return
+        frames, self._frames = self._frames, None
+        if not frames:
+            raise ValueError(f"Cannot encode {self.output_format} without frames")
+
+        delays = gif_encoder.frame_delays(len(frames), self.fps)
+        frames, delays, _ = gif_encoder.drop_duplicate_frames(frames, delays, self.dedupe_threshold)
+        images = [Image.fromarray(frame) for frame in frames]
+        options = {"save_all": True, "append_images": images[1:], "duration": [d * 10 for d in delays], "loop": 0}
+        if self.output_format == "webp":
+            images[0].save(self.output_path, format="WEBP", quality=WEBP_QUALITY, method=WEBP_METHOD, **options)
+        else:
+            images[0].save(self.output_path, format="PNG", **options)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._frames = None
+
+
+class Mp4Writer:
+    """
+    Stream frames into a silent H.264 MP4 meant to be played as a muted loop.
+    Frames are piped to ffmpeg as they arrive, so nothing is buffered in memory.
+    """
+
+    def __init__(self, output_path, fps):
+        self.output_path = output_path
+        self.fps = fps
+        self._writer = None
+        self._closed = False
+
+    def append_data(self, frame):
+        frame = np.ascontiguousarray(frame[..., :3], dtype=np.uint8)
+        if self._writer is None:
+            height, width = frame.shape[:2]
+            self._writer = FFMPEG_VideoWriter(
+                self.output_path,
+                (width, height),
+                self.fps,
+                codec="libx264",
+                preset=MP4_PRESET,
+                ffmpeg_params=[
+                    "-crf", str(MP4_CRF),
+                    # yuv420p needs even dimensions.
+                    "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+                    "-pix_fmt", "yuv420p",
+                    "-movflags", "+faststart",
+                ],
+            )
+        self._writer.write_frame(frame)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer is None:
+            raise ValueError("Cannot encode mp4 without frames")
+        writer, self._writer = self._writer, None
+        writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        elif self._writer is not None:
+            self._closed = True
+            self._writer.close()
+            self._writer = None
+
+
+def open_writer(output_path, fps, output_format):
+    """Open an incremental writer for a non-GIF output format."""
+    if output_format == "mp4":
+        return Mp4Writer(output_path, fps)
+    if output_format in ("webp", "apng"):
+        return PillowAnimationWriter(output_path, fps, output_format)
+    raise ValueError(f"Unsupported output format: {output_format}")
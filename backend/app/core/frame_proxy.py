@@ -0,0 +1,228 @@
+import os
+import glob
+import json
+import math
+import fcntl
+import logging
+import threading
+import numpy as np
+from moviepy.editor import VideoClip
+from app.config import configuration
+from app.core import media_info, scaling
+from app.utils.ffmpeg_tools import run_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+FRAMES_SUFFIX = ".frames"
+INDEX_SUFFIX = ".frames.json"
+# Node-wide lock in the upload folder, held while a proxy is built.
+BUILD_LOCK = ".frame_proxy.lock"
+
+# Background builds per process; more would just compete for the same cores.
+_build_slots = threading.BoundedSemaphore(1)
+_building = set()
+_building_lock = threading.Lock()
+
+
+def plan(media):
+    """
+    Frame size, frame rate and byte size of the proxy of a source: frames as
+    the decoder scales them for GIF output (before any letterbox), at GIF_FPS.
+    """
+    scaled_size, _ = scaling.plan_resize(media.display_size)
+    fps = configuration.GIF_FPS
+    frame_count = math.ceil(media.duration * fps) + 1
+    return scaled_size, fps, frame_count * scaled_size[0] * scaled_size[1] * 3
+
+
+class FrameProxy:
+    """
+    A source decoded once at GIF resolution and frame rate into a read-only
+    uint8 memory map of shape (frames, height, width, 3), with the timestamp
+    of every frame. Frames are views into the map, so nothing is decoded or
+    copied to read them; compositing copies a frame before drawing on it,
+    because the views are read-only.
+    """
+
+    def __init__(self, frames, timestamps, fps, duration):
+        self.frames = frames
+        self.timestamps = timestamps
+        self.fps = fps
+        self.size = (frames.shape[2], frames.shape[1])
+        # The source's duration, so clips are trimmed exactly as when decoding it.
+        self.duration = duration
+
+    def frame_at(self, t):
+        """The frame shown at time ``t``: the last one starting at or before it."""
+        index = int(np.searchsorted(self.timestamps, t + 1e-6, side="right")) - 1
+        return self.frames[min(max(index, 0), len(self.frames) - 1)]
+
+    def clip(self):
+        """A moviepy clip over the proxy, usable in place of the source's VideoFileClip."""
+        clip = VideoClip(self.frame_at, duration=self.duration)
+        clip.fps = self.fps
+        return clip
+
+
+def open_proxy(video_path, media=None):
+    """
+    Open the proxy of ``video_path``, or return None if there is none or it
+    no longer matches the source (replaced file) or the GIF settings.
+    Opening counts as use for eviction (see evict).
+    """
+    index_path = video_path + INDEX_SUFFIX
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    media = media or media_info.load(video_path)
+    scaled_size, fps, _ = plan(media)
+    if (
+        index["file_size"] != media.file_size
+        or index["mtime"] != media.mtime
+        or tuple(index["size"]) != tuple(scaled_size)
+        or index["fps"] != fps
+    ):
+        return None
+    width, height = scaled_size
+    try:
+        frames = np.memmap(
+            video_path + FRAMES_SUFFIX, dtype=np.uint8, mode="r", shape=(len(index["timestamps"]), height, width, 3)
+        )
+        os.utime(index_path)
+    except FileNotFoundError:
+        # Evicted since the index was read.
+        return None
+    return FrameProxy(frames, np.asarray(index["timestamps"]), fps, media.duration)
+
+
+def _remove(video_path):
+    # The index goes first, so the proxy stops being opened before its frames go.
+    for suffix in (INDEX_SUFFIX, FRAMES_SUFFIX):
+        try:
+            os.remove(video_path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def evict(root, needed_bytes=0, max_bytes=None):
+    """
+    Delete the least recently used proxies under ``root`` (the upload folder)
+    until their total plus ``needed_bytes`` fits ``max_bytes``
+    (FRAME_PROXY_CACHE_BYTES by default). Renders that already opened an
+    evicted proxy keep reading it; its space is freed when they finish.
+
+    Returns:
+        The number of proxies deleted.
+    """
+    max_bytes = configuration.FRAME_PROXY_CACHE_BYTES if max_bytes is None else max_bytes
+    proxies = []
+    for index_path in glob.glob(os.path.join(glob.escape(root), "*", "*" + INDEX_SUFFIX)):
+        video_path = index_path[:-len(INDEX_SUFFIX)]
+        try:
+            proxies.append((os.path.getmtime(index_path), os.path.getsize(video_path + FRAMES_SUFFIX), video_path))
+        except FileNotFoundError:
+            continue
+    total = sum(size for _, size, _ in proxies)
+    removed = 0
+    for _, size, video_path in sorted(proxies):
+        if total + needed_bytes <= max_bytes:
+            break
+        _remove(video_path)
+        total -= size
+        removed += 1
+        logger.info(f"Evicted frame proxy of {video_path} ({size} bytes)")
+    return removed
+
+
+def build(video_path, root=None, media=None):
+    """
+    Decode ``video_path`` into its proxy, unless it has one or the proxy would
+    exceed FRAME_PROXY_MAX_BYTES (0 disables proxies); renders of such sources
+    keep decoding the source directly.
+
+    The proxies under ``root`` (by default UPLOAD_FOLDER) share
+    FRAME_PROXY_CACHE_BYTES; the least recently used are evicted to make room.
+    One proxy is built at a time per node, so builds never compete with each
+    other for cores or disk.
+
+    ffmpeg writes the raw frames straight to disk; the index is written last,
+    so a proxy is only ever seen complete.
+
+    Returns:
+        True if the source has an up-to-date proxy afterwards.
+    """
+    root = root or configuration.UPLOAD_FOLDER
+    media = media or media_info.load(video_path)
+    scaled_size, fps, size = plan(media)
+    max_bytes = min(configuration.FRAME_PROXY_MAX_BYTES, configuration.FRAME_PROXY_CACHE_BYTES)
+    if size > max_bytes:
+        logger.info(f"Not building a frame proxy for {video_path}: {size} bytes exceeds {max_bytes}")
+        return False
+
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, BUILD_LOCK), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if open_proxy(video_path, media) is not None:
+            return True
+        # A stale proxy of the source is replaced, so it does not count against the budget.
+        _remove(video_path)
+        evict(root, size)
+        frames_path = video_path + FRAMES_SUFFIX
+        partial_path = frames_path + ".part"
+        try:
+            run_ffmpeg([
+                "-i", media.path, "-an", "-sn",
+                "-vf", f"fps={fps},scale={scaled_size[0]}:{scaled_size[1]}:flags=lanczos",
+                "-f", "rawvideo", "-pix_fmt", "rgb24", partial_path,
+            ])
+            frame_count = os.path.getsize(partial_path) // (scaled_size[0] * scaled_size[1] * 3)
+            if frame_count == 0:
+                raise RuntimeError("ffmpeg decoded no frames")
+            os.replace(partial_path, frames_path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+        index_path = video_path + INDEX_SUFFIX
+        with open(index_path + ".part", "w") as f:
+            json.dump({
+                "size": list(scaled_size),
+                "fps": fps,
+                "file_size": media.file_size,
+                "mtime": media.mtime,
+                "timestamps": [round(i / fps, 6) for i in range(frame_count)],
+            }, f)
+        os.replace(index_path + ".part", index_path)
+    logger.info(f"Built frame proxy for {video_path}: {frame_count} frames at {scaled_size[0]}x{scaled_size[1]}")
+    return True
+
+
+def build_in_background(video_path, root=None):
+    """
+    Build the proxy of ``video_path`` on a daemon thread, so later renders of
+    the source skip decoding. Failures are logged only; renders then decode
+    the source as before.
+
+    Returns:
+        The thread, or None if this process is already building the proxy.
+    """
+    with _building_lock:
+        if video_path in _building:
+            return None
+        _building.add(video_path)
+
+    def run():
+        try:
+            with _build_slots:
+                build(video_path, root)
+        except Exception as e:
+            logger.warning(f"Frame proxy build failed for {video_path}: {e}")
+        finally:
+            with _building_lock:
+                _building.discard(video_path)
+
+    thread = threading.Thread(target=run, name="frame-proxy-build", daemon=True)
+    thread.start()
+    return thread
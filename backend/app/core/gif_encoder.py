@@ -0,0 +1,433 @@
+import io
+import struct
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+from app.config import configuration
+
+logger = logging.getLogger(__name__)
+
+LUT_BITS = 5
+PALETTE_SAMPLE_FRAMES = 16
+PALETTE_SAMPLE_PIXELS = 200_000
+DEDUPE_THUMBNAIL_FACTOR = 8
+
+# Byte-budget search space, best quality first: (scale, frame_step, palette_size).
+BUDGET_LADDER = (
+    (1.0, 1, 256),
+    (1.0, 1, 128),
+    (0.75, 1, 128),
+    (0.75, 2, 128),
+    (0.5, 2, 128),
+    (0.5, 2, 64),
+    (0.375, 3, 64),
+    (0.25, 3, 32),
+)
+BUDGET_TRIAL_SCALE = 0.5
+BUDGET_MAX_ENCODES = 3
+
+
+def build_palette(frames, colors=255):
+    """
+    Build one global palette for a sequence of RGB frames with vectorized median cut.
+
+    A strided sample of at most PALETTE_SAMPLE_FRAMES frames (and at most
+    PALETTE_SAMPLE_PIXELS pixels) is taken, then the box with the largest
+    population-weighted channel range is repeatedly split at its median along
+    that channel. Each palette entry is the mean of its box.
+
+    Returns:
+        A (n, 3) uint8 array with n <= colors.
+    """
+    frame_stride = max(1, len(frames) // PALETTE_SAMPLE_FRAMES)
+    pixels = np.concatenate([frame.reshape(-1, 3) for frame in frames[::frame_stride]])
+    pixel_stride = max(1, len(pixels) // PALETTE_SAMPLE_PIXELS)
+    pixels = pixels[::pixel_stride].astype(np.int32)
+
+    def box_entry(box):
+        ranges = box.max(axis=0) - box.min(axis=0)
+        channel = int(ranges.argmax())
+        return [box, int(ranges[channel]) * len(box), channel]
+
+    boxes = [box_entry(pixels)]
+    while len(boxes) < colors:
+        index = max(range(len(boxes)), key=lambda i: boxes[i][1])
+        box, score, channel = boxes[index]
+        if score == 0:
+            break
+        box = box[np.argsort(box[:, channel], kind="stable")]
+        middle = len(box) // 2
+        boxes[index] = box_entry(box[:middle])
+        boxes.append(box_entry(box[middle:]))
+
+    palette = np.array([box.mean(axis=0) for box, _, _ in boxes])
+    return np.clip(np.round(palette), 0, 255).astype(np.uint8)
+
+
+def build_lookup_table(palette, bits=LUT_BITS):
+    """
+    Precompute the nearest palette index for every cell of a 2**bits per channel
+    RGB grid, so mapping a frame is a single gather.
+    """
+    levels = 1 << bits
+    step = 256 // levels
+    grid = (np.arange(levels) * step + step // 2).astype(np.float32)
+    r, g, b = np.meshgrid(grid, grid, grid, indexing="ij")
+    cells = np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
+
+    palette = palette.astype(np.float32)
+    palette_norms = (palette ** 2).sum(axis=1)
+    lut = np.empty(len(cells), dtype=np.uint8)
+    for offset in range(0, len(cells), 4096):
+        chunk = cells[offset:offset + 4096]
+        # |c - p|^2 without the |c|^2 term, which does not change the argmin.
+        distances = palette_norms[None, :] - 2.0 * chunk @ palette.T
+        lut[offset:offset + 4096] = distances.argmin(axis=1)
+    return lut
+
+
+def map_to_palette(frame, lut, bits=LUT_BITS):
+    """Map an RGB uint8 frame to palette indices through the lookup table."""
+    shift = 8 - bits
+    keys = (frame[..., 0] >> shift).astype(np.intp) << (2 * bits)
+    keys |= (frame[..., 1] >> shift).astype(np.intp) << bits
+    keys |= frame[..., 2] >> shift
+    return lut[keys]
+
+
+def changed_region(previous, current):
+    """
+    Bounding box (top, bottom, left, right) of the pixels that differ between two
+    indexed frames, plus the change mask inside it; None if nothing changed.
+    """
+    changed = previous != current
+    rows = np.flatnonzero(changed.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(changed.any(axis=0))
+    top, bottom, left, right = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+    return (top, bottom, left, right), changed[top:bottom, left:right]
+
+
+def frame_delays(count, fps):
+    """Per-frame delays in centiseconds whose running sum tracks the true timeline."""
+    edges = np.round(np.arange(count + 1) * 100.0 / fps).astype(int)
+    return np.maximum(np.diff(edges), 2).tolist()
+
+
+def thumbnail(frame, factor=DEDUPE_THUMBNAIL_FACTOR):
+    """Box-filter downscale of an RGB frame by an integer factor, as int16."""
+    return np.asarray(Image.fromarray(frame).reduce(factor), dtype=np.int16)
+
+
+def drop_duplicate_frames(frames, delays, threshold):
+    """
+    Drop frames that are nearly identical to the last kept frame.
+
+    Frames are compared on box-filtered thumbnails by mean absolute difference
+    (0-255 scale). A dropped frame's delay is added to the frame it duplicates, so
+    the animation keeps its timing. Comparing against the last *kept* frame stops
+    slow drifts from being dropped indefinitely.
+
+    Returns:
+        (frames, delays, dropped_count)
+    """
+    if threshold <= 0 or len(frames) < 2:
+        return frames, delays, 0
+
+    kept_frames = [frames[0]]
+    kept_delays = [delays[0]]
+    reference = thumbnail(frames[0])
+    for frame, delay in zip(frames[1:], delays[1:]):
+        small = thumbnail(frame)
+        if np.abs(small - reference).mean() < threshold:
+            kept_delays[-1] += delay
+            continue
+        kept_frames.append(frame)
+        kept_delays.append(delay)
+        reference = small
+    return kept_frames, kept_delays, len(frames) - len(kept_frames)
+
+
+def lzw_image_data(indices, palette_bytes):
+    """
+    LZW-compress one indexed image with Pillow's GIF encoder and return the raw
+    image data (minimum code size byte and data sub-blocks, including the terminator).
+    """
+    image = Image.frombuffer("P", (indices.shape[1], indices.shape[0]), np.ascontiguousarray(indices), "raw", "P", 0, 1)
+    image.putpalette(palette_bytes)
+    buffer = io.BytesIO()
+    image.save(buffer, format="GIF", optimize=False, interlace=False)
+    data = buffer.getvalue()
+
+    pos = 13
+    if data[10] & 0x80:
+        pos += 3 * (2 << (data[10] & 0x07))
+    while data[pos] == 0x21:
+        pos += 2
+        while data[pos]:
+            pos += data[pos] + 1
+        pos += 1
+    if data[pos] != 0x2C:
+        raise ValueError("Unexpected block in Pillow GIF output")
+    flags = data[pos + 9]
+    pos += 10
+    if flags & 0x80:
+        pos += 3 * (2 << (flags & 0x07))
+
+    start = pos
+    pos += 1
+    while data[pos]:
+        pos += data[pos] + 1
+    return data[start:pos + 1]
+
+
+def iter_image_data(parts, palette_bytes, workers=None):
+    """
+    Yield the LZW image data of each frame part, in order.
+
+    Frames are independent LZW streams once their palette and sub-rectangle are
+    fixed, so they are compressed concurrently on a thread pool (Pillow's encoder
+    releases the GIL) while results are handed back in frame order for sequential
+    assembly.
+    """
+    workers = configuration.GIF_ENCODE_THREADS if workers is None else workers
+    if workers <= 1 or len(parts) < 2:
+        for _, _, indices in parts:
+            yield lzw_image_data(indices, palette_bytes)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(lambda part: lzw_image_data(part[2], palette_bytes), parts)
+
+
+def plan_frames(frames, palette_size=256, subrectangles=True):
+    """
+    Quantize frames against one global palette and work out what each frame emits.
+
+    Returns:
+        (palette, transparent_index, parts) where ``parts`` holds, per frame, a
+        tuple (left, top, indices) of the sub-image to encode. When subrectangles
+        are enabled, pixels that did not change inside the bounding box are set to
+        the reserved transparent index so they compress to long runs.
+    """
+    transparent = palette_size - 1 if subrectangles else None
+    palette = build_palette(frames, palette_size - 1 if subrectangles else palette_size)
+    lut = build_lookup_table(palette)
+
+    parts = []
+    previous = None
+    for frame in frames:
+        indices = map_to_palette(frame, lut)
+        if previous is None or not subrectangles:
+            parts.append((0, 0, indices))
+        else:
+            region = changed_region(previous, indices)
+            if region is None:
+                parts.append((0, 0, np.full((1, 1), transparent, dtype=np.uint8)))
+            else:
+                (top, bottom, left, right), changed = region
+                sub = indices[top:bottom, left:right].copy()
+                sub[~changed] = transparent
+                parts.append((left, top, sub))
+        previous = indices
+    return palette, transparent, parts
+
+
+def write_gif(output_path, size, palette, transparent, parts, delays, loop=0, workers=None):
+    """
+    Assemble a GIF89a file from pre-planned frame parts.
+
+    Args:
+        output_path: Destination path, or a binary file object.
+        size: Logical screen (width, height).
+        palette: (n, 3) uint8 global colour table; padded to a power of two.
+        transparent: Palette index used for transparency, or None.
+        parts: List of (left, top, indices) per frame.
+        delays: Per-frame delays in centiseconds.
+        loop: NETSCAPE loop count (0 loops forever).
+        workers: LZW encoding threads; defaults to GIF_ENCODE_THREADS.
+    """
+    if hasattr(output_path, "write"):
+        _write_gif_stream(output_path, size, palette, transparent, parts, delays, loop, workers)
+        return
+    with open(output_path, "wb") as f:
+        _write_gif_stream(f, size, palette, transparent, parts, delays, loop, workers)
+
+
+def _write_gif_stream(f, size, palette, transparent, parts, delays, loop, workers):
+    table_bits = max(1, int(np.ceil(np.log2(max(2, len(palette), (transparent or 0) + 1)))))
+    table = np.zeros((1 << table_bits, 3), dtype=np.uint8)
+    table[:len(palette)] = palette
+    palette_bytes = table.tobytes()
+
+    width, height = size
+    f.write(b"GIF89a")
+    f.write(struct.pack("<HHBBB", width, height, 0xF0 | (table_bits - 1), 0, 0))
+    f.write(palette_bytes)
+    f.write(b"\x21\xFF\x0BNETSCAPE2.0\x03\x01" + struct.pack("<H", loop) + b"\x00")
+
+    image_data = iter_image_data(parts, palette_bytes, workers)
+    for (left, top, indices), delay, data in zip(parts, delays, image_data):
+        # Disposal 1 (leave in place) so transparent pixels show the previous frame.
+        packed = (1 << 2) | (1 if transparent is not None else 0)
+        f.write(struct.pack("<BBBBHBB", 0x21, 0xF9, 4, packed, delay, transparent or 0, 0))
+        f.write(struct.pack("<BHHHHB", 0x2C, left, top, indices.shape[1], indices.shape[0], 0))
+        f.write(data)
+    f.write(b"\x3B")
+
+
+def gif_bytes(frames, delays, palette_size=256, subrectangles=True):
+    """Encode frames with the given delays and return the GIF file contents."""
+    palette, transparent, parts = plan_frames(frames, palette_size, subrectangles)
+    height, width = frames[0].shape[:2]
+    buffer = io.BytesIO()
+    write_gif(buffer, (width, height), palette, transparent, parts, delays)
+    return buffer.getvalue()
+
+
+def resize_frames(frames, scale):
+    """Downscale RGB frames by ``scale`` (frames are returned as-is for 1.0)."""
+    if scale == 1.0:
+        return frames
+    height, width = frames[0].shape[:2]
+    size = (max(2, round(width * scale)), max(2, round(height * scale)))
+    return [np.asarray(Image.fromarray(frame).resize(size, Image.BILINEAR, reducing_gap=2.0)) for frame in frames]
+
+
+def decimate_frames(frames, delays, step):
+    """Keep every ``step``-th frame, folding the skipped frames' delays into it."""
+    if step <= 1:
+        return frames, delays
+    return frames[::step], [sum(delays[i:i + step]) for i in range(0, len(delays), step)]
+
+
+def fit_to_budget(frames, delays, max_bytes, palette_size=256, subrectangles=True):
+    """
+    Encode frames into at most ``max_bytes`` by walking BUDGET_LADDER.
+
+    Each rung's size is predicted by encoding it at BUDGET_TRIAL_SCALE: the
+    best-quality rung's full size is taken to grow with the pixel count, and the
+    other rungs scale with their trial ratio to it. A binary search over those
+    predictions picks the first rung expected to fit, so an over-budget request
+    never pays for a full-size encode of a rung that cannot fit. The prediction
+    error measured on the chosen rung is then used to retry the rung above it
+    once. Every trial reuses the already decoded frames, and at most
+    BUDGET_MAX_ENCODES full-size encodes are made, stepping down the ladder if a
+    prediction was optimistic.
+
+    Returns:
+        (data, rung) with the encoded GIF and the (scale, frame_step, palette_size)
+        used. If nothing tried fits, the smallest attempt is returned.
+    """
+    def encode(index, trial_scale=1.0):
+        scale, step, colors = BUDGET_LADDER[index]
+        rung_frames, rung_delays = decimate_frames(frames, delays, step)
+        return gif_bytes(
+            resize_frames(rung_frames, scale * trial_scale), rung_delays, min(colors, palette_size), subrectangles
+        )
+
+    base_trial = len(encode(0, BUDGET_TRIAL_SCALE))
+    predictions = {0: base_trial / BUDGET_TRIAL_SCALE ** 2}
+
+    def predict(index):
+        if index not in predictions:
+            predictions[index] = predictions[0] * len(encode(index, BUDGET_TRIAL_SCALE)) / base_trial
+        return predictions[index]
+
+    low, high = 0, len(BUDGET_LADDER) - 1
+    while low < high:
+        middle = (low + high) // 2
+        if predict(middle) <= max_bytes:
+            high = middle
+        else:
+            low = middle + 1
+
+    index = low
+    data, rung = encode(index), BUDGET_LADDER[index]
+    encodes = 1
+    while len(data) > max_bytes and index + 1 < len(BUDGET_LADDER) and encodes < BUDGET_MAX_ENCODES:
+        index += 1
+        data, rung = encode(index), BUDGET_LADDER[index]
+        encodes += 1
+
+    if len(data) <= max_bytes and index > 0 and encodes < BUDGET_MAX_ENCODES:
+        # Trial ratios are usually pessimistic for downscaled rungs; calibrate once.
+        calibrated = predict(index - 1) * len(data) / predict(index)
+        if calibrated <= max_bytes:
+            better = encode(index - 1)
+            if len(better) <= max_bytes:
+                return better, BUDGET_LADDER[index - 1]
+    return data, rung
+
+
+def encode_gif(frames, output_path, fps, palette_size=256, subrectangles=True, dedupe_threshold=None, max_bytes=None):
+    """
+    Encode RGB uint8 frames into a GIF using a global palette and frame-difference
+    subrectangles. Near-duplicate frames are merged into their predecessor's delay
+    first (GIF_DEDUPE_THRESHOLD by default; 0 disables it). With ``max_bytes`` the
+    scale, frame rate and palette size are lowered as needed to fit the budget.
+    """
+    if not frames:
+        raise ValueError("Cannot encode a GIF without frames")
+    if dedupe_threshold is None:
+        dedupe_threshold = configuration.GIF_DEDUPE_THRESHOLD
+
+    height, width = frames[0].shape[:2]
+    frame_count = len(frames)
+    frames, delays, dropped = drop_duplicate_frames(frames, frame_delays(frame_count, fps), dedupe_threshold)
+    if max_bytes:
+        data, (scale, step, colors) = fit_to_budget(frames, delays, max_bytes, palette_size, subrectangles)
+        with open(output_path, "wb") as f:
+            f.write(data)
+        log = logger.info if len(data) <= max_bytes else logger.warning
+        log(
+            f"Encoded {output_path} in {len(data)} bytes (budget {max_bytes}) "
+            f"at scale {scale}, {fps / step:g} fps, {min(colors, palette_size)} colours"
+        )
+    else:
+        palette, transparent, parts = plan_frames(frames, palette_size, subrectangles)
+        write_gif(output_path, (width, height), palette, transparent, parts, delays)
+
+    if dropped:
+        logger.info(f"Dropped {dropped}/{frame_count} near-duplicate frames for {output_path}")
+    return output_path
+
+
+class GifEncoder:
+    """
+    Incremental writer with the same append_data/close interface as an imageio
+    writer. Frames are buffered until close(), because the global palette is
+    computed from a sample across the whole clip.
+    """
+
+    def __init__(self, output_path, fps, palette_size=256, subrectangles=True, dedupe_threshold=None, max_bytes=None):
+        self.output_path = output_path
+        self.fps = fps
+        self.palette_size = palette_size
+        self.subrectangles = subrectangles
+        self.dedupe_threshold = dedupe_threshold
+        self.max_bytes = max_bytes
+        self._frames = []
+
+    def append_data(self, frame):
+        self._frames.append(np.ascontiguousarray(frame[..., :3], dtype=np.uint8))
+
+    def close(self):
+        if self._frames is None:
+            return
+        frames, self._frames = self._frames, None
+        encode_gif(
+            frames, self.output_path, self.fps, self.palette_size, self.subrectangles, self.dedupe_threshold,
+            self.max_bytes,
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._frames = None
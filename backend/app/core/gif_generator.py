@@ -3,19 +3,36 @@ import sys
 import logging
 import imageio
 import tempfile
-from moviepy.editor import VideoFileClip, CompositeVideoClip, ImageClip
+from collections import Counter
 from app.config import configuration
+from app.core import ffmpeg_renderer, caption_raster, gif_encoder, format_writers, scaling, media_info, frame_proxy
+from app.core.caption_compositor import CaptionCompositor
 from app.utils.error_handlers import GIFGenerationError
 import numpy as np
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 
 if not hasattr(Image, 'ANTIALIAS'):
     Image.ANTIALIAS = Image.Resampling.LANCZOS
 
 logger = logging.getLogger(__name__)
 
-def generate_captioned_gif(video_path: str, start: float, end: float, caption: str, output_path: str) -> str:
-    """Generate GIF with captions using optimized methods"""
+GIF_WRITER_OPTIONS = {"palettesize": 256, "quantizer": "kraken", "subrectangles": True}
+JOB_OPTIONS = ("max_bytes", "output_format")
+
+def job_options(job):
+    """Optional keyword arguments of generate_captioned_gif that are set on a render job."""
+    return {key: job[key] for key in JOB_OPTIONS if job.get(key)}
+
+def generate_captioned_gif(video_path: str, start: float, end: float, caption: str, output_path: str,
+                           max_bytes: int = None, output_format: str = "gif") -> str:
+    """
+    Generate GIF with captions using optimized methods.
+
+    With ``max_bytes`` the GIF is fitted to that size by the palette encoder, which
+    needs decoded frames, so the moviepy path is used regardless of GIF_ENGINE. The
+    same applies to the other ``output_format`` values ("webp", "mp4", "apng"),
+    which are written from the decoded, captioned frames.
+    """
     try:
         duration = end - start
         max_duration = configuration.MAX_GIF_DURATION
@@ -23,17 +40,29 @@ def generate_captioned_gif(video_path: str, start: float, end: float, caption: s
             end = start + max_duration
             logger.warning(f"Trimming GIF duration to {max_duration}s")
         
-        with VideoFileClip(video_path) as video:
-            clip = video.subclip(start, end)
-            
-            if configuration.GIF_RESOLUTION:
-                clip = clip.resize(configuration.GIF_RESOLUTION)
+        if configuration.GIF_ENGINE == "ffmpeg" and not max_bytes and output_format == "gif":
+            scaled_size, size = scaling.plan_resize(media_info.load(video_path).display_size)
+            caption_image = render_caption_image(caption, size)
+            ffmpeg_renderer.render_gif(
+                video_path, start, end, caption_image, output_path, configuration.GIF_FPS, size, scaled_size
+            )
+            logger.info(f"GIF generated with ffmpeg engine: {output_path}")
+            return output_path
+        
+        video, source = open_source(video_path)
+        with video:
+            clip = source.subclip(start, end)
             
-            txt_clip = create_optimized_caption(caption, clip.size, clip.duration)
+            compositor = CaptionCompositor(render_caption_image(caption, clip.size), clip.size)
             
-            final_clip = CompositeVideoClip([clip, txt_clip])
+            final_clip = clip.fl_image(compositor)
             
-            generate_optimized_gif(final_clip, output_path, configuration.GIF_FPS)
+            if output_format == "gif":
+                generate_optimized_gif(final_clip, output_path, configuration.GIF_FPS, max_bytes)
+            else:
+                with format_writers.open_writer(output_path, configuration.GIF_FPS, output_format) as writer:
+                    for frame in final_clip.iter_frames(fps=configuration.GIF_FPS, dtype="uint8"):
+                        writer.append_data(frame)
         
         logger.info(f"GIF generated: {output_path}")
         return output_path
@@ -41,89 +70,176 @@ def generate_captioned_gif(video_path: str, start: float, end: float, caption: s
         logger.error(f"GIF generation failed: {str(e)}")
         raise GIFGenerationError(f"Video processing error: {str(e)}")
 
-def create_optimized_caption(text, video_size, duration):
-    """Create an optimized text caption with better readability.
-    
-    This version adds extra vertical padding and applies a stroke to the text,
-    ensuring that multi-line captions are fully visible and clearer on the video.
+def open_source(video_path, media=None):
     """
-    width, height = video_size
-    font_size = max(20, int(height * 0.05))
-    max_width = int(width * 0.9)
-    
-    # Attempt to load Arial. Fall back if not found.
+    Open a source video with frames scaled by the ffmpeg decoder to GIF_RESOLUTION
+    (following GIF_RESIZE_MODE), so full-resolution frames never reach Python.
+    The reader is built from the source's MediaInfo, so the file is not probed
+    again, and audio is not opened. When the source has a frame proxy (see
+    frame_proxy), frames are read from it instead and nothing is decoded.
+
+    Returns:
+        (video, clip): the clip to close, and the clip to read frames from,
+        which letterboxes the scaled frames in "pad" mode.
+    """
+    media = media or media_info.load(video_path)
+    scaled_size, output_size = scaling.plan_resize(media.display_size)
+    proxy = frame_proxy.open_proxy(video_path, media)
+    if proxy is not None:
+        video = proxy.clip()
+    else:
+        video = media_info.open_video(media, scaled_size, resize_algorithm="lanczos")
+    if output_size == scaled_size:
+        return video, video
+    return video, video.fl_image(scaling.Letterbox(scaled_size, output_size))
+
+def generate_captioned_gifs(video_path: str, jobs: list) -> list:
+    """
+    Render several captioned GIFs from one source video in a single decode pass.
+
+    The source is opened and probed once. The source frames every job needs are
+    merged into one ascending schedule of frame indices, so the shared reader
+    only ever moves forward (skipping or seeking ahead between moments), and
+    each frame is decoded once and routed to the encoder of every job that needs
+    it. Overlapping moments therefore reuse frames instead of seeking back.
+
+    With the ffmpeg engine each job already runs as a single input-seeking ffmpeg
+    process, so jobs are rendered one after another instead.
+
+    Args:
+        video_path: Path to the source video.
+        jobs: List of dicts with "start", "end", "caption" and "output_path", and
+            optionally "max_bytes" and "output_format".
+
+    Returns:
+        A list in the same order as ``jobs`` of dicts with "output_path" (None on
+        failure) and "error" (None on success); one failing job never affects the others.
+    """
+    if configuration.GIF_ENGINE == "ffmpeg":
+        results = []
+        for job in jobs:
+            try:
+                generate_captioned_gif(
+                    video_path, job["start"], job["end"], job["caption"], job["output_path"], **job_options(job)
+                )
+                results.append({"output_path": job["output_path"], "error": None})
+            except Exception as e:
+                results.append({"output_path": None, "error": str(e)})
+        return results
+
+    fps = configuration.GIF_FPS
+    errors = [None] * len(jobs)
+    writers = [None] * len(jobs)
     try:
-        font = ImageFont.truetype("arial.ttf", font_size)
-    except OSError:
-        logger.warning("Arial font not found; falling back to default font.")
-        font = ImageFont.load_default()
-    
-    # Prepare a temporary image to measure text dimensions.
-    test_img = Image.new('RGB', (10, 10))
-    test_draw = ImageDraw.Draw(test_img)
-    
-    lines = []
-    words = text.split()
-    current_line = ""
-    
-    # Break the text into lines so that each line fits within max_width.
-    for word in words:
-        test_line = current_line + (" " + word if current_line else word)
-        text_width = test_draw.textlength(test_line, font=font)
-        if text_width <= max_width:
-            current_line = test_line
+        video, clip = open_source(video_path)
+        with video:
+            size = tuple(clip.size)
+            source_fps = video.fps or fps
+
+            schedule = []
+            compositors = []
+            for index, job in enumerate(jobs):
+                start = max(0, job["start"])
+                end = min(job["end"], start + configuration.MAX_GIF_DURATION, video.duration)
+                compositors.append(CaptionCompositor(render_caption_image(job["caption"], size), size))
+                if end <= start:
+                    errors[index] = f"Empty time range {job['start']}-{job['end']}"
+                    continue
+                writers[index] = open_animation_writer(job["output_path"], fps, **job_options(job))
+                times = start + np.arange(0, end - start, 1.0 / fps)
+                schedule.extend((int(frame_index), index) for frame_index in np.round(times * source_fps))
+            schedule.sort()
+            readers = Counter(frame_index for frame_index, _ in schedule)
+
+            decoded_index, frame, ended = None, None, False
+            for frame_index, index in schedule:
+                readers[frame_index] -= 1
+                if errors[index]:
+                    continue
+                try:
+                    if frame_index != decoded_index:
+                        previous, decoded_index = frame, frame_index
+                        frame = clip.get_frame(frame_index / source_fps)
+                        # Past the end of the stream the reader hands out its last
+                        # frame again, which a job may already have drawn on.
+                        ended = frame is previous
+                    if ended:
+                        continue
+                    target = frame
+                    if readers[frame_index]:
+                        # Later jobs still read this frame, so this one gets a
+                        # read-only view, which the compositor copies; the last
+                        # reader draws on the frame itself.
+                        target = frame.view()
+                        target.flags.writeable = False
+                    writers[index].append_data(compositors[index](target))
+                except Exception as e:
+                    logger.error(f"GIF generation failed for {jobs[index]['output_path']}: {e}")
+                    errors[index] = str(e)
+    except Exception as e:
+        logger.error(f"Single-pass GIF generation failed: {str(e)}")
+        errors = [error or str(e) for error in errors]
+    finally:
+        for index, writer in enumerate(writers):
+            if writer is None:
+                continue
+            try:
+                writer.close()
+            except Exception as e:
+                errors[index] = errors[index] or str(e)
+
+    results = []
+    for job, error in zip(jobs, errors):
+        if error:
+            results.append({"output_path": None, "error": error})
         else:
-            lines.append(current_line)
-            current_line = word
-    if current_line:
-        lines.append(current_line)
-    
-    # Add extra vertical padding for clarity.
-    vertical_padding = 10
-    line_spacing = 5
-    text_height = len(lines) * (font_size + line_spacing) + vertical_padding * 2
-    
-    # Create a transparent image with extra padding
-    text_img = Image.new('RGBA', (width, text_height), (0, 0, 0, 0))
-    draw = ImageDraw.Draw(text_img)
-    
-    # Starting y coordinate includes the extra padding.
-    y_text = vertical_padding
-    # Stroke properties for better clarity (adjust stroke_width as needed)
-    stroke_width = 2
-    stroke_fill = "black"
-    
-    # Draw each line with center alignment and a stroke
-    for line in lines:
-        # Use the center of the image width and current y coordinate.
-        draw.text(
-            (width // 2, y_text),
-            line,
-            font=font,
-            fill="white",
-            anchor="mm",
-            stroke_width=stroke_width,
-            stroke_fill=stroke_fill
-        )
-        y_text += font_size + line_spacing
-    
-    # Create an image clip from the text image and position it at the bottom.
-    text_clip = ImageClip(np.array(text_img)).set_duration(duration).set_position(("center", "bottom"))
-    return text_clip
+            logger.info(f"GIF generated: {job['output_path']}")
+            results.append({"output_path": job["output_path"], "error": None})
+    return results
+
+def render_caption_image(text, video_size):
+    """Render caption text into a transparent RGBA image as wide as the video."""
+    return caption_raster.render_caption(text, video_size)
+
+def open_gif_writer(output_path, fps, max_bytes=None):
+    """
+    Open an incremental GIF writer for the configured encoder. Byte budgets are
+    only supported by the palette encoder, which is used whenever one is given.
+    """
+    if configuration.GIF_ENCODER == "imageio" and not max_bytes:
+        return imageio.get_writer(output_path, fps=fps, **GIF_WRITER_OPTIONS)
+    return gif_encoder.GifEncoder(output_path, fps, max_bytes=max_bytes)
+
+def open_animation_writer(output_path, fps, max_bytes=None, output_format="gif"):
+    """Open an incremental writer for any supported output format."""
+    if output_format == "gif":
+        return open_gif_writer(output_path, fps, max_bytes)
+    return format_writers.open_writer(output_path, fps, output_format)
 
-def generate_optimized_gif(clip, output_path, fps):
+def generate_optimized_gif(clip, output_path, fps, max_bytes=None):
     """
     Generate an optimized GIF with better quality and smaller size.
     
-    This function writes the given video clip to a temporary MP4 file using a unique filename,
-    then uses imageio to read the temporary video and generate the GIF. After completion, it
-    properly closes all file handles and removes the temporary file.
+    With the default "palette" encoder, frames are pulled straight from the clip and
+    encoded with one global palette and frame-difference subrectangles.
+    
+    With GIF_ENCODER=imageio, this function writes the given video clip to a temporary
+    MP4 file using a unique filename, then uses imageio to read the temporary video and
+    generate the GIF. After completion, it properly closes all file handles and removes
+    the temporary file.
     
     Args:
         clip: The video clip (MoviePy clip) to convert into a GIF.
         output_path: The path where the resulting GIF will be saved.
         fps: Frames per second for both video writing and GIF generation.
+        max_bytes: Optional size budget; forces the palette encoder.
     """
+    if configuration.GIF_ENCODER != "imageio" or max_bytes:
+        with gif_encoder.GifEncoder(output_path, fps, max_bytes=max_bytes) as writer:
+            for frame in clip.iter_frames(fps=fps, dtype="uint8"):
+                writer.append_data(frame)
+        return
+    
     with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_file:
         temp_filename = temp_file.name
 
@@ -137,7 +253,7 @@ def generate_optimized_gif(clip, output_path, fps):
     )
     
     with imageio.get_reader(temp_filename) as reader:
-        with imageio.get_writer(output_path, fps=fps, palettesize=256, quantizer="kraken", subrectangles=True) as writer:
+        with imageio.get_writer(output_path, fps=fps, **GIF_WRITER_OPTIONS) as writer:
             for frame in reader:
                 writer.append_data(frame)
     
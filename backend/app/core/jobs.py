@@ -0,0 +1,436 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import importlib
+import threading
+from contextlib import contextmanager, nullcontext
+from app.config import configuration
+from app.core import pipeline, admission
+from app.utils.error_handlers import NoMomentsFoundError, OverloadedError
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+
+# Seconds of silence after which follow() yields a keepalive.
+KEEPALIVE_SECONDS = 15
+
+
+class JobQueue:
+    """
+    Storage for pipeline jobs, shared by every web worker on the node.
+
+    A job is a dict with "id", "status" (one of JOB_STATUSES), "payload" (what
+    the worker runs), "stages" (pipeline stage -> status and timing),
+    "result", "error", "created_at" and "updated_at".
+    Each job also has an append-only event log (stage changes, progress and
+    a final "job" event written by finish) that progress streams replay.
+    Backends implement the methods below; JOB_QUEUE_BACKEND selects one.
+    """
+
+    def enqueue(self, payload):
+        """Store a new queued job and return it."""
+        raise NotImplementedError
+
+    def claim(self):
+        """
+        Atomically mark the oldest queued job running and return it, or None.
+
+        Running jobs whose worker stopped heartbeating for JOB_LEASE_SECONDS
+        (it died, or its process was recycled) are requeued first, or failed
+        once they have been claimed JOB_MAX_ATTEMPTS times.
+        """
+        raise NotImplementedError
+
+    def heartbeat(self, job_id):
+        """Renew the lease of a running job."""
+        raise NotImplementedError
+
+    def update_stage(self, job_id, stage, state):
+        """Record the state dict of one pipeline stage."""
+        raise NotImplementedError
+
+    def add_event(self, job_id, event, data):
+        """Append an event named ``event`` with JSON-serializable ``data`` to a job's log."""
+        raise NotImplementedError
+
+    def finish(self, job_id, result=None, error=None):
+        """
+        Mark a job succeeded with ``result``, or failed with ``error``, and log
+        the final "job" event with its status and result or error.
+        """
+        raise NotImplementedError
+
+    def get(self, job_id):
+        """Return a job, or None if there is no such job."""
+        raise NotImplementedError
+
+    def events(self, job_id, after=0):
+        """Return a job's events with an ID above ``after`` as (id, event, data), oldest first."""
+        raise NotImplementedError
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    Job queue in a local SQLite database (JOB_DB_PATH), so jobs survive worker
+    restarts and any process on the node can claim them without an external
+    service. A connection is opened per operation, which keeps it thread-safe.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or configuration.JOB_DB_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, status TEXT NOT NULL, payload TEXT NOT NULL,"
+                " stages TEXT NOT NULL, result TEXT, error TEXT,"
+                " created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            columns = [row[1] for row in db.execute("PRAGMA table_info(jobs)")]
+            if "attempts" not in columns:
+                db.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS job_events ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL,"
+                " event TEXT NOT NULL, data TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, id)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    @staticmethod
+    def _row_to_job(row):
+        job_id, status, payload, stages, result, error, created_at, updated_at = row
+        return {
+            "id": job_id,
+            "status": status,
+            "payload": json.loads(payload),
+            "stages": json.loads(stages),
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+    def enqueue(self, payload):
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        stages = {stage: {"status": "pending"} for stage in pipeline.STAGES}
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO jobs (id, status, payload, stages, created_at, updated_at)"
+                " VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, json.dumps(payload), json.dumps(stages), now, now),
+            )
+        return self.get(job_id)
+
+    def _expire_leases(self, db, now):
+        expired = db.execute(
+            "SELECT id, attempts FROM jobs WHERE status = 'running' AND updated_at < ?",
+            (now - configuration.JOB_LEASE_SECONDS,),
+        ).fetchall()
+        for job_id, attempts in expired:
+            if attempts < configuration.JOB_MAX_ATTEMPTS:
+                db.execute("UPDATE jobs SET status = 'queued', updated_at = ? WHERE id = ?", (now, job_id))
+                logger.warning(f"Requeued job {job_id}: its worker stopped during attempt {attempts}")
+                continue
+            error = f"The job's worker stopped during each of its {attempts} attempts"
+            db.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?", (error, now, job_id)
+            )
+            db.execute(
+                "INSERT INTO job_events (job_id, event, data, created_at) VALUES (?, 'job', ?, ?)",
+                (job_id, json.dumps({"status": "failed", "result": None, "error": error}), now),
+            )
+            logger.warning(f"Failed job {job_id}: {error}")
+
+    def claim(self):
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            self._expire_leases(db, now)
+            row = db.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (now, row[0]),
+            )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+        return self.get(row[0])
+
+    def heartbeat(self, job_id):
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = 'running'", (time.time(), job_id)
+            )
+
+    def update_stage(self, job_id, stage, state):
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            stages = json.loads(db.execute("SELECT stages FROM jobs WHERE id = ?", (job_id,)).fetchone()[0])
+            stages[stage] = state
+            db.execute(
+                "UPDATE jobs SET stages = ?, updated_at = ? WHERE id = ?", (json.dumps(stages), time.time(), job_id)
+            )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    def add_event(self, job_id, event, data):
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO job_events (job_id, event, data, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, event, json.dumps(data), time.time()),
+            )
+
+    def finish(self, job_id, result=None, error=None):
+        status = "failed" if error else "succeeded"
+        final = {"status": status, "result": result, "error": error}
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+            )
+            db.execute(
+                "INSERT INTO job_events (job_id, event, data, created_at) VALUES (?, 'job', ?, ?)",
+                (job_id, json.dumps(final), time.time()),
+            )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    def get(self, job_id):
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT id, status, payload, stages, result, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def events(self, job_id, after=0):
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT id, event, data FROM job_events WHERE job_id = ? AND id > ? ORDER BY id",
+                (job_id, after),
+            ).fetchall()
+        return [(event_id, event, json.loads(data)) for event_id, event, data in rows]
+
+
+BACKENDS = {
+    "sqlite": SQLiteJobQueue,
+}
+
+_queue = None
+_queue_lock = threading.Lock()
+_workers = []
+_workers_pid = None
+_wakeup = threading.Event()
+
+
+def get_queue():
+    """
+    Return this process's JobQueue, built from JOB_QUEUE_BACKEND: a name in
+    BACKENDS or a "package.module:ClassName" path to a JobQueue subclass.
+    """
+    global _queue
+
+    with _queue_lock:
+        if _queue is None:
+            backend = configuration.JOB_QUEUE_BACKEND
+            if backend in BACKENDS:
+                queue_class = BACKENDS[backend]
+            else:
+                module_name, _, class_name = backend.partition(":")
+                queue_class = getattr(importlib.import_module(module_name), class_name)
+            _queue = queue_class()
+        return _queue
+
+
+def _reset():
+    """Forget the queue and workers (after a fork, or in tests)."""
+    global _queue, _workers, _workers_pid
+
+    _queue = None
+    _workers = []
+    _workers_pid = None
+
+
+def submit(payload):
+    """Queue a pipeline job and make sure this process's workers are running."""
+    job = get_queue().enqueue(payload)
+    logger.info(f"Queued job {job['id']} for request {payload.get('request_id')}")
+    ensure_workers()
+    _wakeup.set()
+    return job
+
+
+def get(job_id):
+    return get_queue().get(job_id)
+
+
+def events(job_id, after=0):
+    return get_queue().events(job_id, after)
+
+
+def follow(job_id, after=0, poll_interval=None, max_seconds=None):
+    """
+    Yield a job's events after event ID ``after`` as (id, event, data) until
+    its final "job" event, or for at most ``max_seconds``.
+
+    Events are read back from the job store, so the follower may run in any
+    web worker and never holds a pipeline worker: between polls it only
+    sleeps. None is yielded after KEEPALIVE_SECONDS without events so the
+    caller can keep its connection alive (and notice a client that left).
+    """
+    queue = get_queue()
+    poll_interval = configuration.JOB_EVENTS_POLL_INTERVAL if poll_interval is None else poll_interval
+    max_seconds = configuration.JOB_EVENTS_STREAM_SECONDS if max_seconds is None else max_seconds
+    deadline = time.monotonic() + max_seconds
+    last_yield = time.monotonic()
+    while True:
+        for event_id, event, data in queue.events(job_id, after):
+            yield event_id, event, data
+            after = event_id
+            last_yield = time.monotonic()
+            if event == "job":
+                return
+        now = time.monotonic()
+        if now >= deadline:
+            return
+        if now - last_yield >= KEEPALIVE_SECONDS:
+            yield None
+            last_yield = now
+        time.sleep(min(poll_interval, max(0.0, deadline - now)))
+
+
+@contextmanager
+def _heartbeat(queue, job_id):
+    """Renew a job's lease every quarter of JOB_LEASE_SECONDS while the block runs."""
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(configuration.JOB_LEASE_SECONDS / 4):
+            try:
+                queue.heartbeat(job_id)
+            except Exception as e:
+                logger.warning(f"Could not renew the lease of job {job_id}: {e}")
+
+    thread = threading.Thread(target=beat, name=f"gif-job-heartbeat-{job_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_job(job, queue=None):
+    """Run one claimed job through the pipeline, recording stage progress and the outcome."""
+    queue = queue or get_queue()
+    with _heartbeat(queue, job["id"]):
+        _run_job(job, queue)
+
+
+def _run_job(job, queue):
+    payload = job["payload"]
+    stage_started = {}
+
+    def report(stage, status, **details):
+        if status == "progress":
+            queue.add_event(job["id"], "progress", {"stage": stage, **details})
+            return
+        if status == "running":
+            stage_started[stage] = time.time()
+        state = {"status": status, "started_at": stage_started.get(stage), **details}
+        if status != "running":
+            state["finished_at"] = time.time()
+        queue.update_stage(job["id"], stage, state)
+        queue.add_event(job["id"], "stage", {"stage": stage, **state})
+
+    run = pipeline.generate_batch if "prompts" in payload["arguments"] else pipeline.generate
+    # The job was admitted when submitted; it starts once its ticket fits the
+    # node's budgets, or fails for the client to resubmit if that takes longer
+    # than a /generate request would wait.
+    ticket = payload.get("admission_ticket")
+    cost = admission.Cost(*payload["admission_cost"]) if payload.get("admission_cost") else None
+    timeout = payload.get("admission_timeout", configuration.ADMISSION_QUEUE_TIMEOUT)
+    try:
+        with admission.held(ticket, timeout, cost) if ticket else nullcontext():
+            result = run(payload["request_id"], settings=payload["settings"], report=report, **payload["arguments"])
+    except OverloadedError as e:
+        logger.warning(f"Job {job['id']} timed out waiting for capacity")
+        queue.finish(job["id"], result={"retry_after": e.retry_after}, error=str(e))
+        return
+    except Exception as e:
+        if not isinstance(e, NoMomentsFoundError):
+            logger.exception(f"Job {job['id']} failed")
+        queue.finish(job["id"], error=str(e))
+        return
+    queue.finish(job["id"], result=result)
+    logger.info(f"Job {job['id']} succeeded")
+
+
+def _worker_loop():
+    # Workers dropped by _reset() stop at their next poll.
+    while threading.current_thread() in _workers:
+        try:
+            job = get_queue().claim()
+        except Exception as e:
+            logger.error(f"Could not claim a job: {e}")
+            job = None
+        if job is None:
+            _wakeup.wait(configuration.JOB_POLL_INTERVAL)
+            _wakeup.clear()
+            continue
+        logger.info(f"Running job {job['id']}")
+        run_job(job)
+
+
+def ensure_workers():
+    """
+    Start this process's JOB_WORKERS pipeline threads (again after a fork).
+    Called as each web worker starts (post_fork in gunicorn.conf.py), so jobs
+    queued before a restart are picked up without waiting for a new one, and
+    again on submit. They take jobs from the shared queue, so a job may run in
+    any web worker, and at most JOB_WORKERS pipelines run per process.
+    """
+    global _workers, _workers_pid
+
+    with _queue_lock:
+        if _workers_pid == os.getpid() and all(worker.is_alive() for worker in _workers):
+            return
+        _workers = [worker for worker in _workers if worker.is_alive()] if _workers_pid == os.getpid() else []
+        for i in range(len(_workers), configuration.JOB_WORKERS):
+            worker = threading.Thread(target=_worker_loop, name=f"gif-job-worker-{i}", daemon=True)
+            _workers.append(worker)
+            worker.start()
+        _workers_pid = os.getpid()
+        logger.info(f"Started {len(_workers)} job workers")
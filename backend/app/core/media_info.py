@@ -0,0 +1,253 @@
+import os
+import re
+import json
+import logging
+from dataclasses import dataclass, asdict
+from typing import Optional
+import numpy as np
+from moviepy.video.io.ffmpeg_reader import FFMPEG_VideoReader
+from moviepy.video.VideoClip import VideoClip
+from app.utils.ffmpeg_tools import get_ffprobe_binary, run_ffmpeg, run_ffprobe
+
+logger = logging.getLogger(__name__)
+
+CACHE_SUFFIX = ".media.json"
+
+_DURATION_RE = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?), start: (-?[\d.]+)")
+_VIDEO_RE = re.compile(r"Stream #\d+:\d+.*?: Video: (\w+)[^\n]*?, (\d+)x(\d+)")
+_FPS_RE = re.compile(r"Stream #\d+:\d+.*?: Video: [^\n]*?, ([\d.]+) (?:fps|tbr)")
+_AUDIO_RE = re.compile(r"Stream #\d+:\d+.*?: Audio: (\w+)[^\n]*?, (\d+) Hz")
+_ROTATE_TAG_RE = re.compile(r"rotate\s*:\s*(-?\d+)")
+_DISPLAYMATRIX_RE = re.compile(r"rotation of (-?[\d.]+) degrees")
+
+
+@dataclass
+class MediaInfo:
+    """
+    Everything the pipeline needs to know about a source video, produced by a
+    single probe and shared by every stage instead of re-probing the file.
+    """
+    path: str
+    duration: float
+    width: int
+    height: int
+    fps: float
+    video_codec: str
+    rotation: int = 0
+    start_time: float = 0.0
+    audio_codec: Optional[str] = None
+    audio_sample_rate: Optional[int] = None
+    file_size: int = 0
+    mtime: float = 0.0
+
+    @property
+    def has_audio(self):
+        return self.audio_codec is not None
+
+    @property
+    def display_size(self):
+        """(width, height) as the video is displayed, i.e. after rotation."""
+        if self.rotation in (90, 270):
+            return self.height, self.width
+        return self.width, self.height
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+def probe(video_path, timeout=None):
+    """
+    Probe a video once: container, streams and rotation.
+
+    Only the container header is read, so this takes milliseconds whatever the
+    length of the file: ffprobe is used when it is installed, otherwise the
+    stream header ``ffmpeg -i`` prints is parsed, as moviepy's
+    ffmpeg_parse_infos does.
+
+    Raises:
+        RuntimeError: If the file cannot be probed or has no video stream.
+    """
+    stat = os.stat(video_path)
+    if get_ffprobe_binary():
+        info = _probe_with_ffprobe(video_path, timeout)
+    else:
+        info = _probe_with_ffmpeg(video_path, timeout)
+    info.file_size = stat.st_size
+    info.mtime = stat.st_mtime
+    return info
+
+
+def _probe_with_ffprobe(video_path, timeout=None):
+    proc = run_ffprobe([
+        "-print_format", "json",
+        "-show_entries",
+        "format=duration,start_time"
+        ":stream=index,codec_type,codec_name,width,height,avg_frame_rate,r_frame_rate,sample_rate"
+        ":stream_tags=rotate:stream_side_data=rotation",
+        video_path,
+    ], timeout=timeout)
+    data = json.loads(proc.stdout)
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    if video is None or "duration" not in data.get("format", {}):
+        raise RuntimeError(f"Could not read video stream information from {video_path}")
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+
+    rotation = int(video.get("tags", {}).get("rotate", 0))
+    for side_data in video.get("side_data_list", []):
+        if "rotation" in side_data:
+            rotation = -int(side_data["rotation"])
+    return MediaInfo(
+        path=video_path,
+        duration=float(data["format"]["duration"]),
+        width=int(video["width"]),
+        height=int(video["height"]),
+        fps=_parse_rate(video.get("avg_frame_rate")) or _parse_rate(video.get("r_frame_rate")),
+        video_codec=video.get("codec_name"),
+        rotation=rotation % 360,
+        start_time=float(data["format"].get("start_time", 0) or 0),
+        audio_codec=audio.get("codec_name") if audio else None,
+        audio_sample_rate=int(audio["sample_rate"]) if audio and audio.get("sample_rate") else None,
+    )
+
+
+def _probe_with_ffmpeg(video_path, timeout=None):
+    # "-t 0" stops before the first packet is decoded.
+    proc = run_ffmpeg(["-i", video_path, "-t", "0", "-f", "null", "-"], timeout=timeout)
+    stderr = proc.stderr.decode("utf-8", errors="replace")
+    video = _VIDEO_RE.search(stderr)
+    duration = _DURATION_RE.search(stderr)
+    if video is None or duration is None:
+        raise RuntimeError(f"Could not read video stream information from {video_path}")
+    hours, minutes, seconds, start = duration.groups()
+    fps = _FPS_RE.search(stderr)
+    audio = _AUDIO_RE.search(stderr)
+
+    rotation = 0
+    rotate_tag = _ROTATE_TAG_RE.search(stderr)
+    displaymatrix = _DISPLAYMATRIX_RE.search(stderr)
+    if displaymatrix:
+        rotation = -round(float(displaymatrix.group(1)))
+    elif rotate_tag:
+        rotation = int(rotate_tag.group(1))
+
+    return MediaInfo(
+        path=video_path,
+        duration=int(hours) * 3600 + int(minutes) * 60 + float(seconds),
+        width=int(video.group(2)),
+        height=int(video.group(3)),
+        fps=float(fps.group(1)) if fps else 0.0,
+        video_codec=video.group(1),
+        rotation=rotation % 360,
+        start_time=float(start),
+        audio_codec=audio.group(1) if audio else None,
+        audio_sample_rate=int(audio.group(2)) if audio else None,
+    )
+
+
+def _parse_rate(rate):
+    try:
+        numerator, denominator = (rate or "0/0").split("/")
+        return float(numerator) / float(denominator) if float(denominator) else 0.0
+    except ValueError:
+        return 0.0
+
+
+def load(video_path, timeout=None):
+    """
+    Return the MediaInfo for a source, probing it at most once (``timeout``
+    bounds the probe).
+
+    The descriptor is cached as JSON next to the source (inside the request's
+    upload directory) and reused while the file's size and mtime are unchanged,
+    so every stage and render process can get it without spawning ffmpeg.
+    """
+    cache_path = video_path + CACHE_SUFFIX
+    stat = os.stat(video_path)
+    try:
+        with open(cache_path) as f:
+            cached = MediaInfo.from_dict(json.load(f))
+        if cached.file_size == stat.st_size and cached.mtime == stat.st_mtime:
+            cached.path = video_path
+            return cached
+    except (OSError, ValueError, TypeError):
+        pass
+
+    info = probe(video_path, timeout)
+    try:
+        with open(cache_path, "w") as f:
+            json.dump(info.to_dict(), f)
+    except OSError as e:
+        logger.warning(f"Could not cache media info for {video_path}: {e}")
+    logger.info(
+        f"Probed {video_path}: {info.width}x{info.height} @ {info.fps:g} fps, {info.duration:.2f}s, "
+        f"{info.video_codec}/{info.audio_codec}"
+    )
+    return info
+
+
+class FrameReader(FFMPEG_VideoReader):
+    """
+    moviepy's ffmpeg reader, with each frame read into an array of its own.
+
+    moviepy wraps the bytes it reads in a read-only array, so every caption
+    had to copy the whole frame before drawing on it. These frames are
+    writable and nothing else refers to them, except that the last frame is
+    handed out again when the same frame is asked for twice (or the stream
+    ends early), as with moviepy's reader.
+    """
+
+    def read_frame(self):
+        w, h = self.size
+        frame = np.empty((h, w, self.depth), dtype=np.uint8)
+        buffer = memoryview(frame).cast("B")
+        read = 0
+        while read < frame.nbytes:
+            count = self.proc.stdout.readinto(buffer[read:])
+            if not count:
+                break
+            read += count
+        if read < frame.nbytes:
+            if not hasattr(self, "lastread"):
+                raise IOError(f"Failed to read the first frame of {self.filename}")
+            logger.warning(
+                f"Read {read} of {frame.nbytes} bytes at frame {self.pos} of {self.filename}; "
+                f"using the last frame instead"
+            )
+            return self.lastread
+        self.lastread = frame
+        return frame
+
+
+class SourceClip(VideoClip):
+    """A source video without audio, read through a FrameReader."""
+
+    def __init__(self, path, target_resolution=None, resize_algorithm="bicubic"):
+        self.reader = FrameReader(path, target_resolution=target_resolution, resize_algo=resize_algorithm)
+        VideoClip.__init__(self, make_frame=self.reader.get_frame, duration=self.reader.duration)
+        self.fps = self.reader.fps
+        self.rotation = self.reader.rotation
+        self.filename = path
+
+    def close(self):
+        self.reader.close()
+
+
+def open_video(media, target_size=None, resize_algorithm="bicubic"):
+    """
+    Open a SourceClip of a MediaInfo's source, with frames scaled by the
+    decoder.
+
+    Args:
+        media: MediaInfo of the source.
+        target_size: Optional (width, height) that ffmpeg scales frames to.
+        resize_algorithm: ffmpeg scaler used for ``target_size``.
+    """
+    width, height = target_size or media.display_size
+    # ffmpeg applies the rotation before scaling, so the display size is always
+    # passed; moviepy takes it as (height, width).
+    return SourceClip(media.path, target_resolution=(height, width), resize_algorithm=resize_algorithm)
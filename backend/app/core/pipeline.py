@@ -0,0 +1,347 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+from contextlib import contextmanager
+from app.core import (
+    video_processor, transcription, caption_selector, render_pool, format_writers, preflight, progress, task_graph,
+    media_info, request_cache, frame_proxy,
+)
+from app.utils.error_handlers import GIFGenerationError, NoMomentsFoundError, InvalidRequestError
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("download", "transcribe", "select", "render", "summarize")
+
+# Settings the pipeline reads, copied from the Flask config when a request is
+# accepted so background workers run it without an application context.
+SETTINGS = ("UPLOAD_FOLDER", "GIF_OUTPUT_DIR", "MAX_VIDEO_DURATION", "MAX_GIF_DURATION", "YOUTUBE_INGEST_MODE")
+
+MAX_MOMENTS = 3
+
+
+def settings_from(config):
+    return {name: config.get(name) for name in SETTINGS}
+
+
+def _no_report(stage, status, **details):
+    pass
+
+
+@contextmanager
+def _stage(report, name):
+    """Report a stage as running, then done or failed; details put in the yielded dict go with "done"."""
+    started = time.monotonic()
+    details = {}
+    report(name, "running")
+    try:
+        yield details
+    except Exception as e:
+        report(name, "failed", error=str(e), seconds=round(time.monotonic() - started, 3))
+        raise
+    report(name, "done", seconds=round(time.monotonic() - started, 3), **details)
+
+
+def _retain(settings, record, request_id, *args):
+    """Keep request state for re-rendering; failing to only costs the ability to re-render."""
+    if not settings.get("UPLOAD_FOLDER"):
+        return
+    try:
+        record(settings["UPLOAD_FOLDER"], request_id, *args)
+    except Exception as e:
+        logger.warning(f"Could not keep request {request_id} for re-rendering: {e}")
+
+
+def _gif_entry(index, moment, output_path, output_format):
+    entry = {
+        "id": index,
+        "url": f"/api/gif/download/{os.path.basename(output_path)}",
+        "caption": moment["text"],
+        "start": moment["start"],
+        "end": moment["end"],
+        "duration": moment["end"] - moment["start"],
+        "format": output_format,
+    }
+    if "themes" in moment:
+        entry["themes"] = moment["themes"]
+    return entry
+
+
+def generate(request_id, prompt, settings, youtube_url=None, video_path=None,
+             max_bytes=None, output_format="gif", report=None):
+    """
+    Run the GIF pipeline for one request: fetch the source, transcribe it,
+    select moments, render them and summarize the transcript. The stages run
+    as a task graph, so the summary overlaps moment selection and rendering.
+
+    Args:
+        request_id: ID naming the request's upload directory and output files.
+        prompt: Validated theme prompt.
+        settings: Values of SETTINGS (see settings_from).
+        youtube_url: Source URL, when ``video_path`` is not given.
+        video_path: Path of an already saved upload.
+        max_bytes: Optional per-GIF byte budget.
+        output_format: gif, webp, mp4 or apng.
+        report: Optional callback ``report(stage, status, **details)`` called as
+            each of STAGES starts ("running") and ends ("done" or "failed"), and
+            with status "progress" in between: download bytes and percent,
+            transcription windows, and each rendered GIF ("gif", with its URL)
+            or failed render ("failed_gif"). "select" reports its "moments" when done.
+
+    Returns:
+        The response body: "gifs", "request_id", "content_analysis" and, when
+        some renders failed, "failed_gifs".
+
+    Raises:
+        NoMomentsFoundError: If no moment matches the prompt.
+    """
+    return _run(request_id, [prompt], settings, youtube_url, video_path, max_bytes, output_format, report, batch=False)
+
+
+def generate_batch(request_id, prompts, settings, youtube_url=None, video_path=None,
+                   max_bytes=None, output_format="gif", report=None):
+    """
+    Run the pipeline for several theme prompts over one source: it is fetched
+    and transcribed once, moments are selected for every theme together (one
+    Gemini call), moments picked by more than one theme are merged, and each
+    unique moment is rendered once.
+
+    Takes the arguments of generate, with ``prompts`` for ``prompt``.
+
+    Returns:
+        The response body of generate, where each GIF also lists the "themes"
+        that selected it, plus "themes": per prompt, the IDs of its GIFs.
+
+    Raises:
+        NoMomentsFoundError: If no moment matches any of the prompts.
+    """
+    response = _run(request_id, prompts, settings, youtube_url, video_path, max_bytes, output_format, report, batch=True)
+    response["themes"] = [
+        {"prompt": prompt, "gif_ids": [gif["id"] for gif in response["gifs"] if prompt in gif["themes"]]}
+        for prompt in prompts
+    ]
+    return response
+
+
+def _run(request_id, prompts, settings, youtube_url, video_path, max_bytes, output_format, report, batch):
+    report = report or _no_report
+    moments = []
+
+    def relay(stage, **details):
+        # Render results arrive as job indexes; clients want the GIF's URL.
+        if stage == "render" and "index" in details:
+            index = details["index"]
+            if details["error"]:
+                report(stage, "progress", failed_gif={"id": index, "error": details["error"]})
+            else:
+                entry = _gif_entry(index, moments[index], details["output_path"], output_format)
+                report(stage, "progress", gif=entry)
+            return
+        report(stage, "progress", **details)
+
+    with progress.reporting(relay):
+        return _generate(
+            request_id, prompts, settings, youtube_url, video_path, max_bytes, output_format, report, moments, batch
+        )
+
+
+def _generate(request_id, prompts, settings, youtube_url, video_path, max_bytes, output_format, report, moments, batch):
+    # In audio_first mode only the audio of a YouTube video is downloaded up
+    # front; the video is fetched for the selected moments only.
+    audio_first = bool(youtube_url) and not video_path and settings.get("YOUTUBE_INGEST_MODE") == "audio_first"
+
+    def download():
+        with _stage(report, "download"):
+            if audio_first:
+                audio_path = video_processor.process_youtube_audio(youtube_url, request_id)
+                _retain(settings, request_cache.record_source, request_id, None, youtube_url)
+                return None, audio_path
+            source = video_path or video_processor.process_video_input(
+                youtube_url=youtube_url, video_file=None, request_id=request_id
+            )
+            preflight.check_source(source, settings["MAX_VIDEO_DURATION"])
+            _retain(settings, request_cache.record_source, request_id, source, youtube_url)
+            return source, source
+
+    def transcribe(download):
+        _, transcript_source = download
+        with _stage(report, "transcribe"):
+            transcript = transcription.transcribe_video(transcript_source)
+            _retain(settings, request_cache.record_transcript, request_id, transcript)
+            return transcript
+
+    def select(transcribe):
+        with _stage(report, "select") as selected:
+            if batch:
+                per_theme = caption_selector.select_key_moments_batch(transcribe, prompts, MAX_MOMENTS)
+                found = caption_selector.dedupe_moments(prompts, per_theme)
+            else:
+                found = caption_selector.select_key_moments(transcribe, prompts[0])[:MAX_MOMENTS]
+            if not found:
+                logger.warning("No matching moments found using both Gemini and fallback methods.")
+                raise NoMomentsFoundError("No matching moments found in the video")
+            moments.extend(found)
+            selected["moments"] = [
+                {"id": i, **{key: moment[key] for key in ("start", "end", "text", "themes") if key in moment}}
+                for i, moment in enumerate(moments)
+            ]
+            return moments
+
+    def render(download, select):
+        source, _ = download
+        with _stage(report, "render"):
+            return _render(request_id, settings, youtube_url, source, select, max_bytes, output_format, audio_first)
+
+    def summarize(transcribe):
+        with _stage(report, "summarize"):
+            return caption_selector.analyze_transcript_content(
+                transcribe, "Summarize the main themes in this video:"
+            )
+
+    # The summary only needs the transcript, so it runs alongside select and render.
+    graph = task_graph.TaskGraph()
+    graph.add("download", download)
+    graph.add("transcribe", transcribe, after=("download",))
+    graph.add("select", select, after=("transcribe",))
+    graph.add("render", render, after=("download", "select"))
+    graph.add("summarize", summarize, after=("transcribe",))
+    try:
+        results = graph.run()
+    finally:
+        timings = ", ".join(
+            f"{name} {timing['started']:.2f}-{timing['finished']:.2f}s" for name, timing in graph.timings.items()
+        )
+        logger.info(f"Pipeline timings for {request_id}: {timings}")
+    gif_paths, failed_gifs = results["render"]
+
+    response = {
+        "gifs": gif_paths,
+        "request_id": request_id,
+        "content_analysis": results["summarize"],
+    }
+    if failed_gifs:
+        response["failed_gifs"] = failed_gifs
+    return response
+
+
+def _render(request_id, settings, youtube_url, video_path, moments, max_bytes, output_format, audio_first):
+    """Render the selected moments; returns (gif entries, failed renders)."""
+    # Where each moment lies in the video the GIFs are rendered from.
+    windows = [(moment["start"], moment["end"]) for moment in moments]
+    if audio_first:
+        max_gif_duration = settings["MAX_GIF_DURATION"]
+        ranges = [(start, min(end, start + max_gif_duration)) for start, end in windows]
+        video_path, offsets = video_processor.fetch_youtube_ranges(youtube_url, ranges, request_id)
+        windows = [(offset, offset + end - start) for offset, (start, end) in zip(offsets, ranges)]
+
+    output_dir = settings["GIF_OUTPUT_DIR"]
+    os.makedirs(output_dir, exist_ok=True)
+    render_jobs = [
+        {
+            "start": window[0],
+            "end": window[1],
+            "caption": moment["text"],
+            "output_path": os.path.join(
+                output_dir, f"{request_id}_{i}.{format_writers.extension_for(output_format)}"
+            ),
+        }
+        for i, (moment, window) in enumerate(zip(moments, windows))
+    ]
+    for job in render_jobs:
+        if max_bytes:
+            job["max_bytes"] = max_bytes
+        if output_format != "gif":
+            job["output_format"] = output_format
+    results = render_pool.render_gifs(video_path, render_jobs)
+
+    gif_paths = []
+    failed_gifs = []
+    for i, (moment, result) in enumerate(zip(moments, results)):
+        if result["error"]:
+            failed_gifs.append({"id": i, "error": result["error"]})
+            continue
+        gif_paths.append(_gif_entry(i, moment, result["output_path"], output_format))
+
+    if not gif_paths:
+        raise GIFGenerationError(f"All GIF renders failed: {failed_gifs[0]['error']}")
+    return gif_paths, failed_gifs
+
+
+def rerender(request_id, retained, start, end, settings, caption=None, max_bytes=None, output_format="gif"):
+    """
+    Render one custom range of an earlier request from what it retained (see
+    request_cache): no download, transcription or LLM call, only the render.
+    Audio-first requests kept no video, so only the range itself is fetched.
+
+    The output name is derived from the render options, so asking for the
+    same render again returns the existing file at once. The first re-render
+    of a request starts building its source's frame proxy (see frame_proxy),
+    which later re-renders read instead of decoding the source.
+
+    Args:
+        request_id: The earlier request.
+        retained: Its request_cache.load result.
+        start, end: Range in seconds; trimmed to MAX_GIF_DURATION.
+        settings: Values of SETTINGS.
+        caption: Caption text; defaults to the transcript spoken in the range.
+        max_bytes: Optional byte budget (GIF only).
+        output_format: gif, webp, mp4 or apng.
+
+    Returns:
+        The GIF's entry, as in the "gifs" of generate, with a string "id".
+
+    Raises:
+        InvalidRequestError: If the range lies outside the source or has no
+            speech to caption and no caption is given.
+    """
+    end = min(end, start + settings["MAX_GIF_DURATION"])
+    source = retained["source"]
+    if source:
+        duration = media_info.load(source).duration
+        if start >= duration:
+            raise InvalidRequestError(f"start must be before the end of the video ({duration:.1f}s).")
+        end = min(end, duration)
+    if caption is None:
+        caption = " ".join(
+            segment["text"].strip() for segment in retained["transcript"]
+            if segment["end"] > start and segment["start"] < end
+        )
+        if not caption:
+            raise InvalidRequestError("Nothing is said in that range; give a caption.")
+
+    options = json.dumps([start, end, caption, max_bytes, output_format])
+    render_id = hashlib.sha1(options.encode()).hexdigest()[:10]
+    output_path = os.path.join(
+        settings["GIF_OUTPUT_DIR"], f"{request_id}_r{render_id}.{format_writers.extension_for(output_format)}"
+    )
+    moment = {"start": start, "end": end, "text": caption}
+
+    if os.path.exists(output_path):
+        logger.info(f"Re-render {render_id} of {request_id} already exists")
+    else:
+        window = (start, end)
+        if not source:
+            source, offsets = video_processor.fetch_youtube_ranges(retained["youtube_url"], [window], request_id)
+            window = (offsets[0], offsets[0] + end - start)
+        os.makedirs(settings["GIF_OUTPUT_DIR"], exist_ok=True)
+        # Rendered under a temporary name so the output never exists half-written.
+        partial_path = os.path.join(
+            settings["GIF_OUTPUT_DIR"], f".{render_id}.{uuid.uuid4().hex}.{format_writers.extension_for(output_format)}"
+        )
+        job = {"start": window[0], "end": window[1], "caption": caption, "output_path": partial_path}
+        if max_bytes:
+            job["max_bytes"] = max_bytes
+        if output_format != "gif":
+            job["output_format"] = output_format
+        result = render_pool.render_gifs(source, [job])[0]
+        if result["error"]:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise GIFGenerationError(f"GIF render failed: {result['error']}")
+        os.replace(partial_path, output_path)
+        if retained["source"] and frame_proxy.open_proxy(source) is None:
+            frame_proxy.build_in_background(source, settings["UPLOAD_FOLDER"])
+
+    return _gif_entry(render_id, moment, output_path, output_format)
@@ -0,0 +1,39 @@
+import logging
+from app.core import media_info
+from app.utils.error_handlers import InvalidRequestError
+
+logger = logging.getLogger(__name__)
+
+HEADER_PROBE_TIMEOUT = 30
+
+
+def check_source(video_path, max_duration):
+    """
+    Fail fast on sources the pipeline cannot use, before any model work.
+
+    The source is probed (only its container header is read, which takes
+    milliseconds whatever the file's length) to reject corrupt files, sources
+    longer than ``max_duration`` and sources without an audio track to
+    transcribe. The MediaInfo is cached for the later stages.
+
+    Returns:
+        The source's MediaInfo.
+
+    Raises:
+        InvalidRequestError: If the source is rejected.
+    """
+    try:
+        media = media_info.load(video_path, timeout=HEADER_PROBE_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Preflight probe failed for {video_path}: {e}")
+        raise InvalidRequestError("The video file is corrupt or not a supported video.")
+
+    if media.duration <= 0:
+        raise InvalidRequestError("The video has no playable duration.")
+    if media.duration > max_duration:
+        raise InvalidRequestError(
+            f"Video is {media.duration:.0f}s long; the maximum is {max_duration}s."
+        )
+    if not media.has_audio:
+        raise InvalidRequestError("The video has no audio track to transcribe.")
+    return media
@@ -0,0 +1,53 @@
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# The progress callback of the pipeline running in this context, if any. New
+# threads start without one; task_graph runs its tasks in the caller's context.
+_callback = contextvars.ContextVar("progress_callback", default=None)
+
+
+@contextmanager
+def reporting(callback):
+    """
+    Send progress emitted in this context to ``callback(stage, **details)``.
+
+    Progress is bound to the context rather than passed down, so deep helpers
+    (yt-dlp hooks, the Whisper loop, the render pool) can report without every
+    signature in between growing a parameter.
+    """
+    token = _callback.set(callback)
+    try:
+        yield
+    finally:
+        _callback.reset(token)
+
+
+def emit(stage, **details):
+    """Report progress within ``stage``; a no-op when nothing is listening."""
+    callback = _callback.get()
+    if callback is None:
+        return
+    try:
+        callback(stage, **details)
+    except Exception as e:
+        # Progress is informational and must never fail the work it describes.
+        logger.warning(f"Progress callback failed for {stage}: {e}")
+
+
+class Throttle:
+    """Let through at most one update per ``interval`` seconds, plus any forced one."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._last = None
+
+    def ready(self, force=False):
+        now = time.monotonic()
+        if force or self._last is None or now - self._last >= self.interval:
+            self._last = now
+            return True
+        return False
@@ -0,0 +1,124 @@
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from app.config import configuration
+from app.core import gif_generator, progress
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_pid = None
+
+
+def pool_size():
+    """
+    Number of render processes this web worker may use.
+
+    RENDER_WORKERS wins when set; otherwise the node's RENDER_CPU_BUDGET is split
+    evenly across the WEB_CONCURRENCY web workers that share it (two per worker
+    with the defaults on four or more cores). With one, render_gifs renders in
+    this process instead of starting a pool.
+    """
+    if configuration.RENDER_WORKERS > 0:
+        return configuration.RENDER_WORKERS
+    return max(1, configuration.RENDER_CPU_BUDGET // max(1, configuration.WEB_CONCURRENCY))
+
+
+def _get_executor():
+    """Return this process's render pool, creating it on first use after a fork."""
+    global _executor, _executor_pid
+
+    if _executor is None or _executor_pid != os.getpid():
+        workers = pool_size()
+        logger.info(f"Starting GIF render pool with {workers} processes")
+        # spawn rather than fork: web workers are multi-threaded.
+        _executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def _reset_executor():
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
+
+
+def _render_one(video_path, job):
+    return gif_generator.generate_captioned_gif(
+        video_path, job["start"], job["end"], job["caption"], job["output_path"], **gif_generator.job_options(job)
+    )
+
+
+def _run_inline(video_path, job):
+    try:
+        return {"output_path": _render_one(video_path, job), "error": None}
+    except Exception as e:
+        logger.error(f"GIF render failed for {job['output_path']}: {e}")
+        return {"output_path": None, "error": str(e)}
+
+
+def render_gifs(video_path, jobs):
+    """
+    Render several captioned GIFs from one source video.
+
+    Jobs run on the bounded process pool when more than one render process is
+    available. Otherwise several jobs share a single decode pass of the source
+    in this process. A failing job never affects the others. Each result is
+    also emitted as "render" progress (``index``, ``output_path``, ``error``)
+    as soon as it is known, so clients can fetch a GIF before the rest finish.
+
+    Args:
+        video_path: Path to the source video.
+        jobs: List of dicts with "start", "end", "caption" and "output_path", and
+            optionally "max_bytes" and "output_format".
+
+    Returns:
+        A list in the same order as ``jobs`` of dicts with "output_path" (None on
+        failure) and "error" (None on success).
+    """
+    if len(jobs) <= 1:
+        results = []
+        for index, job in enumerate(jobs):
+            results.append(_run_inline(video_path, job))
+            _emit_result(index, results[-1])
+        return results
+    if pool_size() <= 1:
+        results = gif_generator.generate_captioned_gifs(video_path, jobs)
+        for index, result in enumerate(results):
+            _emit_result(index, result)
+        return results
+
+    executor = _get_executor()
+    try:
+        futures = [executor.submit(_render_one, video_path, job) for job in jobs]
+    except BrokenProcessPool:
+        _reset_executor()
+        executor = _get_executor()
+        futures = [executor.submit(_render_one, video_path, job) for job in jobs]
+
+    results = [None] * len(jobs)
+    indexes = {future: index for index, future in enumerate(futures)}
+    for future in as_completed(futures):
+        index = indexes[future]
+        job = jobs[index]
+        try:
+            results[index] = {"output_path": future.result(), "error": None}
+        except BrokenProcessPool as e:
+            logger.error(f"GIF render pool broke while rendering {job['output_path']}: {e}")
+            _reset_executor()
+            results[index] = {"output_path": None, "error": "Render process crashed"}
+        except Exception as e:
+            logger.error(f"GIF render failed for {job['output_path']}: {e}")
+            results[index] = {"output_path": None, "error": str(e)}
+        _emit_result(index, results[index])
+    return results
+
+
+def _emit_result(index, result):
+    progress.emit("render", index=index, output_path=result["output_path"], error=result["error"])
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import shutil
+import logging
+from app.config import configuration
+from app.utils import storage
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "request.json"
+TRANSCRIPT_FILE = "transcript.json"
+# Directories in the upload folder that are not requests.
+RESERVED_DIRS = {storage.UPLOAD_SESSIONS_DIR}
+
+
+def request_dir(root, request_id):
+    return os.path.join(root, request_id)
+
+
+def _write_json(path, data):
+    partial_path = path + ".part"
+    with open(partial_path, "w") as f:
+        json.dump(data, f)
+    os.replace(partial_path, path)
+
+
+def _link_into(directory, path):
+    """Hardlink ``path`` into ``directory`` (copying across filesystems) unless it is already there."""
+    if os.path.dirname(os.path.abspath(path)) == os.path.abspath(directory):
+        return path
+    destination = os.path.join(directory, "source" + os.path.splitext(path)[1])
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(path, destination)
+    except OSError:
+        shutil.copyfile(path, destination)
+    return destination
+
+
+def record_source(root, request_id, source_path=None, youtube_url=None):
+    """
+    Keep a request's source for re-rendering: write its manifest, pointing at
+    the source video inside the request directory. Sources saved elsewhere
+    (completed resumable uploads) are hardlinked in, so the request owns a
+    reference for as long as it is retained.
+
+    ``source_path`` is None when only the audio was downloaded
+    (YOUTUBE_INGEST_MODE=audio_first); re-renders then fetch their range.
+    """
+    directory = request_dir(root, request_id)
+    os.makedirs(directory, exist_ok=True)
+    if source_path:
+        source_path = _link_into(directory, source_path)
+    _write_json(os.path.join(directory, MANIFEST_FILE), {
+        "request_id": request_id,
+        "source": os.path.basename(source_path) if source_path else None,
+        "youtube_url": youtube_url,
+        "created_at": time.time(),
+    })
+
+
+def record_transcript(root, request_id, transcript):
+    _write_json(os.path.join(request_dir(root, request_id), TRANSCRIPT_FILE), transcript)
+
+
+def load(root, request_id):
+    """
+    Return a retained request as a dict with "source" (path or None),
+    "youtube_url" and "transcript", or None if it is unknown or was purged.
+    Loading counts as use: it restarts the request's retention window.
+    """
+    directory = request_dir(root, request_id)
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        with open(os.path.join(directory, TRANSCRIPT_FILE)) as f:
+            transcript = json.load(f)
+    except FileNotFoundError:
+        return None
+    os.utime(manifest_path)
+    source = os.path.join(directory, manifest["source"]) if manifest["source"] else None
+    return {"source": source, "youtube_url": manifest["youtube_url"], "transcript": transcript}
+
+
+def _last_used(directory, marker):
+    """mtime of ``marker`` in ``directory``, or of the directory itself if it has none; None if it is gone."""
+    marker_path = os.path.join(directory, marker)
+    try:
+        return os.path.getmtime(marker_path if os.path.exists(marker_path) else directory)
+    except FileNotFoundError:
+        return None
+
+
+def _purge(directory, kind, max_age_hours):
+    shutil.rmtree(directory, ignore_errors=True)
+    logger.info(f"Purged {kind} {os.path.basename(directory)} (unused for {max_age_hours}h)")
+
+
+def purge_expired(root=None, max_age_hours=None):
+    """
+    Delete request directories unused for ``max_age_hours`` (by default
+    SOURCE_RETENTION_HOURS): last used is the manifest's mtime, or the
+    directory's own for requests that never got one. Resumable upload
+    sessions not written to for as long (abandoned, or completed and never
+    used) are deleted too.
+
+    Returns:
+        The number of requests and upload sessions deleted.
+    """
+    root = root or configuration.UPLOAD_FOLDER
+    max_age_hours = configuration.SOURCE_RETENTION_HOURS if max_age_hours is None else max_age_hours
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    for name in os.listdir(root):
+        directory = os.path.join(root, name)
+        if name in RESERVED_DIRS or not os.path.isdir(directory):
+            continue
+        last_used = _last_used(directory, MANIFEST_FILE)
+        if last_used is not None and last_used < cutoff:
+            _purge(directory, "request", max_age_hours)
+            removed += 1
+
+    sessions = os.path.join(root, storage.UPLOAD_SESSIONS_DIR)
+    for name in os.listdir(sessions) if os.path.isdir(sessions) else ():
+        directory = os.path.join(sessions, name)
+        last_used = _last_used(directory, storage.UPLOAD_SESSION_FILE)
+        if last_used is not None and last_used < cutoff:
+            _purge(directory, "upload session", max_age_hours)
+            removed += 1
+    return removed
@@ -0,0 +1,75 @@
+import logging
+import numpy as np
+from app.config import configuration
+
+logger = logging.getLogger(__name__)
+
+RESIZE_MODES = ("fit", "pad", "stretch")
+
+
+def _even(value):
+    return max(2, int(value) // 2 * 2)
+
+
+def plan_resize(source_size, box=None, mode=None):
+    """
+    Work out how frames of ``source_size`` are scaled into the output ``box``.
+
+    Modes:
+        fit: preserve the aspect ratio and fit inside the box, never upscaling;
+            the output is the scaled size.
+        pad: preserve the aspect ratio, scale to fit the box and letterbox the
+            frame to exactly the box size.
+        stretch: scale to the box regardless of aspect ratio.
+
+    Scaled sizes are rounded down to even numbers, which H.264 output needs.
+
+    Returns:
+        (scaled_size, output_size) as (width, height) tuples.
+    """
+    box = configuration.GIF_RESOLUTION if box is None else box
+    mode = mode or configuration.GIF_RESIZE_MODE
+    if mode not in RESIZE_MODES:
+        raise ValueError(f"Unknown resize mode: {mode}")
+    if not box:
+        return tuple(source_size), tuple(source_size)
+    if mode == "stretch":
+        return tuple(box), tuple(box)
+
+    source_width, source_height = source_size
+    ratio = min(box[0] / source_width, box[1] / source_height)
+    if mode == "fit":
+        ratio = min(1.0, ratio)
+    scaled = (_even(round(source_width * ratio)), _even(round(source_height * ratio)))
+    if mode == "pad":
+        return (min(box[0], scaled[0]), min(box[1], scaled[1])), tuple(box)
+    return scaled, scaled
+
+
+def scale_filter(scaled_size, output_size):
+    """ffmpeg filter chain producing ``output_size`` frames scaled to ``scaled_size``."""
+    chain = f"scale={scaled_size[0]}:{scaled_size[1]}:flags=lanczos"
+    if tuple(output_size) != tuple(scaled_size):
+        chain += f",pad={output_size[0]}:{output_size[1]}:(ow-iw)/2:(oh-ih)/2"
+    return chain
+
+
+class Letterbox:
+    """
+    Centre decoded frames on a black canvas of the output size.
+
+    A new canvas is allocated per frame because encoders may keep references to
+    the frames they are given. Usable as a moviepy frame transform.
+    """
+
+    def __init__(self, scaled_size, output_size):
+        width, height = scaled_size
+        self.output_size = tuple(output_size)
+        left = (output_size[0] - width) // 2
+        top = (output_size[1] - height) // 2
+        self._region = (slice(top, top + height), slice(left, left + width))
+
+    def __call__(self, frame):
+        canvas = np.zeros((self.output_size[1], self.output_size[0], frame.shape[2]), dtype=frame.dtype)
+        canvas[self._region] = frame
+        return canvas
@@ -0,0 +1,129 @@
+import os
+import glob
+import fcntl
+import shutil
+import hashlib
+import logging
+import tempfile
+import time
+from app.config import configuration
+
+logger = logging.getLogger(__name__)
+
+ENTRIES_DIR = "entries"
+LOCKS_DIR = "locks"
+
+
+def cache_key(source_id, variant):
+    """Key of a cached source: its canonical ID plus a digest of the format it was fetched in."""
+    digest = hashlib.sha1(variant.encode()).hexdigest()[:10]
+    safe_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in source_id)
+    return f"{safe_id}.{digest}"
+
+
+def _paths(root):
+    entries = os.path.join(root, ENTRIES_DIR)
+    locks = os.path.join(root, LOCKS_DIR)
+    os.makedirs(entries, exist_ok=True)
+    os.makedirs(locks, exist_ok=True)
+    return entries, locks
+
+
+def _find_entry(entries, key):
+    matches = glob.glob(os.path.join(glob.escape(entries), glob.escape(key) + ".*"))
+    return matches[0] if matches else None
+
+
+def _link(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        # Different filesystem: fall back to a copy.
+        shutil.copyfile(src, dst)
+
+
+def fetch(key, destination_stem, download):
+    """
+    Get a source through the node-local cache and link it into a request.
+
+    The first caller for ``key`` runs ``download(directory)``, which must save
+    one file into ``directory`` and return its path. Concurrent callers, in
+    any process, wait on the key's file lock and then reuse that file, so a
+    burst of identical requests costs one download. Hits refresh the entry's
+    access time, which orders least-recently-used eviction once the cache
+    exceeds SOURCE_CACHE_MAX_BYTES (0 disables the cache). The mtime is left
+    alone: hardlinks share it, and media_info's probe cache is keyed on it.
+
+    Returns:
+        ``destination_stem`` plus the downloaded file's extension: a hardlink
+        to the cached file, so requests never copy the media.
+    """
+    if configuration.SOURCE_CACHE_MAX_BYTES <= 0:
+        directory = tempfile.mkdtemp()
+        try:
+            path = download(directory)
+            destination = destination_stem + os.path.splitext(path)[1]
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            shutil.move(path, destination)
+            return destination
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    root = configuration.SOURCE_CACHE_DIR
+    entries, locks = _paths(root)
+    with open(os.path.join(locks, key + ".lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        entry = _find_entry(entries, key)
+        if entry:
+            logger.info(f"Source cache hit for {key}")
+            os.utime(entry, (time.time(), os.stat(entry).st_mtime))
+        else:
+            logger.info(f"Source cache miss for {key}; downloading")
+            directory = tempfile.mkdtemp(dir=root, prefix=".download-")
+            try:
+                path = download(directory)
+                entry = os.path.join(entries, key + os.path.splitext(path)[1])
+                os.replace(path, entry)
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+        destination = destination_stem + os.path.splitext(entry)[1]
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        _link(entry, destination)
+
+    evict(root, configuration.SOURCE_CACHE_MAX_BYTES)
+    return destination
+
+
+def evict(root, max_bytes):
+    """
+    Delete least recently used entries until the cache fits in ``max_bytes``.
+
+    Entries whose lock is held (being downloaded or linked) are skipped.
+    Requests keep their hardlinks, so evicting never breaks a running request.
+    """
+    entries, locks = _paths(root)
+    files = []
+    for name in os.listdir(entries):
+        path = os.path.join(entries, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_atime, stat.st_size, name, path))
+    total = sum(size for _, size, _, _ in files)
+
+    for _, size, name, path in sorted(files):
+        if total <= max_bytes:
+            break
+        key = os.path.splitext(name)[0]
+        with open(os.path.join(locks, key + ".lock"), "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+        total -= size
+        logger.info(f"Evicted {name} from the source cache ({size} bytes)")
@@ -0,0 +1,91 @@
+import time
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+
+class TaskGraph:
+    """
+    A small in-process DAG of named tasks.
+
+    Each task is a callable that receives the results of the tasks it depends
+    on as keyword arguments named after them. ``run`` starts every task as soon
+    as its dependencies have finished, so independent branches run
+    concurrently on threads. The stages this is meant for spend their time in
+    subprocesses, the render pool, native code or network calls, so threads
+    overlap them well.
+
+    Tasks run in a copy of the caller's contextvars context, so context-bound
+    state such as the progress callback follows them onto worker threads.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        # name -> {"started", "finished" (seconds since run began), "seconds"}
+        self.timings = {}
+
+    def add(self, name, fn, after=()):
+        """
+        Add task ``name`` running ``fn``, after the tasks named in ``after``.
+        Dependencies must be added first, which keeps the graph acyclic.
+        """
+        if name in self._tasks:
+            raise ValueError(f"Task {name} is already in the graph")
+        missing = [dependency for dependency in after if dependency not in self._tasks]
+        if missing:
+            raise ValueError(f"Task {name} depends on unknown tasks: {', '.join(missing)}")
+        self._tasks[name] = (fn, tuple(after))
+
+    def run(self, max_workers=None):
+        """
+        Run every task and return a dict of task name -> result.
+
+        When a task fails no further tasks are started; tasks already running
+        are waited for, and then the first failure is raised.
+        """
+        context = contextvars.copy_context()
+        began = time.monotonic()
+        self.timings = {}
+        results = {}
+        pending = dict(self._tasks)
+        running = {}
+        error = None
+
+        def timed(name, fn, kwargs):
+            started = time.monotonic()
+            try:
+                return fn(**kwargs)
+            finally:
+                finished = time.monotonic()
+                self.timings[name] = {
+                    "started": round(started - began, 3),
+                    "finished": round(finished - began, 3),
+                    "seconds": round(finished - started, 3),
+                }
+
+        with ThreadPoolExecutor(max_workers=max_workers or len(self._tasks) or 1) as pool:
+            while pending or running:
+                if error is None:
+                    for name, (fn, after) in list(pending.items()):
+                        if all(dependency in results for dependency in after):
+                            kwargs = {dependency: results[dependency] for dependency in after}
+                            future = pool.submit(context.copy().run, timed, name, fn, kwargs)
+                            running[future] = name
+                            del pending[name]
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        if error is None:
+                            error = e
+                        logger.debug(f"Task {name} failed: {e}")
+
+        if error is not None:
+            raise error
+        return results
@@ -1,9 +1,16 @@
 import os
 import logging
 import sys
+import types
+import importlib
+import threading
+from contextlib import contextmanager
+import tqdm
 import whisper
+from whisper.audio import FRAMES_PER_SECOND
 from whisper.utils import get_writer
 from app.config import configuration
+from app.core import progress
 from app.utils.error_handlers import TranscriptionError
 
 logger = logging.getLogger(__name__)
@@ -11,6 +18,63 @@ logging.basicConfig(level=logging.INFO)
 
 _model_cache = {}
 
+
+class _WindowProgress(tqdm.tqdm):
+    """
+    Whisper's progress bar, which also reports each decoded window to the
+    pipeline's progress stream. Whisper advances it once per 30s window, by the
+    number of mel frames consumed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.windows = 0
+        self.frames = 0
+
+    def update(self, n=1):
+        self.windows += 1
+        self.frames += n
+        progress.emit(
+            "transcribe",
+            windows=self.windows,
+            seconds=round(self.frames / FRAMES_PER_SECOND, 2),
+            total_seconds=round((self.total or 0) / FRAMES_PER_SECOND, 2),
+            percent=round(100.0 * self.frames / self.total, 1) if self.total else None,
+        )
+        return super().update(n)
+
+
+_progress_lock = threading.Lock()
+_progress_users = 0
+
+
+@contextmanager
+def _window_progress():
+    """
+    Have Whisper's transcribe loop use _WindowProgress while the block runs.
+
+    Whisper has no progress callback; it only drives ``tqdm.tqdm`` from its
+    module. That is swapped in for as long as any transcription is running and
+    put back after the last one. Only Whisper's loop sees it, and each bar
+    reports to the progress callback of the thread that transcribes.
+    """
+    global _progress_users
+
+    # ``whisper.transcribe`` is the function, so look the module up by name.
+    module = importlib.import_module("whisper.transcribe")
+    with _progress_lock:
+        if _progress_users == 0:
+            module.tqdm = types.SimpleNamespace(tqdm=_WindowProgress)
+        _progress_users += 1
+    try:
+        yield
+    finally:
+        with _progress_lock:
+            _progress_users -= 1
+            if _progress_users == 0:
+                module.tqdm = tqdm
+
+
 def transcribe_video(video_path: str) -> list:
     """Transcribe video using Whisper with advanced options"""
     try:
@@ -22,12 +86,13 @@ def transcribe_video(video_path: str) -> list:
         model = _model_cache[model_name]
         logger.info(f"Starting transcription for: {video_path}")
         
-        result = model.transcribe(
-            video_path,
-            verbose=False,
-            word_timestamps=True,
-            fp16=False 
-        )
+        with _window_progress():
+            result = model.transcribe(
+                video_path,
+                verbose=False,
+                word_timestamps=True,
+                fp16=False 
+            )
         
         segments = result.get("segments", [])
         for seg in segments:
@@ -5,7 +5,7 @@ import logging
 from app.services import youtube_service
 from app.utils import storage, validation
 from moviepy.editor import VideoFileClip
-from app.utils.error_handlers import VideoProcessingError
+from app.utils.error_handlers import VideoProcessingError, InvalidRequestError
 from app.config import configuration
 
 logger = logging.getLogger(__name__)
@@ -29,11 +29,36 @@ def process_video_input(youtube_url=None, video_file=None, request_id=None):
             return storage.save_uploaded_file(video_file, request_id)
         else:
             raise VideoProcessingError("No valid video source provided")
+    except InvalidRequestError:
+        raise
     except Exception as e:
         logger.error(f"Video processing failed: {str(e)}")
         raise VideoProcessingError(f"Video processing error: {str(e)}")
 
 
+def process_youtube_audio(youtube_url, request_id):
+    """
+    Download only the audio of a YouTube video, for transcription ahead of the
+    video (YOUTUBE_INGEST_MODE=audio_first). Returns the audio file's path.
+    """
+    validation.validate_youtube_url(youtube_url)
+    return youtube_service.download_youtube_audio(
+        youtube_url,
+        max_duration=configuration.MAX_VIDEO_DURATION,
+        output_dir=os.path.join(configuration.UPLOAD_FOLDER, request_id)
+    )
+
+
+def fetch_youtube_ranges(youtube_url, ranges, request_id):
+    """
+    Download only ``ranges`` of a YouTube video's stream, joined into one file.
+    Returns (path, offsets) with the start of each range in that file.
+    """
+    return youtube_service.download_video_ranges(
+        youtube_url, ranges, output_dir=os.path.join(configuration.UPLOAD_FOLDER, request_id)
+    )
+
+
 def extract_video_segment(video_path, start, end, output_dir=None):
     """
     Extracts a segment from a video file and saves it in the specified output directory.
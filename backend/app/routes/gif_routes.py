@@ -1,96 +1,301 @@
 import os
+import json
 import uuid
 import logging
 import tempfile
 import shutil
-from flask import Flask, Blueprint, request, jsonify, send_file, current_app
-from app.core import video_processor, transcription, caption_selector, gif_generator
+from flask import Flask, Blueprint, Response, request, jsonify, send_file, current_app
+from app.config import configuration
+from app.core import video_processor, format_writers, pipeline, jobs, request_cache, admission
 from app.utils import storage, validation
-from app.utils.error_handlers import InvalidRequestError, VideoProcessingError
+from app.utils.error_handlers import InvalidRequestError, NoMomentsFoundError
 
 logger = logging.getLogger(__name__)
 
 bp = Blueprint("gif", __name__, url_prefix="/api/gif")
 
-@bp.route("/generate", methods=["POST"])
-def generate_gif():
+# Milliseconds an EventSource waits before reconnecting to a closed stream.
+SSE_RETRY_MS = 1000
+
+def _parse_generate_request(batch=False, background=False):
     """
-    Generate GIFs from video based on theme prompt.
-    Supports YouTube URLs or file uploads.
-    Returns a list of GIF URLs with metadata.
+    Validate the generate form (repeated ``prompts`` fields instead of
+    ``prompt`` when ``batch``), admit the request (see admission) and take
+    over its upload.
+
+    A completed resumable upload is priced where it lies and only claimed once
+    admitted, so a request turned away with 429 leaves its ``upload_id`` for a
+    retry. A plain upload has to be saved to be priced; it is deleted again if
+    the request is turned away. ``background`` requests (POST /jobs) get a
+    ticket for the job worker and are priced without asking YouTube.
+
+    Returns:
+        (request_id, pipeline arguments for pipeline.generate, or for
+        pipeline.generate_batch when ``batch``, admission ticket, its cost)
     """
     prompt = request.form.get("prompt", "").strip()
     youtube_url = request.form.get("youtube_url", "").strip()
     video_file = request.files.get("video")
+    upload_id = request.form.get("upload_id", "").strip()
+    upload_path = None
 
     try:
-        prompt = validation.validate_prompt(prompt)
+        if batch:
+            prompts = validation.validate_prompts(request.form.getlist("prompts"))
+        else:
+            prompt = validation.validate_prompt(prompt)
+        max_bytes = validation.validate_max_bytes(request.form.get("max_bytes"))
+        output_format = validation.validate_output_format(request.form.get("format"))
+        if max_bytes and output_format != "gif":
+            raise InvalidRequestError("max_bytes is only supported for GIF output.")
         if youtube_url:
             youtube_url = validation.validate_youtube_url(youtube_url)
+        elif upload_id:
+            storage.get_completed_upload(upload_id)
         elif video_file:
-            validation.is_allowed_file(video_file.filename)
+            if not validation.is_allowed_file(video_file.filename):
+                raise InvalidRequestError(
+                    f"Unsupported file type. Allowed: {', '.join(sorted(validation.ALLOWED_EXTENSIONS))}."
+                )
         else:
-            raise InvalidRequestError("Either YouTube URL or video file is required")
+            raise InvalidRequestError("Either YouTube URL, video file or upload_id is required")
     except Exception as e:
         logger.error(f"Validation failed: {str(e)}")
         raise
 
+    def admit(video_path=None):
+        cost = admission.request_cost(youtube_url or None, video_path, probe_url=not background)
+        return admission.get_ledger().admit(cost, owned=not background), cost
+
     request_id = uuid.uuid4().hex
     request_dir = os.path.join(current_app.config["UPLOAD_FOLDER"], request_id)
-    os.makedirs(request_dir, exist_ok=True)
 
-    try:
-        video_path = video_processor.process_video_input(
-            youtube_url=youtube_url, video_file=video_file, request_id=request_id
+    if youtube_url:
+        ticket, cost = admit()
+        os.makedirs(request_dir, exist_ok=True)
+    elif upload_id:
+        ticket, cost = admit(storage.get_completed_upload(upload_id))
+        try:
+            upload_path = storage.claim_completed_upload(upload_id, request_dir)
+        except Exception:
+            admission.get_ledger().release(ticket)
+            raise
+    else:
+        upload_path = video_processor.process_video_input(
+            youtube_url=None, video_file=video_file, request_id=request_id
         )
+        try:
+            ticket, cost = admit(upload_path)
+        except Exception:
+            shutil.rmtree(request_dir, ignore_errors=True)
+            raise
 
-        transcript = transcription.transcribe_video(video_path)
-
-        moments = caption_selector.select_key_moments(transcript, prompt)
-        if not moments:
-            logger.warning("No matching moments found using both Gemini and fallback methods.")
-            return jsonify({
-                "error": "No matching moments found in the video",
-                "request_id": request_id
-            }), 404
-
-        gif_paths = []
-        output_dir = current_app.config["GIF_OUTPUT_DIR"]
-        os.makedirs(output_dir, exist_ok=True)
-
-        for i, moment in enumerate(moments[:3]):
-            gif_filename = f"{request_id}_{i}.gif"
-            gif_path = os.path.join(output_dir, gif_filename)
-            gif_generator.generate_captioned_gif(
-                video_path, moment["start"], moment["end"], moment["text"], gif_path
-            )
-            gif_paths.append({
-                "id": i,
-                "url": f"/api/gif/download/{gif_filename}",
-                "caption": moment["text"],
-                "start": moment["start"],
-                "end": moment["end"],
-                "duration": moment["end"] - moment["start"],
-            })
-
-        content_analysis = caption_selector.analyze_transcript_content(
-            transcript, "Summarize the main themes in this video:"
-        )
+    arguments = {
+        "youtube_url": youtube_url or None,
+        "video_path": upload_path,
+        "max_bytes": max_bytes,
+        "output_format": output_format,
+    }
+    if batch:
+        arguments["prompts"] = prompts
+    else:
+        arguments["prompt"] = prompt
+    return request_id, arguments, ticket, cost
 
-        return jsonify({
-            "gifs": gif_paths,
-            "request_id": request_id,
-            "content_analysis": content_analysis,
-        }), 200
 
+def _queue_timeout():
+    return current_app.config.get("ADMISSION_QUEUE_TIMEOUT", configuration.ADMISSION_QUEUE_TIMEOUT)
+
+
+@bp.route("/generate", methods=["POST"])
+def generate_gif():
+    """
+    Generate GIFs from video based on theme prompt.
+    Supports YouTube URLs, file uploads, or the ``upload_id`` of a completed
+    resumable upload (see /api/upload).
+    Returns a list of GIF URLs with metadata.
+    An optional ``format`` form field selects gif (default), webp, mp4 or apng,
+    and ``max_bytes`` caps the size of each GIF.
+    Responds 429 with Retry-After when the node is at capacity (see admission).
+    """
+    request_id, arguments, ticket, _ = _parse_generate_request()
+
+    try:
+        with admission.held(ticket, _queue_timeout()):
+            response = pipeline.generate(
+                request_id, settings=pipeline.settings_from(current_app.config), **arguments
+            )
+        return jsonify(response), 200
+    except NoMomentsFoundError as e:
+        return jsonify({"error": str(e), "request_id": request_id}), 404
     except Exception as e:
         logger.exception("GIF generation failed")
         raise
 
+
+@bp.route("/batch", methods=["POST"])
+def generate_batch():
+    """
+    Generate GIFs for several themes of one video: repeated ``prompts`` form
+    fields (up to validation.MAX_BATCH_PROMPTS) with the other /generate
+    fields. The video is downloaded and transcribed once and a moment picked
+    by several themes is rendered once; each GIF lists its "themes", and
+    "themes" maps each prompt to its GIF IDs.
+    """
+    request_id, arguments, ticket, _ = _parse_generate_request(batch=True)
+
+    try:
+        with admission.held(ticket, _queue_timeout()):
+            response = pipeline.generate_batch(
+                request_id, settings=pipeline.settings_from(current_app.config), **arguments
+            )
+        return jsonify(response), 200
+    except NoMomentsFoundError as e:
+        return jsonify({"error": str(e), "request_id": request_id}), 404
+    except Exception as e:
+        logger.exception("Batch GIF generation failed")
+        raise
+
+
+@bp.route("/jobs", methods=["POST"])
+def create_job():
+    """
+    Queue GIF generation and return at once with a job ID.
+    Takes the same form fields as /generate, or those of /batch; poll
+    /jobs/<job_id> for progress.
+    The job is admitted (or refused with 429 and Retry-After) now and waits
+    for capacity in the queue, like a /generate request. If it waits longer
+    than ADMISSION_QUEUE_TIMEOUT it fails with the capacity error and a
+    ``retry_after`` in its result, and can be resubmitted.
+    """
+    request_id, arguments, ticket, cost = _parse_generate_request(
+        batch=bool(request.form.getlist("prompts")), background=True
+    )
+    try:
+        job = jobs.submit({
+            "request_id": request_id,
+            "settings": pipeline.settings_from(current_app.config),
+            "arguments": arguments,
+            "admission_ticket": ticket,
+            "admission_cost": list(cost),
+            "admission_timeout": _queue_timeout(),
+        })
+    except Exception:
+        admission.get_ledger().release(ticket)
+        raise
+    return jsonify({
+        "job_id": job["id"],
+        "request_id": request_id,
+        "status": job["status"],
+        "status_url": f"/api/gif/jobs/{job['id']}",
+        "events_url": f"/api/gif/jobs/{job['id']}/events",
+    }), 202
+
+
+@bp.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """
+    Report a job's status (queued, running, succeeded or failed), the status and
+    timing of each pipeline stage, and the GIF list once it has succeeded.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({
+        "job_id": job["id"],
+        "request_id": job["payload"]["request_id"],
+        "status": job["status"],
+        "stages": job["stages"],
+        "result": job["result"],
+        "error": job["error"],
+    })
+
+
+@bp.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """
+    A job's progress events: "stage" events as stages start and end,
+    "progress" events within them (download bytes and percent, transcription
+    windows, and each GIF as soon as it is rendered, with its URL) and a final
+    "job" event with the result or error.
+
+    By default the events so far are returned at once as JSON, for clients
+    that poll. Clients accepting text/event-stream (EventSource) get them as
+    Server-Sent Events instead. A stream holds one of the web worker's few
+    threads while open, so it closes after JOB_EVENTS_STREAM_SECONDS and
+    EventSource reconnects.
+
+    Each event carries its ID, so a client resumes with Last-Event-ID (or
+    ``?after=``) and nothing is missed.
+    """
+    if jobs.get(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+    after = request.headers.get("Last-Event-ID") or request.args.get("after") or 0
+    try:
+        after = int(after)
+    except ValueError:
+        raise InvalidRequestError("Last-Event-ID must be an event ID.")
+
+    if request.accept_mimetypes.best_match(["application/json", "text/event-stream"]) != "text/event-stream":
+        events = jobs.events(job_id, after)
+        return jsonify({
+            "job_id": job_id,
+            "events": [{"id": event_id, "event": event, "data": data} for event_id, event, data in events],
+            "last_event_id": events[-1][0] if events else after,
+        })
+
+    poll_interval = current_app.config.get("JOB_EVENTS_POLL_INTERVAL")
+    max_seconds = current_app.config.get("JOB_EVENTS_STREAM_SECONDS")
+
+    def stream():
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        for item in jobs.follow(job_id, after, poll_interval, max_seconds):
+            if item is None:
+                yield ": keepalive\n\n"
+                continue
+            event_id, event, data = item
+            yield f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@bp.route("/render", methods=["POST"])
+def render_range():
+    """
+    Re-render a custom range of an earlier request: ``request_id``, ``start``
+    and ``end`` (seconds), an optional ``caption`` (the transcript of the
+    range by default) and the ``format`` / ``max_bytes`` options of /generate.
+    Uses the request's retained source and transcript, so only the render
+    runs. Requests are kept SOURCE_RETENTION_HOURS after their last use.
+    """
+    request_id = validation.validate_request_id(request.form.get("request_id"))
+    start, end = validation.validate_time_range(request.form.get("start"), request.form.get("end"))
+    caption = request.form.get("caption")
+    caption = caption.strip() if caption and caption.strip() else None
+    max_bytes = validation.validate_max_bytes(request.form.get("max_bytes"))
+    output_format = validation.validate_output_format(request.form.get("format"))
+    if max_bytes and output_format != "gif":
+        raise InvalidRequestError("max_bytes is only supported for GIF output.")
+
+    retained = request_cache.load(current_app.config["UPLOAD_FOLDER"], request_id)
+    if retained is None:
+        return jsonify({"error": "Request not found or no longer retained", "request_id": request_id}), 404
+
+    gif = pipeline.rerender(
+        request_id, retained, start, end, pipeline.settings_from(current_app.config),
+        caption=caption, max_bytes=max_bytes, output_format=output_format,
+    )
+    return jsonify({"request_id": request_id, "gif": gif}), 200
+
+
 @bp.route("/download/<filename>", methods=["GET"])
 def download_gif(filename):
     """
-    Download a generated GIF.
+    Download a generated GIF (or WebP/MP4/APNG animation).
     """
     gif_path = os.path.join(current_app.config["GIF_OUTPUT_DIR"], filename)
     if not os.path.exists(gif_path):
@@ -98,7 +303,7 @@ def download_gif(filename):
         return jsonify({"error": "GIF not found"}), 404
 
     logger.info(f"Serving GIF: {gif_path}")
-    return send_file(gif_path, mimetype="image/gif")
+    return send_file(gif_path, mimetype=format_writers.mimetype_for(filename))
 
 
 if __name__ == "__main__":
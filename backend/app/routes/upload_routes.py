@@ -0,0 +1,76 @@
+import logging
+from flask import Blueprint, request, jsonify
+from app.utils import storage
+from app.utils.error_handlers import InvalidRequestError
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint("upload", __name__, url_prefix="/api/upload")
+
+
+def _session_response(session):
+    return {
+        "upload_id": session["upload_id"],
+        "filename": session["filename"],
+        "offset": session["offset"],
+        "total_size": session["total_size"],
+        "content_hash": session["content_hash"],
+        "chunk_size": storage.UPLOAD_CHUNK_SIZE,
+    }
+
+
+def _optional_int(name, value):
+    if value is None or not str(value).strip():
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        raise InvalidRequestError(f"{name} must be an integer.")
+    if number < 0:
+        raise InvalidRequestError(f"{name} must not be negative.")
+    return number
+
+
+@bp.route("", methods=["POST"])
+def create_upload():
+    """
+    Start a resumable upload.
+    Form fields: ``filename`` and optionally ``total_size`` in bytes.
+    """
+    session = storage.create_upload_session(
+        request.form.get("filename", ""),
+        _optional_int("total_size", request.form.get("total_size")),
+    )
+    logger.info(f"Created upload {session['upload_id']} for {session['filename']}")
+    return jsonify(_session_response(session)), 201
+
+
+@bp.route("/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    """Report how many bytes were received, to resume an interrupted upload."""
+    return jsonify(_session_response(storage.get_upload_session(upload_id)))
+
+
+@bp.route("/<upload_id>/chunk", methods=["POST"])
+def append_chunk(upload_id):
+    """
+    Append the raw request body at the ``offset`` query parameter, which must
+    equal the bytes received so far (409 with the current offset otherwise).
+    """
+    offset = _optional_int("offset", request.args.get("offset"))
+    if offset is None:
+        raise InvalidRequestError("offset is required.")
+    session = storage.append_upload_chunk(upload_id, offset, request.stream)
+    return jsonify(_session_response(session))
+
+
+@bp.route("/<upload_id>/complete", methods=["POST"])
+def complete_upload(upload_id):
+    """
+    Finish an upload. An optional ``content_hash`` form field is checked
+    against the hash of the received bytes. The returned ``upload_id`` can then
+    be passed once to /api/gif/generate instead of a video file; that request
+    takes the file over and the upload is deleted.
+    """
+    session = storage.complete_upload(upload_id, request.form.get("content_hash"))
+    return jsonify(_session_response(session))
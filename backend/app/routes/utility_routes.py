@@ -1,9 +1,10 @@
-from flask import Blueprint, jsonify, current_app
+from flask import Blueprint, Response, jsonify, current_app
 import logging
 
 import os
 import shutil
 from app.config import configuration
+from app.core import admission
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +37,42 @@ def show_config():
     })
 
 
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Admission metrics of the node in the Prometheus text format: queue depth,
+    running requests, budget use, and admissions and rejections by reason
+    """
+    stats = admission.get_ledger().stats()
+    counters = stats["counters"]
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{labels} {value}")
+
+    metric("gif_admission_queue_depth", "gauge", "Requests waiting for capacity.", [("", stats["queued"])])
+    metric("gif_admission_queue_max", "gauge", "Requests that may wait before new ones are rejected.",
+           [("", stats["queue_max"])])
+    metric("gif_admission_running", "gauge", "Requests holding capacity.", [("", stats["running"])])
+    metric("gif_admission_cpu_in_use", "gauge", "Cores held by running requests.", [("", stats["cpu_in_use"])])
+    metric("gif_admission_cpu_budget", "gauge", "Cores available to requests.", [("", stats["cpu_budget"])])
+    metric("gif_admission_memory_in_use_bytes", "gauge", "Memory held by running requests.",
+           [("", stats["memory_in_use"])])
+    metric("gif_admission_memory_budget_bytes", "gauge", "Memory available to requests.",
+           [("", stats["memory_budget"])])
+    metric("gif_admission_admitted_total", "counter", "Requests started.", [("", counters.get("admitted", 0))])
+    metric("gif_admission_queued_total", "counter", "Requests that had to wait for capacity.",
+           [("", counters.get("queued", 0))])
+    metric("gif_admission_rejections_total", "counter", "Requests rejected with 429.", [
+        ('{reason="queue_full"}', counters.get("rejected_queue_full", 0)),
+        ('{reason="wait_timeout"}', counters.get("rejected_wait_timeout", 0)),
+    ])
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+
 @bp.route('/cleanup', methods=['POST'])
 def cleanup_temp_files():
     """
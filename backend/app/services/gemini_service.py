@@ -62,13 +62,6 @@ def select_key_moments(
     """
     _init_gemini_model()
 
-    transcript_text = ""
-    for seg in transcript_segments:
-        start_ts = seg.get("start", 0.0)
-        end_ts = seg.get("end", 0.0)
-        text = seg.get("text", "").replace("\n", " ").strip()
-        transcript_text += f"[{start_ts:.1f}-{end_ts:.1f}] {text}\n"
-
     system_prompt = (
         f"You are a transcript analyzer. Select the top {max_moments} segments "
         f"related to the theme '{theme_prompt}'.\n"
@@ -81,24 +74,92 @@ def select_key_moments(
         "}\n\n"
     )
 
-    full_prompt = system_prompt + transcript_text
+    data = _generate_json(system_prompt + _format_transcript(transcript_segments))
+    return _clean_moments(data.get("moments", []), max_moments)
+
+
+def select_key_moments_batch(
+    transcript_segments: List[Dict[str, float]],
+    theme_prompts: List[str],
+    max_moments: int = 3
+) -> List[List[Dict[str, float]]]:
+    """
+    Select key segments for several themes in one Gemini call, so the
+    transcript is sent (and billed) once rather than once per theme.
+    Args:
+        transcript_segments: List of dicts with keys "start", "end", "text".
+        theme_prompts: The themes, e.g. ["funny", "emotional"].
+        max_moments: Maximum number of segments per theme.
+
+    Returns:
+        A list in the same order as ``theme_prompts`` of moment lists, as
+        returned by select_key_moments; themes Gemini skipped get [].
+    Raises:
+        CaptionSelectionError: if Gemini fails or parsing the output fails.
+    """
+    _init_gemini_model()
+
+    themes = "".join(f"{i}. {theme}\n" for i, theme in enumerate(theme_prompts, start=1))
+    system_prompt = (
+        f"You are a transcript analyzer. For each numbered theme below, select the top "
+        f"{max_moments} segments related to that theme.\n"
+        f"Themes:\n{themes}"
+        "Return ONLY this JSON format, with no extra commentary:\n"
+        "{\n"
+        "  \"themes\": [\n"
+        "    {\"theme\": int, \"moments\": [{\"start\": float, \"end\": float, \"text\": string}, ...]},\n"
+        "    ...\n"
+        "  ]\n"
+        "}\n\n"
+    )
+
+    data = _generate_json(system_prompt + _format_transcript(transcript_segments))
+    entries = data.get("themes", [])
+    if not isinstance(entries, list):
+        raise CaptionSelectionError("Invalid Gemini format: 'themes' is not a list")
+
+    selected = [[] for _ in theme_prompts]
+    for position, entry in enumerate(entries):
+        try:
+            index = int(entry.get("theme", position + 1)) - 1
+        except (AttributeError, TypeError, ValueError):
+            logger.warning(f"Skipping invalid theme entry {entry}")
+            continue
+        if 0 <= index < len(theme_prompts):
+            selected[index] = _clean_moments(entry.get("moments", []), max_moments)
+    return selected
 
+
+def _format_transcript(transcript_segments):
+    transcript_text = ""
+    for seg in transcript_segments:
+        start_ts = seg.get("start", 0.0)
+        end_ts = seg.get("end", 0.0)
+        text = seg.get("text", "").replace("\n", " ").strip()
+        transcript_text += f"[{start_ts:.1f}-{end_ts:.1f}] {text}\n"
+    return transcript_text
+
+
+def _generate_json(full_prompt):
+    """Send a prompt to Gemini and parse the JSON object in its response."""
+    raw_text = ""
     try:
         response = _model.generate_content(full_prompt)
         raw_text = response.text.strip()
-        data = json.loads(raw_text)
+        return json.loads(raw_text)
     except Exception:
         try:
             logger.warning("Direct JSON parse failed; attempting to extract JSON block from response.")
             start_idx = raw_text.index("{")
             end_idx = raw_text.rindex("}") + 1
             snippet = raw_text[start_idx:end_idx]
-            data = json.loads(snippet)
+            return json.loads(snippet)
         except Exception as ee:
             logger.error(f"Gemini JSON parse failed: {ee}\nRaw response:\n{raw_text}")
             raise CaptionSelectionError("Failed to parse JSON from Gemini output")
 
-    moments = data.get("moments", [])
+
+def _clean_moments(moments, max_moments):
     if not isinstance(moments, list):
         raise CaptionSelectionError("Invalid Gemini format: 'moments' is not a list")
 
@@ -1,16 +1,86 @@
 import os
+import copy
+import time
 import tempfile
+import threading
 import uuid
 import logging
-from moviepy.editor import VideoFileClip
 
 from yt_dlp import YoutubeDL
+from yt_dlp.extractor.youtube import YoutubeIE
 from yt_dlp.utils import DownloadError, ExtractorError
 
+from app.config import configuration
+from app.core import source_cache, progress
 from app.utils.error_handlers import VideoProcessingError
+from app.utils.ffmpeg_tools import run_ffmpeg
 
 logger = logging.getLogger(__name__)
 
+YDL_OPTIONS = {
+    "quiet": True,
+    "noprogress": True,
+    "noplaylist": True,
+    # Mimic a modern browser User-Agent to improve compatibility with YouTube
+    "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                  "AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/137.0.0.0 Safari/537.36",
+    # Bypass geographic restrictions if possible
+    "geo_bypass": True,
+    # Setting a Referer header similar to a normal browser request
+    "http_headers": {
+        "Referer": "https://www.youtube.com",
+    },
+    "youtube_include_dash_manifest": False,
+}
+
+AUDIO_FORMAT = "worstaudio/bestaudio"
+VIDEO_FORMAT = "best[ext=mp4]"
+RANGE_PRESET = "veryfast"
+RANGE_CRF = 18
+DOWNLOAD_PROGRESS_INTERVAL = 0.5
+
+# video key -> (expiry on the monotonic clock, unprocessed info dict)
+_info_cache = {}
+_info_lock = threading.Lock()
+
+
+def _youtube_dl(params):
+    return YoutubeDL(params)
+
+
+def video_key(url):
+    """Canonical key of a YouTube URL: its video ID, or the URL itself if none is found."""
+    return YoutubeIE.get_temp_id(url) or url
+
+
+def extract_info(url):
+    """
+    Extract the info dict of a video without processing formats or downloading.
+
+    Extraction means fetching the watch page and player JS, which takes seconds,
+    so the result is cached per video ID for YOUTUBE_INFO_TTL seconds and each
+    caller gets its own copy. The same dict feeds the metadata, the duration
+    check and the download (via ``process_ie_result``).
+    """
+    key = video_key(url)
+    now = time.monotonic()
+    with _info_lock:
+        cached = _info_cache.get(key)
+        if cached and cached[0] > now:
+            logger.info(f"Using cached yt-dlp info for {key}")
+            return copy.deepcopy(cached[1])
+
+    logger.info(f"Extracting info for: {url} using yt-dlp")
+    with _youtube_dl({**YDL_OPTIONS, "skip_download": True}) as ydl:
+        info = ydl.extract_info(url, download=False, process=False)
+
+    with _info_lock:
+        for stale in [k for k, (expiry, _) in _info_cache.items() if expiry <= now]:
+            del _info_cache[stale]
+        _info_cache[key] = (now + configuration.YOUTUBE_INFO_TTL, info)
+    return copy.deepcopy(info)
+
 
 def get_video_metadata(url):
     """
@@ -22,26 +92,8 @@ def get_video_metadata(url):
     Returns:
         dict: Video metadata (title, uploader, duration, thumbnail, view_count)
     """
-    ydl_opts = {
-        "quiet": True,
-        "skip_download": True,
-        "forcejson": True,
-        # Mimic a modern browser User-Agent to improve compatibility with YouTube
-        "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                      "AppleWebKit/537.36 (KHTML, like Gecko) "
-                      "Chrome/137.0.0.0 Safari/537.36",
-        # Bypass geographic restrictions if possible
-        "geo_bypass": True,
-        # Setting a Referer header similar to a normal browser request
-        "http_headers": {
-            "Referer": "https://www.youtube.com",
-        },
-        "youtube_include_dash_manifest": False,
-    }
     try:
-        logger.info(f"Fetching metadata for: {url} using yt-dlp")
-        with YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
+        info = extract_info(url)
         return {
             "title": info.get("title"),
             "author": info.get("uploader"),
@@ -54,62 +106,158 @@ def get_video_metadata(url):
         raise VideoProcessingError(f"YouTube metadata fetch failed: {e}")
 
 
-def download_youtube_video(url, max_duration=None, output_dir=None):
-    """
-    Download YouTube video with output directory support.
-    """
+def _checked_info(url, max_duration):
     try:
-        meta = get_video_metadata(url)
-    except VideoProcessingError:
-        raise
-
-    length = meta.get("length", 0)
+        info = extract_info(url)
+    except (DownloadError, ExtractorError, Exception) as e:
+        logger.error(f"yt-dlp extraction failed: {e}")
+        raise VideoProcessingError(f"YouTube metadata fetch failed: {e}")
+    length = info.get("duration") or 0
     if max_duration is not None and length and length > max_duration:
         raise VideoProcessingError(
             f"Video duration ({length}s) exceeds allowed max ({max_duration}s)"
         )
+    return info
 
-    if output_dir:
-        os.makedirs(output_dir, exist_ok=True)
-        temp_path = os.path.join(output_dir, f"yt_{uuid.uuid4().hex}.mp4")
-    else:
-        temp_path = tempfile.mktemp(suffix=".mp4")
-
-    ydl_opts = {
-        "outtmpl": temp_path,
-        "format": "best[ext=mp4]",
-        "quiet": True,
-        "noprogress": True,
-        # Use the same custom User-Agent for downloads
-        "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                      "AppleWebKit/537.36 (KHTML, like Gecko) "
-                      "Chrome/137.0.0.0 Safari/537.36",
-        "geo_bypass": True,
-        "http_headers": {
-            "Referer": "https://www.youtube.com",
-        },
-        "youtube_include_dash_manifest": False,
-    }
 
-    try:
-        logger.info(f"Downloading YouTube video: {url}")
-        with YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+def _progress_hook():
+    """yt-dlp progress hook reporting downloaded bytes to the pipeline's progress stream."""
+    throttle = progress.Throttle(DOWNLOAD_PROGRESS_INTERVAL)
 
-        if not os.path.exists(temp_path):
-            raise VideoProcessingError(f"Expected download at {temp_path} not found")
+    def hook(status):
+        if status["status"] not in ("downloading", "finished"):
+            return
+        if not throttle.ready(force=status["status"] == "finished"):
+            return
+        downloaded = status.get("downloaded_bytes") or 0
+        total = status.get("total_bytes") or status.get("total_bytes_estimate")
+        details = {"downloaded_bytes": downloaded, "total_bytes": total}
+        if total:
+            details["percent"] = round(min(100.0, 100.0 * downloaded / total), 1)
+        progress.emit("download", **details)
 
-        logger.info(f"Downloaded to: {temp_path}")
-        return temp_path
+    return hook
+
+
+def _download(url, max_duration, output_dir, prefix, format_spec):
+    """
+    Download ``format_spec`` of a video through the node-local source cache,
+    keyed by video ID and format, and return a hardlink to it in ``output_dir``.
+
+    Only a cache miss extracts the video and checks ``max_duration``; cached
+    entries passed that check when they were downloaded.
+    """
+    output_dir = output_dir or tempfile.mkdtemp()
+
+    def download(directory):
+        info = _checked_info(url, max_duration)
+        ydl_opts = {
+            **YDL_OPTIONS,
+            "outtmpl": os.path.join(directory, "source.%(ext)s"),
+            "format": format_spec,
+            "progress_hooks": [_progress_hook()],
+        }
+        logger.info(f"Downloading YouTube {format_spec}: {url}")
+        with _youtube_dl(ydl_opts) as ydl:
+            result = ydl.process_ie_result(info, download=True)
+        return result["requested_downloads"][0]["filepath"]
 
+    try:
+        path = source_cache.fetch(
+            source_cache.cache_key(video_key(url), format_spec),
+            os.path.join(output_dir, f"{prefix}_{uuid.uuid4().hex}"),
+            download,
+        )
+    except VideoProcessingError:
+        raise
     except (DownloadError, ExtractorError, Exception) as e:
         logger.error(f"yt-dlp download failed: {e}")
-        if os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-            except OSError:
-                pass
         raise VideoProcessingError(f"YouTube download failed: {e}")
+    logger.info(f"Downloaded to: {path}")
+    return path
+
+
+def download_youtube_video(url, max_duration=None, output_dir=None):
+    """
+    Download YouTube video with output directory support.
+    The video is extracted once; its info dict is checked against
+    ``max_duration`` and then downloaded without extracting it again.
+    """
+    return _download(url, max_duration, output_dir, "yt", VIDEO_FORMAT)
+
+
+def download_youtube_audio(url, max_duration=None, output_dir=None):
+    """
+    Download only the smallest audio-only format of a video, which is all
+    transcription needs. Returns the path of the audio file.
+    """
+    return _download(url, max_duration, output_dir, "yt_audio", AUDIO_FORMAT)
+
+
+def download_video_ranges(url, ranges, output_dir=None, box=None):
+    """
+    Fetch only the given time ranges of a video and join them into one MP4.
+
+    ffmpeg seeks into the stream URL of the selected format with HTTP range
+    requests, so only the bytes around each range are downloaded. Frames are
+    re-encoded (seeking is frame-accurate) and scaled to fit ``box``
+    (GIF_RESOLUTION by default) without upscaling; audio is dropped.
+
+    Args:
+        url: YouTube URL.
+        ranges: List of (start, end) times in seconds.
+        output_dir: Directory for the joined file.
+        box: Optional (width, height) to fit frames into.
+
+    Returns:
+        (path, offsets): the joined file and, for each range, the time at which
+        it starts in that file.
+    """
+    box = box or configuration.GIF_RESOLUTION
+    info = _checked_info(url, None)
+    try:
+        with _youtube_dl({**YDL_OPTIONS, "format": VIDEO_FORMAT}) as ydl:
+            selected = ydl.process_ie_result(info, download=False)
+    except (DownloadError, ExtractorError, Exception) as e:
+        logger.error(f"yt-dlp format selection failed: {e}")
+        raise VideoProcessingError(f"YouTube format selection failed: {e}")
+
+    stream_url = selected["url"]
+    input_options = []
+    if stream_url.startswith("http"):
+        headers = "".join(f"{k}: {v}\r\n" for k, v in selected.get("http_headers", {}).items())
+        input_options = ["-headers", headers]
+
+    output_dir = output_dir or tempfile.mkdtemp()
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, f"yt_ranges_{uuid.uuid4().hex}.mp4")
+
+    args, offsets, position = [], [], 0.0
+    for start, end in ranges:
+        args += [*input_options, "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", stream_url]
+        offsets.append(position)
+        position += end - start
+    inputs = "".join(f"[{i}:v:0]" for i in range(len(ranges)))
+    filtergraph = (
+        f"{inputs}concat=n={len(ranges)}:v=1:a=0,"
+        f"scale='min(iw,{box[0]})':'min(ih,{box[1]})':force_original_aspect_ratio=decrease:force_divisible_by=2[v]"
+    )
+    try:
+        logger.info(f"Downloading {len(ranges)} ranges ({position:.1f}s) of {url}")
+        run_ffmpeg([
+            *args,
+            "-filter_complex", filtergraph,
+            "-map", "[v]",
+            "-c:v", "libx264", "-preset", RANGE_PRESET, "-crf", str(RANGE_CRF),
+            "-pix_fmt", "yuv420p", "-movflags", "+faststart",
+            output_path,
+        ])
+    except Exception as e:
+        logger.error(f"Range download failed: {e}")
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise VideoProcessingError(f"YouTube range download failed: {e}")
+    return output_path, offsets
 
 
 if __name__ == "__main__":
@@ -132,9 +280,11 @@ if __name__ == "__main__":
         path = download_youtube_video(test_url, max_duration=600)
         print(f"Downloaded to: {path}")
 
-        with VideoFileClip(path) as clip:
-            print(f"Duration: {clip.duration} seconds")
-            print(f"Resolution: {clip.size}")
+        from app.core import media_info
+        media = media_info.load(path)
+        print(f"Duration: {media.duration} seconds")
+        print(f"Resolution: {media.display_size}")
+        os.remove(path + media_info.CACHE_SUFFIX)
 
         os.remove(path)
         print("Temporary file deleted.")
@@ -20,11 +20,37 @@ class GIFGenerationError(Exception):
     """Custom exception for GIF generation failures"""
     pass
 
+class NoMomentsFoundError(Exception):
+    """Raised when no moment of the transcript matches the prompt"""
+    pass
+
+class UploadOffsetError(Exception):
+    """Raised when a resumable upload chunk does not start at the received offset"""
+    def __init__(self, offset):
+        super().__init__(f"Chunk must start at offset {offset}")
+        self.offset = offset
+
+class OverloadedError(Exception):
+    """Raised when the node has no capacity left for a request, even queued"""
+    def __init__(self, retry_after):
+        super().__init__("The service is at capacity; retry later")
+        self.retry_after = retry_after
+
 def register_error_handlers(app):
     @app.errorhandler(InvalidRequestError)
     def handle_invalid_request(error):
         return jsonify({"error": str(error)}), 400
         
+    @app.errorhandler(UploadOffsetError)
+    def handle_upload_offset(error):
+        return jsonify({"error": str(error), "offset": error.offset}), 409
+
+    @app.errorhandler(OverloadedError)
+    def handle_overloaded(error):
+        response = jsonify({"error": str(error), "retry_after": error.retry_after})
+        response.headers["Retry-After"] = str(error.retry_after)
+        return response, 429
+
     @app.errorhandler(VideoProcessingError)
     def handle_video_processing(error):
         return jsonify({"error": f"Video processing error: {str(error)}"}), 400
@@ -0,0 +1,58 @@
+import os
+import shutil
+import logging
+import subprocess
+
+from moviepy.config import get_setting
+
+logger = logging.getLogger(__name__)
+
+
+def get_ffmpeg_binary() -> str:
+    """Return the ffmpeg executable moviepy is configured to use."""
+    return get_setting("FFMPEG_BINARY")
+
+
+def run_ffmpeg(args, timeout=None) -> subprocess.CompletedProcess:
+    """
+    Run ffmpeg with the given arguments and return the completed process.
+    Raises RuntimeError with the tail of ffmpeg's stderr on a non-zero exit.
+    """
+    cmd = [get_ffmpeg_binary(), "-hide_banner", "-nostdin", "-y", *args]
+    logger.debug(f"Running: {' '.join(cmd)}")
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+    if proc.returncode != 0:
+        stderr = proc.stderr.decode("utf-8", errors="replace").strip()
+        raise RuntimeError(f"ffmpeg exited with code {proc.returncode}: {stderr[-500:]}")
+    return proc
+
+
+def get_ffprobe_binary():
+    """
+    Return an ffprobe executable, or None if there is none.
+
+    FFPROBE_BINARY wins; otherwise ffprobe is looked up next to moviepy's ffmpeg
+    and then on PATH (the ffmpeg bundled with imageio-ffmpeg ships without it).
+    """
+    configured = os.getenv("FFPROBE_BINARY")
+    if configured:
+        return configured
+    ffmpeg = get_ffmpeg_binary()
+    sibling = os.path.join(os.path.dirname(ffmpeg), os.path.basename(ffmpeg).replace("ffmpeg", "ffprobe"))
+    if os.path.dirname(ffmpeg) and sibling != ffmpeg and os.access(sibling, os.X_OK):
+        return sibling
+    return shutil.which("ffprobe")
+
+
+def run_ffprobe(args, timeout=None) -> subprocess.CompletedProcess:
+    """
+    Run ffprobe with the given arguments and return the completed process.
+    Raises RuntimeError with the tail of ffprobe's stderr on a non-zero exit.
+    """
+    cmd = [get_ffprobe_binary(), "-hide_banner", "-v", "error", *args]
+    logger.debug(f"Running: {' '.join(cmd)}")
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+    if proc.returncode != 0:
+        stderr = proc.stderr.decode("utf-8", errors="replace").strip()
+        raise RuntimeError(f"ffprobe exited with code {proc.returncode}: {stderr[-500:]}")
+    return proc
@@ -1,6 +1,20 @@
 import os
+import json
 import uuid
+import fcntl
+import shutil
+import hashlib
+import logging
 from flask import current_app
+from werkzeug.utils import secure_filename
+from .error_handlers import InvalidRequestError, UploadOffsetError
+from . import validation
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_SESSIONS_DIR = "_sessions"
+UPLOAD_SESSION_FILE = "session.json"
 
 def generate_unique_filename(original_filename: str):
     """Prepend a UUID to the secure filename to avoid collisions."""
@@ -26,4 +40,265 @@ def cleanup_file(path: str):
     try:
         os.remove(path)
     except OSError:
-        pass
\ No newline at end of file
+        pass
+
+class ContentHasher:
+    """
+    Content hash computed while a file is written: the SHA-256 of the
+    concatenated SHA-256 digests of its UPLOAD_CHUNK_SIZE blocks.
+
+    Only the digests of complete blocks are state, so a resumable upload can
+    carry on hashing in another process after re-reading at most one partial
+    block from disk. Clients can compute it on their side to have a resumable
+    upload checked end to end (see complete_upload).
+    """
+
+    def __init__(self, block_digests=(), tail=b""):
+        self.block_digests = list(block_digests)
+        self._block = hashlib.sha256(tail)
+        self._block_len = len(tail)
+
+    def update(self, data):
+        view = memoryview(data)
+        while view:
+            take = min(len(view), UPLOAD_CHUNK_SIZE - self._block_len)
+            self._block.update(view[:take])
+            self._block_len += take
+            view = view[take:]
+            if self._block_len == UPLOAD_CHUNK_SIZE:
+                self.block_digests.append(self._block.hexdigest())
+                self._block = hashlib.sha256()
+                self._block_len = 0
+
+    def hexdigest(self):
+        digests = self.block_digests + ([self._block.hexdigest()] if self._block_len else [])
+        return hashlib.sha256("".join(digests).encode()).hexdigest()
+
+
+def _copy_stream(stream, f, hasher=None, first_chunk=b"", limit=None):
+    """Copy ``stream`` to ``f`` in UPLOAD_CHUNK_SIZE reads, hashing as it goes if given a hasher; return bytes written."""
+    written = 0
+    chunk = first_chunk or stream.read(UPLOAD_CHUNK_SIZE)
+    while chunk:
+        written += len(chunk)
+        if limit is not None and written > limit:
+            raise InvalidRequestError(f"Upload exceeds the maximum size of {limit} bytes.")
+        f.write(chunk)
+        if hasher:
+            hasher.update(chunk)
+        chunk = stream.read(UPLOAD_CHUNK_SIZE)
+    return written
+
+
+def save_uploaded_file(file_storage, request_id: str) -> str:
+    """
+    Stream an uploaded FileStorage into the request's upload directory.
+
+    The body is read in UPLOAD_CHUNK_SIZE pieces, never whole. The first
+    chunk is checked for a video container signature before anything is
+    written, so a mislabelled upload is never stored. The file lives only as
+    long as its request, so it is not hashed: nothing would look it up by
+    content.
+
+    Returns:
+        The path of the saved file.
+    """
+    if not file_storage or not file_storage.filename:
+        raise InvalidRequestError("No file provided.")
+    filename = secure_filename(file_storage.filename)
+    if not validation.is_allowed_file(filename):
+        raise InvalidRequestError(f"Unsupported file type: {filename}")
+
+    head = file_storage.stream.read(UPLOAD_CHUNK_SIZE)
+    validation.validate_video_signature(head)
+
+    request_dir = os.path.join(get_upload_folder(), request_id)
+    ensure_directory(request_dir)
+    dst_path = os.path.join(request_dir, generate_unique_filename(filename))
+    partial_path = dst_path + ".part"
+    try:
+        with open(partial_path, "wb") as f:
+            size = _copy_stream(file_storage.stream, f, first_chunk=head)
+        os.replace(partial_path, dst_path)
+    except Exception:
+        cleanup_file(partial_path)
+        raise
+    logger.info(f"Saved upload {filename} to {dst_path} ({size} bytes)")
+    return dst_path
+
+
+def _session_dir(upload_id: str) -> str:
+    if not upload_id or not all(c in "0123456789abcdef" for c in upload_id):
+        raise InvalidRequestError("Invalid upload id.")
+    path = os.path.join(get_upload_folder(), UPLOAD_SESSIONS_DIR, upload_id)
+    if not os.path.isdir(path):
+        raise InvalidRequestError(f"Unknown upload: {upload_id}")
+    return path
+
+
+def _read_session(session_dir: str) -> dict:
+    with open(os.path.join(session_dir, UPLOAD_SESSION_FILE)) as f:
+        return json.load(f)
+
+
+def _write_session(session_dir: str, session: dict):
+    tmp_path = os.path.join(session_dir, UPLOAD_SESSION_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(session, f)
+    os.replace(tmp_path, os.path.join(session_dir, UPLOAD_SESSION_FILE))
+
+
+def create_upload_session(filename: str, total_size=None) -> dict:
+    """
+    Start a resumable upload of ``filename``.
+
+    Returns:
+        The session: "upload_id", "filename", "offset" (bytes received) and
+        "total_size" (None if the client did not announce it).
+    """
+    filename = secure_filename(filename or "")
+    if not validation.is_allowed_file(filename):
+        raise InvalidRequestError(f"Unsupported file type: {filename}")
+    max_size = current_app.config["MAX_UPLOAD_SIZE"]
+    if total_size is not None and total_size > max_size:
+        raise InvalidRequestError(f"Upload exceeds the maximum size of {max_size} bytes.")
+
+    upload_id = uuid.uuid4().hex
+    session_dir = os.path.join(get_upload_folder(), UPLOAD_SESSIONS_DIR, upload_id)
+    os.makedirs(session_dir)
+    open(os.path.join(session_dir, "data.part"), "wb").close()
+    session = {
+        "upload_id": upload_id,
+        "filename": filename,
+        "offset": 0,
+        "total_size": total_size,
+        "block_digests": [],
+        "content_hash": None,
+        "path": None,
+    }
+    _write_session(session_dir, session)
+    return session
+
+
+def get_upload_session(upload_id: str) -> dict:
+    return _read_session(_session_dir(upload_id))
+
+
+def append_upload_chunk(upload_id: str, offset: int, stream) -> dict:
+    """
+    Append the bytes of ``stream`` to an upload at ``offset``.
+
+    ``offset`` must equal the bytes already received; otherwise
+    UploadOffsetError reports the offset to resume from. Appends to one
+    upload are serialized with a file lock, so they may come through any
+    worker process.
+    """
+    session_dir = _session_dir(upload_id)
+    try:
+        f = open(os.path.join(session_dir, "data.part"), "r+b")
+    except FileNotFoundError:
+        raise InvalidRequestError("Upload is already complete.")
+    with f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        session = _read_session(session_dir)
+        if session["content_hash"]:
+            raise InvalidRequestError("Upload is already complete.")
+        if offset != session["offset"]:
+            raise UploadOffsetError(session["offset"])
+
+        # Continue hashing from the last complete block; only the partial
+        # block after it is read back from disk.
+        block_start = len(session["block_digests"]) * UPLOAD_CHUNK_SIZE
+        f.seek(block_start)
+        hasher = ContentHasher(session["block_digests"], f.read(offset - block_start))
+        f.seek(offset)
+        f.truncate()
+
+        first_chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        if offset == 0:
+            validation.validate_video_signature(first_chunk)
+        limit = current_app.config["MAX_UPLOAD_SIZE"] - offset
+        if session["total_size"] is not None:
+            limit = min(limit, session["total_size"] - offset)
+        try:
+            written = _copy_stream(stream, f, hasher, first_chunk, limit) if first_chunk else 0
+        except InvalidRequestError:
+            f.truncate(offset)
+            raise
+        f.flush()
+
+        session["offset"] = offset + written
+        session["block_digests"] = hasher.block_digests
+        _write_session(session_dir, session)
+    return session
+
+
+def complete_upload(upload_id: str, expected_hash=None) -> dict:
+    """
+    Finish a resumable upload, naming the file after its content hash.
+
+    If the client sends ``expected_hash`` (see ContentHasher), a mismatch
+    fails the upload so it can be resumed or restarted.
+    """
+    session_dir = _session_dir(upload_id)
+    data_path = os.path.join(session_dir, "data.part")
+    try:
+        f = open(data_path, "rb")
+    except FileNotFoundError:
+        return _read_session(session_dir)
+    with f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        session = _read_session(session_dir)
+        if session["content_hash"]:
+            return session
+        if session["offset"] == 0:
+            raise InvalidRequestError("Upload is empty.")
+        if session["total_size"] is not None and session["offset"] != session["total_size"]:
+            raise InvalidRequestError(
+                f"Upload is incomplete: {session['offset']} of {session['total_size']} bytes received."
+            )
+
+        block_start = len(session["block_digests"]) * UPLOAD_CHUNK_SIZE
+        f.seek(block_start)
+        hasher = ContentHasher(session["block_digests"], f.read())
+        content_hash = hasher.hexdigest()
+        if expected_hash and expected_hash.lower() != content_hash:
+            raise InvalidRequestError("Uploaded content does not match the expected hash.")
+
+        path = os.path.join(session_dir, content_hash + os.path.splitext(session["filename"])[1].lower())
+        os.rename(data_path, path)
+        session.update(content_hash=content_hash, path=path)
+        _write_session(session_dir, session)
+    logger.info(f"Completed upload {upload_id}: {session['offset']} bytes, {content_hash}")
+    return session
+
+
+def get_completed_upload(upload_id: str) -> str:
+    """Path of a completed resumable upload, for use as a video source."""
+    session = get_upload_session(upload_id)
+    if not session["content_hash"]:
+        raise InvalidRequestError(f"Upload {upload_id} is not complete.")
+    return session["path"]
+
+
+def claim_completed_upload(upload_id: str, request_dir: str) -> str:
+    """
+    Move a completed resumable upload into a request's directory and delete
+    its session, so nothing of the upload is left behind once it is used.
+
+    Returns:
+        The upload's new path.
+    """
+    session_dir = _session_dir(upload_id)
+    session = _read_session(session_dir)
+    if not session["content_hash"]:
+        raise InvalidRequestError(f"Upload {upload_id} is not complete.")
+    ensure_directory(request_dir)
+    path = os.path.join(request_dir, os.path.basename(session["path"]))
+    try:
+        os.rename(session["path"], path)
+    except FileNotFoundError:
+        raise InvalidRequestError(f"Upload {upload_id} was already used.")
+    shutil.rmtree(session_dir, ignore_errors=True)
+    logger.info(f"Moved upload {upload_id} to {path}")
+    return path
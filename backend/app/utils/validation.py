@@ -1,15 +1,45 @@
 import os
 import re
+import math
 from flask import current_app
 from werkzeug.utils import secure_filename
 from .error_handlers import InvalidRequestError
 
 ALLOWED_EXTENSIONS = {"mp4", "mov", "mkv", "avi"}
+MIN_GIF_BYTES = 10 * 1024
+MAX_BATCH_PROMPTS = 5
+# Top-level box types that can open an ISO base media (MP4/MOV) file.
+ISO_BMFF_BOXES = {b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"pnot"}
+MATROSKA_MAGIC = b"\x1a\x45\xdf\xa3"
+# Output format name -> (file extension, mimetype).
+OUTPUT_FORMATS = {
+    "gif": ("gif", "image/gif"),
+    "webp": ("webp", "image/webp"),
+    "mp4": ("mp4", "video/mp4"),
+    "apng": ("png", "image/apng"),
+}
 
 def is_allowed_file(filename):
     ext = os.path.splitext(filename)[1].lower().lstrip(".")
     return ext in ALLOWED_EXTENSIONS
 
+def sniff_container(head: bytes):
+    """Identify the container from the first bytes of a file: "mp4", "mkv", "avi" or None."""
+    if head[4:8] in ISO_BMFF_BOXES:
+        return "mp4"
+    if head[:4] == MATROSKA_MAGIC:
+        return "mkv"
+    if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return "avi"
+    return None
+
+def validate_video_signature(head: bytes):
+    """Reject data that does not start like a supported video container."""
+    container = sniff_container(head)
+    if container is None:
+        raise InvalidRequestError("Uploaded file is not a supported video (MP4, MOV, MKV or AVI).")
+    return container
+
 def validate_prompt(prompt: str):
     if not prompt or not prompt.strip():
         raise InvalidRequestError("Theme prompt cannot be empty.")
@@ -17,12 +47,63 @@ def validate_prompt(prompt: str):
         raise InvalidRequestError("Prompt must be at least 3 characters.")
     return prompt.strip()
 
+def validate_prompts(prompts):
+    """Validate the theme prompts of a batch request, dropping case-insensitive duplicates."""
+    unique = []
+    for prompt in prompts:
+        prompt = validate_prompt(prompt)
+        if prompt.lower() not in (seen.lower() for seen in unique):
+            unique.append(prompt)
+    if not unique:
+        raise InvalidRequestError("At least one theme prompt is required.")
+    if len(unique) > MAX_BATCH_PROMPTS:
+        raise InvalidRequestError(f"At most {MAX_BATCH_PROMPTS} theme prompts are allowed per batch.")
+    return unique
+
 def validate_youtube_url(url: str):
     pattern = r"^(https?://)?(www\.)?(youtube\.com|youtu\.be)/"
     if not re.match(pattern, url):
         raise InvalidRequestError("Invalid YouTube URL.")
     return url
 
+def validate_max_bytes(value):
+    """Parse the optional per-GIF byte budget; return None when it is not given."""
+    if value is None or not str(value).strip():
+        return None
+    try:
+        max_bytes = int(value)
+    except ValueError:
+        raise InvalidRequestError("max_bytes must be an integer.")
+    if max_bytes < MIN_GIF_BYTES:
+        raise InvalidRequestError(f"max_bytes must be at least {MIN_GIF_BYTES}.")
+    return max_bytes
+
+def validate_output_format(value):
+    """Normalize the requested output format; GIF when not given."""
+    output_format = (value or "gif").strip().lower()
+    if output_format not in OUTPUT_FORMATS:
+        raise InvalidRequestError(f"Unsupported output format: {output_format}. Use one of: {', '.join(OUTPUT_FORMATS)}.")
+    return output_format
+
+def validate_request_id(request_id):
+    """A request ID as issued by the generate endpoints (32 hex digits)."""
+    request_id = (request_id or "").strip()
+    if not re.fullmatch(r"[0-9a-f]{32}", request_id):
+        raise InvalidRequestError("Invalid request_id.")
+    return request_id
+
+def validate_time_range(start, end):
+    """Parse a start/end pair of seconds."""
+    try:
+        start, end = float(start), float(end)
+    except (TypeError, ValueError):
+        raise InvalidRequestError("start and end must be numbers of seconds.")
+    if not (math.isfinite(start) and math.isfinite(end)):
+        raise InvalidRequestError("start and end must be finite numbers of seconds.")
+    if start < 0 or end <= start:
+        raise InvalidRequestError("start must be at least 0 and end after start.")
+    return start, end
+
 def save_uploaded_file(file_storage):
     """Save an uploaded FileStorage to UPLOAD_FOLDER; return the saved file path."""
     if not file_storage:
@@ -1,9 +1,12 @@
 import os
-import multiprocessing
 
 bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
 
-workers = multiprocessing.cpu_count() * 2 + 1
+# Same default as Config.WEB_CONCURRENCY, which the render pool splits
+# RENDER_CPU_BUDGET by (see render_pool.pool_size). Each worker runs whole
+# pipelines, so half a worker per core leaves every worker two render
+# processes on nodes with four or more cores.
+workers = int(os.environ.get('WEB_CONCURRENCY', max(2, (os.cpu_count() or 1) // 2)))
 worker_class = "gthread"
 threads = 2
 
@@ -17,3 +20,11 @@ loglevel = "info"
 preload_app = True
 max_requests = 1000
 max_requests_jitter = 50
+
+
+def post_fork(server, worker):
+    # Start the job workers with the web worker, so jobs queued before a
+    # restart (or a max_requests recycle) run without waiting for a new submit.
+    from app.core import jobs
+
+    jobs.ensure_workers()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Compare the global-palette GIF encoder with the imageio/Pillow path.
+Run from the backend directory: PYTHONPATH=. python scripts/benchmark_gif_encoder.py VIDEO [START] [END]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import imageio
+from app.config import configuration
+from app.core import gif_encoder
+from app.core.gif_generator import GIF_WRITER_OPTIONS, open_source
+
+
+def decode_frames(video_path, start, end):
+    video, clip = open_source(video_path)
+    with video:
+        return list(clip.subclip(start, end).iter_frames(fps=configuration.GIF_FPS, dtype="uint8"))
+
+
+def bench_imageio(frames, output_path):
+    started = time.perf_counter()
+    with imageio.get_writer(output_path, fps=configuration.GIF_FPS, **GIF_WRITER_OPTIONS) as writer:
+        for frame in frames:
+            writer.append_data(frame)
+    return {"total": time.perf_counter() - started}
+
+
+def bench_palette(frames, output_path, dedupe_threshold=0):
+    started = time.perf_counter()
+    delays = gif_encoder.frame_delays(len(frames), configuration.GIF_FPS)
+    frames, delays, dropped = gif_encoder.drop_duplicate_frames(frames, delays, dedupe_threshold)
+    deduped = time.perf_counter()
+    palette, transparent, parts = gif_encoder.plan_frames(frames)
+    quantized = time.perf_counter()
+    height, width = frames[0].shape[:2]
+    gif_encoder.write_gif(output_path, (width, height), palette, transparent, parts, delays)
+    finished = time.perf_counter()
+    timings = {
+        "total": finished - started,
+        "palette+mapping+diff": quantized - deduped,
+        "lzw+write": finished - quantized,
+    }
+    if dedupe_threshold:
+        timings["dedupe"] = deduped - started
+        timings["frames dropped"] = dropped
+    return timings
+
+
+def bench_palette_dedupe(frames, output_path):
+    return bench_palette(frames, output_path, configuration.GIF_DEDUPE_THRESHOLD)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    video_path = sys.argv[1]
+    start = float(sys.argv[2]) if len(sys.argv) > 2 else 0
+    end = float(sys.argv[3]) if len(sys.argv) > 3 else start + configuration.MAX_GIF_DURATION
+
+    frames = decode_frames(video_path, start, end)
+    width, height = frames[0].shape[1], frames[0].shape[0]
+    print(f"{len(frames)} frames at {width}x{height}, {configuration.GIF_FPS} fps\n")
+    print(f"{'encoder':<10} {'seconds':>8} {'bytes':>10}  breakdown")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, bench in (
+            ("imageio", bench_imageio),
+            ("palette", bench_palette),
+            ("dedupe", bench_palette_dedupe),
+        ):
+            output_path = os.path.join(tmp, f"{name}.gif")
+            timings = bench(frames, output_path)
+            breakdown = ", ".join(
+                f"{k} {v}" if isinstance(v, int) else f"{k} {v:.2f}s"
+                for k, v in timings.items() if k != "total"
+            )
+            print(f"{name:<10} {timings['total']:>8.2f} {os.path.getsize(output_path):>10}  {breakdown}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Compare encode time and size of the GIF, WebP, MP4 and APNG outputs for the same frames.
+Run from the backend directory: PYTHONPATH=. python scripts/benchmark_output_formats.py VIDEO [START] [END]
+"""
+
+import os
+import sys
+import time
+import tempfile
+from app.config import configuration
+from app.core import format_writers
+from app.core.gif_generator import open_animation_writer
+from benchmark_gif_encoder import decode_frames
+
+
+def bench_format(frames, output_path, output_format):
+    started = time.perf_counter()
+    with open_animation_writer(output_path, configuration.GIF_FPS, output_format=output_format) as writer:
+        for frame in frames:
+            writer.append_data(frame)
+    return time.perf_counter() - started
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    video_path = sys.argv[1]
+    start = float(sys.argv[2]) if len(sys.argv) > 2 else 0
+    end = float(sys.argv[3]) if len(sys.argv) > 3 else start + configuration.MAX_GIF_DURATION
+
+    frames = decode_frames(video_path, start, end)
+    width, height = frames[0].shape[1], frames[0].shape[0]
+    print(f"{len(frames)} frames at {width}x{height}, {configuration.GIF_FPS} fps\n")
+    print(f"{'format':<8} {'seconds':>8} {'bytes':>10} {'vs gif':>7}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        gif_bytes = None
+        for output_format in format_writers.OUTPUT_FORMATS:
+            output_path = os.path.join(tmp, f"out.{format_writers.extension_for(output_format)}")
+            seconds = bench_format(frames, output_path, output_format)
+            size = os.path.getsize(output_path)
+            gif_bytes = gif_bytes or size
+            print(f"{output_format:<8} {seconds:>8.2f} {size:>10} {size / gif_bytes:>6.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 """
-Clean up temporary files older than 24 hours.
+Clean up temporary files older than 24 hours, and request directories (kept
+for re-rendering) and resumable upload sessions unused for
+SOURCE_RETENTION_HOURS.
 Run as a cron job or scheduled task.
 """
 
@@ -9,6 +11,7 @@ import time
 import logging
 from datetime import datetime, timedelta
 from app.config import configuration
+from app.core import request_cache
 
 logging.basicConfig(
     level=logging.INFO,
@@ -43,6 +46,8 @@ def main():
     if os.path.exists(configuration.UPLOAD_FOLDER):
         logging.info(f"Cleaning uploads: {configuration.UPLOAD_FOLDER}")
         cleanup_directory(configuration.UPLOAD_FOLDER)
+        removed = request_cache.purge_expired(configuration.UPLOAD_FOLDER)
+        logging.info(f"Purged {removed} requests and upload sessions unused for {configuration.SOURCE_RETENTION_HOURS}h")
     else:
         logging.warning(f"Uploads directory not found: {configuration.UPLOAD_FOLDER}")
 
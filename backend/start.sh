@@ -16,7 +16,6 @@ mkdir -p "$GIF_OUTPUT_DIR"
 # Start Gunicorn
 echo "Starting Gunicorn on port $PORT..."
 gunicorn "app:create_app()" \
-  --workers 4 \
   --bind 0.0.0.0:"$PORT" \
   --timeout 300 \
   --worker-class gthread \
@@ -1,6 +1,95 @@
 import os
 import sys
+import pytest
 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
+
+
+@pytest.fixture
+def synthetic_video(tmp_path):
+    """
+    Generate a small test-pattern clip (320x240, 24 fps, 3 s, with a sine audio
+    track) using the ffmpeg binary moviepy is configured with.
+    """
+    from app.utils.ffmpeg_tools import run_ffmpeg
+
+    video_path = str(tmp_path / "synthetic.mp4")
+    run_ffmpeg([
+        "-f", "lavfi", "-i", "testsrc=size=320x240:rate=24",
+        "-f", "lavfi", "-i", "sine=frequency=440",
+        "-t", "3",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p", "-g", "12",
+        "-c:a", "aac",
+        "-shortest",
+        video_path,
+    ])
+    return video_path
+
+
+@pytest.fixture
+def stub_media_info(monkeypatch):
+    """
+    Make the media_info probes return a fixed 60 s descriptor with audio, for
+    route tests whose dummy video files are not real videos.
+    """
+    from app.core import media_info
+
+    media = media_info.MediaInfo(
+        path="dummy.mp4", duration=60.0, width=640, height=360, fps=24.0,
+        video_codec="h264", audio_codec="aac", audio_sample_rate=44100,
+    )
+    monkeypatch.setattr(media_info, "load", lambda video_path, timeout=None: media)
+    monkeypatch.setattr(media_info, "probe", lambda video_path, timeout=None: media)
+    return media
+
+
+@pytest.fixture
+def local_youtube(monkeypatch, synthetic_video, tmp_path):
+    """
+    Route youtube_service's yt-dlp through a local stand-in extractor for
+    youtube.com watch URLs, whose formats are file:// URLs of the synthetic
+    clip, with an empty source cache. Returns the list of video IDs
+    extracted, one entry per extraction.
+    """
+    from yt_dlp import YoutubeDL
+    from yt_dlp.extractor.common import InfoExtractor
+    from app.config import configuration
+    from app.services import youtube_service
+
+    monkeypatch.setattr(configuration, "SOURCE_CACHE_DIR", str(tmp_path / "source_cache"))
+
+    extractions = []
+    source_url = "file://" + synthetic_video
+
+    class LocalYoutubeIE(InfoExtractor):
+        IE_NAME = "local_youtube"
+        _VALID_URL = r"https?://(?:www\.)?youtube\.com/watch\?v=(?P<id>[\w-]{11})"
+
+        def _real_extract(self, url):
+            video_id = self._match_id(url)
+            extractions.append(video_id)
+            return {
+                "id": video_id,
+                "title": f"Video {video_id}",
+                "uploader": "Local",
+                "duration": 3,
+                "formats": [
+                    {"format_id": "18", "url": source_url, "ext": "mp4",
+                     "vcodec": "avc1.42001E", "acodec": "mp4a.40.2", "width": 320, "height": 240},
+                    {"format_id": "140", "url": source_url, "ext": "m4a",
+                     "vcodec": "none", "acodec": "mp4a.40.2", "abr": 128},
+                    {"format_id": "139", "url": source_url, "ext": "m4a",
+                     "vcodec": "none", "acodec": "mp4a.40.5", "abr": 48},
+                ],
+            }
+
+    def local_youtube_dl(params):
+        ydl = YoutubeDL({**params, "enable_file_urls": True}, auto_init=False)
+        ydl.add_info_extractor(LocalYoutubeIE())
+        return ydl
+
+    monkeypatch.setattr(youtube_service, "_youtube_dl", local_youtube_dl)
+    monkeypatch.setattr(youtube_service, "_info_cache", {})
+    return extractions
@@ -0,0 +1,15 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def admission_ledger(monkeypatch, tmp_path):
+    """
+    Admit route requests against a ledger of their own, at the worst-case cost
+    rather than probing: the tests' YouTube URLs and uploads are placeholders.
+    """
+    from app.config import configuration
+    from app.core import admission
+
+    monkeypatch.setattr(configuration, "ADMISSION_DB_PATH", str(tmp_path / "admission.sqlite3"))
+    monkeypatch.setattr(admission, "probe_duration", lambda youtube_url=None, video_path=None: None)
+    return admission.get_ledger()
@@ -1,9 +1,11 @@
+import io
 import os
 import tempfile
 import json
 import pytest
 from flask import Flask
 from app.routes import gif_routes
+from app.utils.error_handlers import InvalidRequestError
 
 @pytest.fixture
 def app():
@@ -29,7 +31,7 @@ def app():
 def client(app):
     return app.test_client()
 
-def test_generate_gif_endpoint(client, monkeypatch):
+def test_generate_gif_endpoint(client, monkeypatch, stub_media_info):
     """
     Test the /api/gif/generate endpoint using dummy implementations 
     for video processing, transcription, caption selection, and GIF generation.
@@ -90,3 +92,493 @@ def test_generate_gif_endpoint(client, monkeypatch):
     first_gif = resp_json["gifs"][0]
     for key in ["caption", "start", "end", "duration", "url"]:
         assert key in first_gif, f"Missing key '{key}' in GIF data"
+
+def test_generate_gif_endpoint_isolates_failed_renders(client, monkeypatch, stub_media_info):
+    """
+    When one of several GIF renders fails, the request still succeeds with the
+    remaining GIFs and reports the failure under 'failed_gifs'.
+    """
+    from app.core import video_processor, transcription, caption_selector, gif_generator
+
+    monkeypatch.setattr(
+        video_processor,
+        "process_video_input",
+        lambda youtube_url, video_file, request_id: "dummy.mp4"
+    )
+    monkeypatch.setattr(transcription, "transcribe_video", lambda video_path: [])
+
+    moments = [
+        {"start": 0, "end": 2, "text": "first moment"},
+        {"start": 20, "end": 22, "text": "broken moment"},
+        {"start": 40, "end": 42, "text": "third moment"},
+    ]
+    monkeypatch.setattr(
+        caption_selector,
+        "select_key_moments",
+        lambda transcript, prompt, max_moments=3: moments
+    )
+    monkeypatch.setattr(
+        caption_selector,
+        "analyze_transcript_content",
+        lambda transcript, prompt: "summary"
+    )
+
+    def fake_render_all(video_path, jobs):
+        return [
+            {"output_path": None, "error": "render failed"} if job["caption"] == "broken moment"
+            else {"output_path": job["output_path"], "error": None}
+            for job in jobs
+        ]
+
+    monkeypatch.setattr(gif_generator, "generate_captioned_gifs", fake_render_all)
+
+    response = client.post("/api/gif/generate", data={
+        "prompt": "funny moments",
+        "youtube_url": "https://www.youtube.com/watch?v=HCDVN7DCzYE"
+    })
+
+    assert response.status_code == 200, f"Response: {response.data}"
+    resp_json = json.loads(response.data)
+    assert [gif["id"] for gif in resp_json["gifs"]] == [0, 2]
+    assert resp_json["failed_gifs"] == [{"id": 1, "error": "render failed"}]
+
+def test_download_serves_format_mimetype(client, app):
+    """
+    Downloads are served with the mimetype of the requested output format.
+    """
+    for filename, mimetype in (("clip.webp", "image/webp"), ("clip.mp4", "video/mp4"), ("clip.gif", "image/gif")):
+        with open(os.path.join(app.config["GIF_OUTPUT_DIR"], filename), "wb") as f:
+            f.write(b"data")
+        response = client.get(f"/api/gif/download/{filename}")
+        assert response.status_code == 200
+        assert response.mimetype == mimetype
+
+def test_generate_gif_rejects_overlong_video(client, monkeypatch, stub_media_info):
+    """
+    Sources longer than MAX_VIDEO_DURATION are rejected from the probe,
+    before anything is transcribed.
+    """
+    from app.core import video_processor, transcription
+
+    stub_media_info.duration = 900.0
+    monkeypatch.setattr(
+        video_processor,
+        "process_video_input",
+        lambda youtube_url, video_file, request_id: "dummy.mp4"
+    )
+
+    def fail_transcribe(video_path):
+        raise AssertionError("should not transcribe")
+
+    monkeypatch.setattr(transcription, "transcribe_video", fail_transcribe)
+
+    with pytest.raises(InvalidRequestError, match="maximum is 600s"):
+        client.post("/api/gif/generate", data={
+            "prompt": "funny moments",
+            "youtube_url": "https://www.youtube.com/watch?v=HCDVN7DCzYE"
+        })
+
+def test_generate_gif_audio_first_fetches_only_selected_ranges(app, client, monkeypatch, local_youtube, tmp_path):
+    """
+    In audio_first mode the transcript comes from an audio-only download, and
+    the GIFs are rendered from a file holding just the selected moments.
+    """
+    from app.config import configuration
+    from app.core import transcription, caption_selector, gif_generator, media_info, render_pool
+
+    app.config["YOUTUBE_INGEST_MODE"] = "audio_first"
+    monkeypatch.setattr(configuration, "UPLOAD_FOLDER", str(tmp_path))
+    monkeypatch.setattr(render_pool, "pool_size", lambda: 1)
+
+    transcribed = []
+
+    def fake_transcribe(video_path):
+        transcribed.append(video_path)
+        return [{"start": 0, "end": 3, "text": "something"}]
+
+    monkeypatch.setattr(transcription, "transcribe_video", fake_transcribe)
+    moments = [
+        {"start": 2.0, "end": 2.5, "text": "second"},
+        {"start": 0.5, "end": 1.5, "text": "first"},
+    ]
+    monkeypatch.setattr(
+        caption_selector,
+        "select_key_moments",
+        lambda transcript, prompt, max_moments=3: moments
+    )
+    monkeypatch.setattr(
+        caption_selector,
+        "analyze_transcript_content",
+        lambda transcript, prompt: "summary"
+    )
+
+    rendered = {}
+
+    def fake_render_all(video_path, jobs):
+        rendered["video_path"] = video_path
+        rendered["windows"] = [(job["start"], job["end"]) for job in jobs]
+        return [{"output_path": job["output_path"], "error": None} for job in jobs]
+
+    monkeypatch.setattr(gif_generator, "generate_captioned_gifs", fake_render_all)
+
+    response = client.post("/api/gif/generate", data={
+        "prompt": "funny moments",
+        "youtube_url": "https://www.youtube.com/watch?v=HCDVN7DCzYE"
+    })
+
+    assert response.status_code == 200, f"Response: {response.data}"
+    assert transcribed[0].endswith(".m4a")
+    assert rendered["windows"] == [(0.0, 0.5), (0.5, 1.5)]
+    assert abs(media_info.load(rendered["video_path"]).duration - 1.5) < 0.1
+    assert [gif["start"] for gif in response.get_json()["gifs"]] == [2.0, 0.5]
+    assert local_youtube == ["HCDVN7DCzYE"]
+
+def test_generate_job_runs_in_background(client, monkeypatch, stub_media_info, tmp_path):
+    """
+    POST /jobs returns a job ID at once; the job runs on a background worker and
+    its status reports each stage and, finally, the GIF list.
+    """
+    import time
+    import threading
+    from app.config import configuration
+    from app.core import video_processor, transcription, caption_selector, gif_generator, jobs
+
+    monkeypatch.setattr(configuration, "JOB_DB_PATH", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(configuration, "JOB_WORKERS", 1)
+    monkeypatch.setattr(configuration, "JOB_POLL_INTERVAL", 0.05)
+    jobs._reset()
+
+    release = threading.Event()
+    monkeypatch.setattr(
+        video_processor,
+        "process_video_input",
+        lambda youtube_url, video_file, request_id: "dummy.mp4"
+    )
+
+    def slow_transcribe(video_path):
+        release.wait(10)
+        return [{"start": 0, "end": 2, "text": "moment"}]
+
+    monkeypatch.setattr(transcription, "transcribe_video", slow_transcribe)
+    monkeypatch.setattr(
+        caption_selector,
+        "select_key_moments",
+        lambda transcript, prompt, max_moments=3: [{"start": 0, "end": 2, "text": "moment"}]
+    )
+    monkeypatch.setattr(
+        caption_selector,
+        "analyze_transcript_content",
+        lambda transcript, prompt: "summary"
+    )
+    monkeypatch.setattr(
+        gif_generator,
+        "generate_captioned_gif",
+        lambda video_path, start, end, caption, output_path: output_path
+    )
+
+    try:
+        response = client.post("/api/gif/jobs", data={
+            "prompt": "funny moments",
+            "youtube_url": "https://www.youtube.com/watch?v=HCDVN7DCzYE"
+        })
+        assert response.status_code == 202
+        status_url = response.get_json()["status_url"]
+
+        deadline = time.time() + 10
+        while client.get(status_url).get_json()["stages"]["transcribe"]["status"] != "running":
+            assert time.time() < deadline
+            time.sleep(0.02)
+        status = client.get(status_url).get_json()
+        assert status["status"] == "running"
+        assert status["stages"]["download"]["status"] == "done"
+        assert status["stages"]["render"]["status"] == "pending"
+
+        release.set()
+        while status["status"] == "running":
+            assert time.time() < deadline
+            time.sleep(0.02)
+            status = client.get(status_url).get_json()
+        assert status["status"] == "succeeded", status
+        assert all(stage["status"] == "done" for stage in status["stages"].values())
+        assert status["result"]["gifs"][0]["caption"] == "moment"
+        assert client.get("/api/gif/jobs/unknown").status_code == 404
+    finally:
+        release.set()
+        jobs._reset()
+
+def _read_events(body):
+    events = []
+    for block in body.decode().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if "event" in fields:
+            events.append((int(fields["id"]), fields["event"], json.loads(fields["data"])))
+    return events
+
+def test_job_events_stream_progress(client, monkeypatch, stub_media_info, local_youtube, synthetic_video, tmp_path):
+    """
+    GET /jobs/<id>/events streams stage changes, yt-dlp download progress, the
+    selected moments and each GIF's URL, ending with the job's result; a client
+    resuming with Last-Event-ID only gets later events.
+    """
+    from app.config import configuration
+    from app.core import transcription, caption_selector, gif_generator, jobs, pipeline
+
+    monkeypatch.setattr(configuration, "JOB_DB_PATH", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(configuration, "JOB_WORKERS", 1)
+    monkeypatch.setattr(configuration, "JOB_POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(configuration, "JOB_EVENTS_POLL_INTERVAL", 0.02)
+    jobs._reset()
+
+    monkeypatch.setattr(transcription, "transcribe_video", lambda video_path: [{"start": 0, "end": 2, "text": "moment"}])
+    monkeypatch.setattr(
+        caption_selector,
+        "select_key_moments",
+        lambda transcript, prompt, max_moments=3: [{"start": 0, "end": 2, "text": "moment"}]
+    )
+    monkeypatch.setattr(caption_selector, "analyze_transcript_content", lambda transcript, prompt: "summary")
+    monkeypatch.setattr(
+        gif_generator,
+        "generate_captioned_gif",
+        lambda video_path, start, end, caption, output_path: output_path
+    )
+
+    try:
+        response = client.post("/api/gif/jobs", data={
+            "prompt": "funny moments",
+            "youtube_url": "https://www.youtube.com/watch?v=HCDVN7DCzYE"
+        })
+        events_url = response.get_json()["events_url"]
+
+        stream = client.get(events_url, headers={"Accept": "text/event-stream"})
+        assert stream.mimetype == "text/event-stream"
+        events = _read_events(stream.data)
+
+        stages = [(data["stage"], data["status"]) for _, event, data in events if event == "stage"]
+        for stage in pipeline.STAGES:
+            assert [status for name, status in stages if name == stage] == ["running", "done"]
+        progress = [data for _, event, data in events if event == "progress"]
+        downloads = [data for data in progress if data["stage"] == "download"]
+        assert downloads[-1]["percent"] == 100.0
+        assert downloads[-1]["downloaded_bytes"] == os.path.getsize(synthetic_video)
+        select_done = next(
+            data for _, event, data in events
+            if event == "stage" and data["stage"] == "select" and data["status"] == "done"
+        )
+        assert select_done["moments"] == [{"id": 0, "start": 0, "end": 2, "text": "moment"}]
+        gif = next(data["gif"] for data in progress if "gif" in data)
+        assert gif["url"].startswith("/api/gif/download/") and gif["caption"] == "moment"
+        event_id, event, final = events[-1]
+        assert event == "job" and final["status"] == "succeeded"
+        assert final["result"]["gifs"] == [gif]
+
+        resumed = _read_events(client.get(
+            events_url, headers={"Accept": "text/event-stream", "Last-Event-ID": str(events[-2][0])}
+        ).data)
+        assert resumed == events[-1:]
+        # Polling clients get the same events as JSON, at once.
+        polled = client.get(events_url, query_string={"after": events[-3][0]}).get_json()
+        assert [(e["id"], e["event"], e["data"]) for e in polled["events"]] == events[-2:]
+        assert polled["last_event_id"] == events[-1][0]
+        assert client.get("/api/gif/jobs/unknown/events").status_code == 404
+    finally:
+        jobs._reset()
+
+def test_batch_endpoint_transcribes_once_and_renders_unique_moments(client, monkeypatch, stub_media_info):
+    """
+    /batch transcribes the video once, merges a moment chosen by two themes and
+    renders every unique moment once.
+    """
+    from app.core import video_processor, transcription, caption_selector, render_pool
+
+    monkeypatch.setattr(
+        video_processor,
+        "process_video_input",
+        lambda youtube_url, video_file, request_id: "dummy.mp4"
+    )
+    transcribed = []
+    monkeypatch.setattr(transcription, "transcribe_video", lambda video_path: transcribed.append(video_path) or [])
+    monkeypatch.setattr(
+        caption_selector,
+        "select_key_moments_batch",
+        lambda transcript, prompts, max_moments: [
+            [{"start": 0, "end": 4, "text": "joke"}],
+            [{"start": 1, "end": 4, "text": "joke again"}, {"start": 20, "end": 24, "text": "tears"}],
+        ]
+    )
+    monkeypatch.setattr(caption_selector, "analyze_transcript_content", lambda transcript, prompt: "summary")
+    rendered = []
+
+    def render_gifs(video_path, jobs):
+        rendered.extend(job["caption"] for job in jobs)
+        return [{"output_path": job["output_path"], "error": None} for job in jobs]
+
+    monkeypatch.setattr(render_pool, "render_gifs", render_gifs)
+
+    response = client.post("/api/gif/batch", data={
+        "prompts": ["funny moments", "emotional moments", "Funny Moments"],
+        "youtube_url": "https://www.youtube.com/watch?v=HCDVN7DCzYE"
+    })
+    assert response.status_code == 200, response.get_json()
+    data = response.get_json()
+
+    assert transcribed == ["dummy.mp4"]
+    assert sorted(rendered) == ["joke", "tears"]
+    assert [gif["themes"] for gif in data["gifs"]] == [["funny moments", "emotional moments"], ["emotional moments"]]
+    assert data["themes"] == [
+        {"prompt": "funny moments", "gif_ids": [0]},
+        {"prompt": "emotional moments", "gif_ids": [0, 1]},
+    ]
+
+    with pytest.raises(InvalidRequestError):
+        client.post("/api/gif/batch", data={
+            "prompts": [f"theme number {i}" for i in range(6)],
+            "youtube_url": "https://www.youtube.com/watch?v=HCDVN7DCzYE"
+        })
+
+def test_render_reuses_the_retained_source_and_transcript(app, client, monkeypatch, synthetic_video):
+    """
+    /render re-renders a custom range of an earlier request from its retained
+    source and transcript: nothing is downloaded or transcribed again, the
+    caption defaults to what is said in the range, and repeating a render
+    reuses its output. Only a re-render starts building the source's frame proxy.
+    """
+    import shutil
+    from PIL import Image
+    from app.core import video_processor, transcription, caption_selector, render_pool, request_cache, frame_proxy
+
+    def save_source(youtube_url, video_file, request_id):
+        path = os.path.join(app.config["UPLOAD_FOLDER"], request_id, "source.mp4")
+        shutil.copyfile(synthetic_video, path)
+        return path
+
+    monkeypatch.setattr(video_processor, "process_video_input", save_source)
+    transcribed = []
+    transcript = [{"start": 0.0, "end": 1.0, "text": "first words"}, {"start": 1.0, "end": 3.0, "text": "then more"}]
+    monkeypatch.setattr(transcription, "transcribe_video", lambda video_path: transcribed.append(video_path) or transcript)
+    monkeypatch.setattr(
+        caption_selector,
+        "select_key_moments",
+        lambda transcript, prompt, max_moments=3: [{"start": 0.0, "end": 1.0, "text": "first words"}]
+    )
+    monkeypatch.setattr(caption_selector, "analyze_transcript_content", lambda transcript, prompt: "summary")
+    renders = []
+    real_render_gifs = render_pool.render_gifs
+    monkeypatch.setattr(
+        render_pool, "render_gifs", lambda video_path, jobs: renders.append(jobs) or real_render_gifs(video_path, jobs)
+    )
+    proxy_builds = []
+    monkeypatch.setattr(frame_proxy, "build_in_background", lambda video_path, root=None: proxy_builds.append(root))
+
+    generated = client.post("/api/gif/generate", data={
+        "prompt": "first moments",
+        "youtube_url": "https://www.youtube.com/watch?v=HCDVN7DCzYE"
+    })
+    assert generated.status_code == 200, generated.get_json()
+    request_id = generated.get_json()["request_id"]
+    assert proxy_builds == []
+
+    form = {"request_id": request_id, "start": "0.5", "end": "2.0"}
+    response = client.post("/api/gif/render", data=form)
+    assert response.status_code == 200, response.get_json()
+    gif = response.get_json()["gif"]
+    assert gif["caption"] == "first words then more"
+    assert (gif["start"], gif["end"]) == (0.5, 2.0)
+    filename = gif["url"].rsplit("/", 1)[1]
+    with Image.open(os.path.join(app.config["GIF_OUTPUT_DIR"], filename)) as image:
+        assert image.format == "GIF"
+    assert len(transcribed) == 1 and len(renders) == 2
+    assert proxy_builds == [app.config["UPLOAD_FOLDER"]]
+
+    assert client.post("/api/gif/render", data=form).get_json()["gif"] == gif
+    assert len(renders) == 2
+
+    request_cache.purge_expired(app.config["UPLOAD_FOLDER"], max_age_hours=-1)
+    assert client.post("/api/gif/render", data=form).status_code == 404
+    with pytest.raises(InvalidRequestError):
+        client.post("/api/gif/render", data={"request_id": "../etc", "start": "0", "end": "1"})
+
+
+def test_requests_over_capacity_get_429_with_retry_after(monkeypatch, tmp_path, admission_ledger):
+    """
+    With the budget held and the queue full, /generate is refused before any
+    work with a Retry-After of when the running request should end, and the
+    rejection shows in /api/metrics.
+    """
+    from app import create_app
+    from app.config import configuration
+    from app.core import admission, pipeline
+
+    monkeypatch.setattr(configuration, "ADMISSION_CPU_BUDGET", 1)
+    monkeypatch.setattr(configuration, "ADMISSION_QUEUE_MAX", 1)
+    monkeypatch.setattr(configuration, "UPLOAD_FOLDER", str(tmp_path))
+    monkeypatch.setattr(pipeline, "generate", lambda *args, **kwargs: pytest.fail("the pipeline ran"))
+    running = admission_ledger.admit(admission.Cost(cpu=1, memory=1, seconds=90))
+    admission_ledger.admit(admission.Cost(cpu=1, memory=1, seconds=90))
+
+    client = create_app().test_client()
+    response = client.post("/api/gif/generate", data={
+        "prompt": "funny moments",
+        "youtube_url": "https://www.youtube.com/watch?v=HCDVN7DCzYE",
+    })
+    assert response.status_code == 429
+    assert 85 <= int(response.headers["Retry-After"]) <= 90
+    assert response.get_json()["retry_after"] == int(response.headers["Retry-After"])
+
+    metrics = client.get("/api/metrics").get_data(as_text=True)
+    assert "gif_admission_queue_depth 1" in metrics
+    assert "gif_admission_running 1" in metrics
+    assert 'gif_admission_rejections_total{reason="queue_full"} 1' in metrics
+
+    admission_ledger.release(running)
+
+
+def test_requests_turned_away_keep_their_upload(monkeypatch, tmp_path, admission_ledger, synthetic_video):
+    """
+    A request is admitted before its upload is taken over: after a 429 a
+    resumable upload can still be used by the retry, and a plain upload is not
+    left on disk. Jobs for YouTube URLs are priced without asking YouTube.
+    """
+    from app import create_app
+    from app.config import configuration
+    from app.core import admission, pipeline
+    from app.utils import storage
+
+    upload_folder = tmp_path / "uploads"
+    monkeypatch.setattr(configuration, "ADMISSION_CPU_BUDGET", 1)
+    monkeypatch.setattr(configuration, "ADMISSION_QUEUE_MAX", 1)
+    monkeypatch.setattr(configuration, "UPLOAD_FOLDER", str(upload_folder))
+    monkeypatch.setattr(pipeline, "generate", lambda *args, **kwargs: pytest.fail("the pipeline ran"))
+    probed = []
+    monkeypatch.setattr(
+        admission, "probe_duration", lambda youtube_url=None, video_path=None: probed.append(youtube_url)
+    )
+    running = admission_ledger.admit(admission.Cost(cpu=1, memory=1, seconds=90))
+    admission_ledger.admit(admission.Cost(cpu=1, memory=1, seconds=90))
+
+    app = create_app()
+    client = app.test_client()
+    with open(synthetic_video, "rb") as f:
+        content = f.read()
+    with app.app_context():
+        upload_id = storage.create_upload_session("clip.mp4", len(content))["upload_id"]
+        storage.append_upload_chunk(upload_id, 0, io.BytesIO(content))
+        storage.complete_upload(upload_id)
+
+    response = client.post("/api/gif/generate", data={"prompt": "funny moments", "upload_id": upload_id})
+    assert response.status_code == 429
+    with app.app_context():
+        assert os.path.exists(storage.get_completed_upload(upload_id))
+
+    response = client.post("/api/gif/generate", data={
+        "prompt": "funny moments", "video": (io.BytesIO(content), "clip.mp4"),
+    })
+    assert response.status_code == 429
+    assert os.listdir(upload_folder) == [storage.UPLOAD_SESSIONS_DIR]
+
+    response = client.post("/api/gif/jobs", data={
+        "prompt": "funny moments", "youtube_url": "https://www.youtube.com/watch?v=HCDVN7DCzYE",
+    })
+    assert response.status_code == 429
+    assert "https://www.youtube.com/watch?v=HCDVN7DCzYE" not in probed
+
+    admission_ledger.release(running)
@@ -0,0 +1,86 @@
+import os
+import hashlib
+import tempfile
+import shutil
+import pytest
+from flask import Flask
+from app.routes import upload_routes
+from app.utils import storage
+from app.utils.error_handlers import register_error_handlers
+
+@pytest.fixture
+def app(monkeypatch):
+    # Small blocks so a short clip spans several, with a partial block at each resume.
+    monkeypatch.setattr(storage, "UPLOAD_CHUNK_SIZE", 4096)
+    app = Flask(__name__)
+    app.config.update(
+        UPLOAD_FOLDER=tempfile.mkdtemp(),
+        MAX_UPLOAD_SIZE=10 * 1024 * 1024,
+        TESTING=True,
+    )
+    register_error_handlers(app)
+    app.register_blueprint(upload_routes.bp)
+    yield app
+    shutil.rmtree(app.config["UPLOAD_FOLDER"])
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def test_resumable_upload_matches_single_upload_hash(app, client, synthetic_video):
+    """
+    A file sent in uneven chunks, with a retried chunk at a stale offset, ends up
+    byte-identical and with the same content hash as a single-request upload.
+    """
+    with open(synthetic_video, "rb") as f:
+        content = f.read()
+
+    response = client.post("/api/upload", data={"filename": "clip.mp4", "total_size": len(content)})
+    assert response.status_code == 201
+    upload_id = response.get_json()["upload_id"]
+
+    cuts = [0, 5000, 5001, 23456, len(content)]
+    for start, end in zip(cuts, cuts[1:]):
+        response = client.post(f"/api/upload/{upload_id}/chunk?offset={start}", data=content[start:end])
+        assert response.status_code == 200
+        assert response.get_json()["offset"] == end
+
+    stale = client.post(f"/api/upload/{upload_id}/chunk?offset=5000", data=content[5000:6000])
+    assert stale.status_code == 409
+    assert stale.get_json()["offset"] == len(content)
+    assert client.get(f"/api/upload/{upload_id}").get_json()["offset"] == len(content)
+
+    hasher = storage.ContentHasher()
+    for start in range(0, len(content), 7000):
+        hasher.update(content[start:start + 7000])
+    single_hash = hasher.hexdigest()
+
+    response = client.post(f"/api/upload/{upload_id}/complete", data={"content_hash": single_hash})
+    assert response.status_code == 200
+    assert response.get_json()["content_hash"] == single_hash
+
+    with app.app_context():
+        completed = storage.get_completed_upload(upload_id)
+    with open(completed, "rb") as f:
+        assert hashlib.sha256(f.read()).digest() == hashlib.sha256(content).digest()
+
+    # The request using the upload takes the file over; the session is deleted.
+    request_dir = os.path.join(app.config["UPLOAD_FOLDER"], "request")
+    with app.app_context():
+        claimed = storage.claim_completed_upload(upload_id, request_dir)
+        with pytest.raises(Exception, match="Unknown upload"):
+            storage.claim_completed_upload(upload_id, request_dir)
+    assert os.path.dirname(claimed) == request_dir
+    assert os.path.basename(claimed) == os.path.basename(completed)
+    assert os.listdir(os.path.join(app.config["UPLOAD_FOLDER"], storage.UPLOAD_SESSIONS_DIR)) == []
+
+def test_upload_rejects_non_video_and_oversize(client):
+    upload_id = client.post("/api/upload", data={"filename": "clip.mp4"}).get_json()["upload_id"]
+    response = client.post(f"/api/upload/{upload_id}/chunk?offset=0", data=b"<html></html>" * 10)
+    assert response.status_code == 400
+    assert client.get(f"/api/upload/{upload_id}").get_json()["offset"] == 0
+
+    response = client.post("/api/upload", data={"filename": "clip.mp4", "total_size": 20 * 1024 * 1024})
+    assert response.status_code == 400
+    response = client.post("/api/upload", data={"filename": "notes.txt"})
+    assert response.status_code == 400
@@ -29,7 +29,7 @@ def app():
 def client(app):
     return app.test_client()
 
-def test_end_to_end_workflow(client, monkeypatch):
+def test_end_to_end_workflow(client, monkeypatch, stub_media_info):
     """
     Simulate an end-to-end workflow for processing a YouTube video,
     transcribing it, selecting key moments, generating GIFs,
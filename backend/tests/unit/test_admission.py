@@ -0,0 +1,106 @@
+# tests/unit/test_admission.py
+
+import time
+import threading
+import pytest
+from app.config import configuration
+from app.core import admission
+from app.utils.error_handlers import OverloadedError
+
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    monkeypatch.setattr(configuration, "ADMISSION_CPU_BUDGET", 4)
+    monkeypatch.setattr(configuration, "ADMISSION_MEMORY_BUDGET", 8 * admission.GIB)
+    monkeypatch.setattr(configuration, "ADMISSION_QUEUE_MAX", 2)
+    monkeypatch.setattr(admission, "POLL_INTERVAL", 0.01)
+    return admission.Ledger(str(tmp_path / "admission.sqlite3"))
+
+
+def test_cost_follows_duration_and_model(monkeypatch):
+    monkeypatch.setattr(configuration, "ADMISSION_CPU_BUDGET", 2)
+    monkeypatch.setattr(configuration, "ADMISSION_MEMORY_BUDGET", 8 * admission.GIB)
+
+    short, long = admission.estimate(60, "base"), admission.estimate(600, "base")
+    assert long.seconds > short.seconds and long.cpu == short.cpu
+    assert admission.estimate(60, "medium.en").memory > short.memory
+    # Capped at the budget, and unknown durations cost the longest allowed.
+    assert admission.estimate(60, "large-v3").cpu == 2
+    assert admission.estimate(None, "base", max_duration=600) == long
+
+
+def test_admits_then_queues_then_rejects_with_retry_after(ledger):
+    big = admission.Cost(cpu=3, memory=admission.GIB, seconds=120)
+    running = ledger.admit(big)
+    ledger.admit(admission.Cost(cpu=1, memory=admission.GIB, seconds=30))
+    # Together they use the 4 cores.
+    assert ledger.stats()["running"] == 2
+
+    first = ledger.admit(big)
+    ledger.admit(admission.Cost(cpu=1, memory=admission.GIB, seconds=30))
+    assert ledger.stats()["queued"] == 2
+
+    with pytest.raises(OverloadedError) as rejected:
+        ledger.admit(big)
+    # The head of the queue needs the 3 cores of the 120 s request.
+    assert 115 <= rejected.value.retry_after <= 120
+    assert ledger.stats()["counters"] == {"admitted": 2, "queued": 2, "rejected_queue_full": 1}
+
+    started = threading.Event()
+
+    def wait_for_first():
+        ledger.wait(first)
+        started.set()
+
+    thread = threading.Thread(target=wait_for_first)
+    thread.start()
+    time.sleep(0.1)
+    assert not started.is_set()
+    ledger.release(running)
+    thread.join(timeout=5)
+    assert started.is_set()
+
+
+def test_queued_tickets_start_in_order_and_time_out(ledger):
+    ledger.admit(admission.Cost(cpu=3, memory=1, seconds=60))
+    first = ledger.admit(admission.Cost(cpu=4, memory=1, seconds=60))
+    second = ledger.admit(admission.Cost(cpu=1, memory=1, seconds=60))
+    # One core is free, but the request ahead of it needs four.
+    assert not ledger._try_start(second)
+
+    with pytest.raises(OverloadedError):
+        ledger.wait(second, timeout=0.05)
+    stats = ledger.stats()
+    assert stats["queued"] == 1 and stats["counters"]["rejected_wait_timeout"] == 1
+    assert not ledger._try_start(first)
+
+
+def test_tickets_of_exited_processes_are_dropped(ledger, monkeypatch):
+    ledger.admit(admission.Cost(cpu=4, memory=1, seconds=60))
+    ledger.admit(admission.Cost(cpu=1, memory=1, seconds=60), owned=False)
+    monkeypatch.setattr(admission, "_alive", lambda pid: False)
+
+    # The background job's ticket belongs to the submitting process until a
+    # job worker takes it over, so it goes with it instead of blocking the queue.
+    stats = ledger.stats()
+    assert stats["running"] == 0 and stats["queued"] == 0
+
+
+def test_job_tickets_lapse_unless_taken_over_then_queue_again(ledger, monkeypatch):
+    monkeypatch.setattr(configuration, "ADMISSION_TICKET_LEASE", 0.2)
+    cost = admission.Cost(cpu=1, memory=1, seconds=60)
+    blocker = ledger.admit(admission.Cost(cpu=4, memory=1, seconds=60))
+    orphan = ledger.admit(cost, owned=False)
+    taken = ledger.admit(cost, owned=False)
+    assert not ledger._try_start(taken)
+
+    time.sleep(0.3)
+    # Only the ticket no job worker waited on has lapsed.
+    assert ledger.stats()["queued"] == 1
+    assert ledger._try_start(orphan) is None
+
+    # Its job, claimed later, queues again behind the rest.
+    ledger.release(blocker)
+    assert ledger._try_start(taken)
+    requeued = ledger.wait(orphan, cost=cost)
+    assert requeued != orphan and ledger.stats()["running"] == 2
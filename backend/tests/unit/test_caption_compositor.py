@@ -0,0 +1,90 @@
+import tracemalloc
+import numpy as np
+from PIL import Image
+from app.core.caption_compositor import CaptionCompositor
+
+
+def _caption(width, height, inked_rows):
+    """Semi-transparent white caption with ink only in the given row range."""
+    rgba = np.zeros((height, width, 4), dtype=np.uint8)
+    rgba[inked_rows, :, :3] = 255
+    rgba[inked_rows, :, 3] = 128
+    return Image.fromarray(rgba, "RGBA")
+
+
+def test_compositor_matches_reference_blend():
+    """
+    Blending should match a straightforward float alpha blend within rounding.
+    """
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, size=(120, 160, 3), dtype=np.uint8)
+    caption = _caption(160, 40, slice(10, 30))
+
+    expected = frame.astype(np.float32)
+    rgba = np.asarray(caption, dtype=np.float32)
+    alpha = rgba[..., 3:4] / 255.0
+    expected[80:120] = expected[80:120] * (1 - alpha) + rgba[..., :3] * alpha
+
+    result = CaptionCompositor(caption, (160, 120))(frame.copy())
+    assert np.abs(result.astype(np.int16) - np.round(expected).astype(np.int16)).max() <= 1
+
+
+def test_compositor_only_touches_inked_band():
+    """
+    Rows outside the caption's inked band must be left untouched.
+    """
+    frame = np.full((120, 160, 3), 7, dtype=np.uint8)
+    caption = _caption(160, 40, slice(10, 30))
+
+    result = CaptionCompositor(caption, (160, 120))(frame)
+    assert (result[:90] == 7).all()
+    assert (result[110:] == 7).all()
+    assert (result[90:110] != 7).all()
+
+
+def test_compositor_copies_read_only_frames():
+    """
+    Read-only frames (as produced by the decoder) are copied rather than written.
+    """
+    frame = np.zeros((120, 160, 3), dtype=np.uint8)
+    frame.flags.writeable = False
+    result = CaptionCompositor(_caption(160, 40, slice(0, 40)), (160, 120))(frame)
+    assert result is not frame
+    assert (frame == 0).all()
+
+
+def test_compositor_blends_in_place_without_frame_allocations():
+    """
+    Writable frames are blended in place and no frame-sized buffers are allocated.
+    """
+    frame = np.zeros((360, 640, 3), dtype=np.uint8)
+    compositor = CaptionCompositor(_caption(640, 80, slice(0, 80)), (640, 360))
+    compositor(frame)
+
+    tracemalloc.start()
+    result = compositor(frame)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert result is frame
+    assert peak < frame.nbytes // 10
+
+
+def test_compositor_draws_once_on_repeated_frames():
+    """
+    Readers hand out their last frame again for repeated times; it keeps a
+    single layer of caption.
+    """
+    frame = np.zeros((120, 160, 3), dtype=np.uint8)
+    compositor = CaptionCompositor(_caption(160, 40, slice(0, 40)), (160, 120))
+    once = compositor(frame).copy()
+    assert (compositor(frame) == once).all()
+
+
+def test_compositor_with_empty_caption_is_noop():
+    """
+    A fully transparent caption leaves frames unchanged.
+    """
+    frame = np.full((120, 160, 3), 42, dtype=np.uint8)
+    result = CaptionCompositor(_caption(160, 40, slice(0, 0)), (160, 120))(frame)
+    assert (result == 42).all()
@@ -0,0 +1,47 @@
+from app.core import caption_raster
+
+
+def test_get_font_is_cached_per_font_and_size():
+    """
+    Loading the same (font, size) twice should return the same font object.
+    """
+    first = caption_raster.get_font("arial.ttf", 24)
+    assert caption_raster.get_font("arial.ttf", 24) is first
+    assert caption_raster.get_font("arial.ttf", 30) is not first
+
+
+def test_wrap_text_respects_max_width():
+    """
+    Every wrapped line must fit in max_width and no words may be lost.
+    """
+    font = caption_raster.get_font("arial.ttf", 20)
+    text = "the quick brown fox jumps over the lazy dog " * 5
+    lines = caption_raster.wrap_text(text, font, 200)
+
+    assert len(lines) > 1
+    assert " ".join(lines).split() == text.split()
+    for line in lines:
+        assert font.getlength(line) <= 200 + 1
+
+
+def test_wrap_text_puts_overlong_word_on_its_own_line():
+    """
+    A single word wider than max_width should not produce an empty line.
+    """
+    font = caption_raster.get_font("arial.ttf", 20)
+    lines = caption_raster.wrap_text("a supercalifragilisticexpialidocious b", font, 60)
+    assert "" not in lines
+    assert "supercalifragilisticexpialidocious" in lines
+
+
+def test_render_caption_is_cached():
+    """
+    Rendering the same caption for the same frame size hits the bitmap LRU.
+    """
+    caption_raster._render_caption_cached.cache_clear()
+    first = caption_raster.render_caption("Cached caption", (320, 240))
+    second = caption_raster.render_caption("Cached caption", (320, 240))
+
+    assert first is second
+    assert caption_raster._render_caption_cached.cache_info().hits == 1
+    assert first.size[0] == 320
@@ -76,3 +76,79 @@ def test_select_moments_fallback_max_moments_limit():
     max_moments = 2
     selected = select_moments_fallback(segments, theme, max_moments=max_moments)
     assert len(selected) <= max_moments
+
+
+def test_dedupe_moments_merges_overlaps_across_themes():
+    """
+    A moment picked by two themes (overlapping by at least half of the shorter
+    one) is kept once and credited to both; a slight overlap stays separate.
+    """
+    from app.core.caption_selector import dedupe_moments
+
+    selected = [
+        [{"start": 10, "end": 14, "text": "joke"}, {"start": 30, "end": 34, "text": "pun"}],
+        [{"start": 11, "end": 15, "text": "joke, longer"}, {"start": 33, "end": 37, "text": "tears"}],
+    ]
+    unique = dedupe_moments(["funny", "emotional"], selected)
+
+    assert [(m["start"], m["themes"]) for m in unique] == [
+        (10, ["funny", "emotional"]),
+        (30, ["funny"]),
+        (33, ["emotional"]),
+    ]
+    assert "themes" not in selected[0][0]
+
+
+def test_batch_selection_uses_one_gemini_call(monkeypatch):
+    """
+    Every theme is answered by one Gemini call; a theme it returns nothing
+    for falls back to NLP selection.
+    """
+    from app.config import configuration
+    from app.core import caption_selector
+    from app.services import gemini_service
+
+    calls = []
+
+    def fake_batch(transcript_segments, theme_prompts, max_moments):
+        calls.append(theme_prompts)
+        return [[{"start": 0, "end": 5, "text": "so sad"}], []]
+
+    monkeypatch.setattr(configuration, "GEMINI_API_KEY", "key")
+    monkeypatch.setattr(gemini_service, "select_key_moments_batch", fake_batch)
+    segments = [
+        {"start": 0, "end": 5, "text": "so sad"},
+        {"start": 6, "end": 9, "text": "a funny joke"},
+    ]
+    selected = caption_selector.select_key_moments_batch(segments, ["emotional", "funny"], 3)
+
+    assert calls == [["emotional", "funny"]]
+    assert selected[0] == [{"start": 0, "end": 5, "text": "so sad"}]
+    assert any("funny" in moment["text"] for moment in selected[1])
+
+
+def test_gemini_batch_response_is_mapped_to_themes(monkeypatch):
+    from types import SimpleNamespace
+    from app.services import gemini_service
+
+    reply = (
+        'Sure! {"themes": [{"theme": 2, "moments": [{"start": 6, "end": 9, "text": "joke"}]},'
+        ' {"theme": 1, "moments": [{"start": 0, "end": 5, "text": "sad"}, {"start": "bad"}]}]}'
+    )
+    prompts = []
+
+    def generate_content(prompt):
+        prompts.append(prompt)
+        return SimpleNamespace(text=reply)
+
+    monkeypatch.setattr(gemini_service, "_model", SimpleNamespace(generate_content=generate_content))
+    selected = gemini_service.select_key_moments_batch(
+        [{"start": 0, "end": 5, "text": "sad"}], ["emotional", "funny", "inspiring"], 2
+    )
+
+    assert selected == [
+        [{"start": 0.0, "end": 5.0, "text": "sad"}],
+        [{"start": 6.0, "end": 9.0, "text": "joke"}],
+        [],
+    ]
+    assert len(prompts) == 1 and "1. emotional" in prompts[0] and "3. inspiring" in prompts[0]
@@ -0,0 +1,70 @@
+import pytest
+import numpy as np
+from PIL import Image
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from app.config import configuration
+from app.core import format_writers, gif_generator
+
+
+def _frames(count=6, size=(64, 48)):
+    width, height = size
+    frames = []
+    for i in range(count):
+        frame = np.zeros((height, width, 3), dtype=np.uint8)
+        frame[8:24, 4 + 6 * i:20 + 6 * i] = (255, 128, 0)
+        frames.append(frame)
+    return frames
+
+
+@pytest.mark.parametrize("output_format, pillow_format", [("webp", "WEBP"), ("apng", "PNG")])
+def test_pillow_formats_are_animated_and_loop(tmp_path, output_format, pillow_format):
+    """
+    WebP and APNG output should decode as looping animations with every frame.
+    """
+    output_path = str(tmp_path / f"out.{format_writers.extension_for(output_format)}")
+    with format_writers.open_writer(output_path, 10, output_format) as writer:
+        for frame in _frames():
+            writer.append_data(frame)
+
+    with Image.open(output_path) as image:
+        assert image.format == pillow_format
+        assert image.n_frames == 6
+        assert image.size == (64, 48)
+        assert image.info.get("loop") == 0
+
+
+def test_mp4_writer_pads_odd_sizes(tmp_path):
+    """
+    H.264 output is padded to even dimensions and keeps the frame count.
+    """
+    output_path = str(tmp_path / "out.mp4")
+    with format_writers.open_writer(output_path, 10, "mp4") as writer:
+        for frame in _frames(count=10, size=(63, 47)):
+            writer.append_data(frame)
+
+    infos = ffmpeg_parse_infos(output_path)
+    assert infos["video_size"] == [64, 48]
+    assert infos["duration"] == pytest.approx(1.0, abs=0.15)
+
+
+def test_mimetype_for_generated_files():
+    assert format_writers.mimetype_for("abc_0.webp") == "image/webp"
+    assert format_writers.mimetype_for("abc_0.mp4") == "video/mp4"
+    assert format_writers.mimetype_for("abc_0.png") == "image/apng"
+    assert format_writers.mimetype_for("abc_0.gif") == "image/gif"
+
+
+def test_generate_captioned_gif_writes_webp(synthetic_video, tmp_path, monkeypatch):
+    """
+    The same generation function produces other formats from the captioned frames.
+    """
+    monkeypatch.setattr(configuration, "GIF_RESOLUTION", (160, 120))
+    monkeypatch.setattr(configuration, "GIF_FPS", 8)
+
+    output_path = str(tmp_path / "out.webp")
+    gif_generator.generate_captioned_gif(synthetic_video, 0, 1, "WebP caption", output_path, output_format="webp")
+
+    with Image.open(output_path) as image:
+        assert image.format == "WEBP"
+        assert image.size == (160, 120)
+        assert image.n_frames > 1
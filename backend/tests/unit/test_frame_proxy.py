@@ -0,0 +1,94 @@
+# tests/unit/test_frame_proxy.py
+
+import os
+import shutil
+import numpy as np
+import pytest
+from app.config import configuration
+from app.core import frame_proxy, gif_generator, media_info, scaling
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    """An upload folder, as proxies of retained sources live in request directories."""
+    root = tmp_path / "uploads"
+    root.mkdir()
+    monkeypatch.setattr(configuration, "UPLOAD_FOLDER", str(root))
+    return root
+
+
+def _retained(uploads, synthetic_video, request_id="req"):
+    (uploads / request_id).mkdir()
+    path = str(uploads / request_id / "source.mp4")
+    shutil.copyfile(synthetic_video, path)
+    return path
+
+
+def test_proxy_frames_match_direct_decode(uploads, synthetic_video, monkeypatch):
+    """
+    The proxy holds every GIF_FPS frame at the decoder's GIF size, each close
+    to the frame decoding the source gives for that time.
+    """
+    monkeypatch.setattr(configuration, "GIF_FPS", 12)
+    synthetic_video = _retained(uploads, synthetic_video)
+    assert frame_proxy.build(synthetic_video)
+    proxy = frame_proxy.open_proxy(synthetic_video)
+    media = media_info.load(synthetic_video)
+    scaled_size, _ = scaling.plan_resize(media.display_size)
+
+    assert proxy.size == scaled_size
+    assert proxy.frames.shape[0] == 36 and not proxy.frames.flags.writeable
+    video = media_info.open_video(media, scaled_size, resize_algorithm="lanczos")
+    with video:
+        for t in (0.0, 1.25, 2.5):
+            # The proxy's frame grid is GIF_FPS, so allow a neighbouring source frame.
+            diffs = [
+                np.abs(video.get_frame(t + k / media.fps).astype(int) - proxy.frame_at(t).astype(int)).mean()
+                for k in (-1, 0, 1) if t + k / media.fps >= 0
+            ]
+            assert min(diffs) < 2.0
+
+
+def test_renders_read_the_proxy_instead_of_decoding(uploads, synthetic_video, tmp_path, monkeypatch):
+    monkeypatch.setattr(configuration, "GIF_ENGINE", "moviepy")
+    synthetic_video = _retained(uploads, synthetic_video)
+    assert frame_proxy.build(synthetic_video)
+
+    def no_decoding(*args, **kwargs):
+        raise AssertionError("the source was decoded")
+
+    monkeypatch.setattr(media_info, "open_video", no_decoding)
+    output_path = str(tmp_path / "out.gif")
+    gif_generator.generate_captioned_gif(synthetic_video, 0.5, 1.5, "caption", output_path)
+    assert os.path.getsize(output_path) > 0
+
+    # A proxy built for other GIF settings is ignored.
+    monkeypatch.setattr(configuration, "GIF_FPS", configuration.GIF_FPS + 1)
+    assert frame_proxy.open_proxy(synthetic_video) is None
+
+
+def test_sources_over_the_size_cap_get_no_proxy(uploads, synthetic_video, monkeypatch):
+    synthetic_video = _retained(uploads, synthetic_video)
+    _, _, size = frame_proxy.plan(media_info.load(synthetic_video))
+    monkeypatch.setattr(configuration, "FRAME_PROXY_MAX_BYTES", size - 1)
+
+    assert not frame_proxy.build(synthetic_video)
+    assert not os.path.exists(synthetic_video + frame_proxy.FRAMES_SUFFIX)
+    assert frame_proxy.open_proxy(synthetic_video) is None
+
+
+def test_least_recently_used_proxies_are_evicted_to_fit_the_budget(uploads, synthetic_video, monkeypatch):
+    first, second, third = (_retained(uploads, synthetic_video, name) for name in ("a", "b", "c"))
+    _, _, size = frame_proxy.plan(media_info.load(first))
+    monkeypatch.setattr(configuration, "FRAME_PROXY_CACHE_BYTES", 2 * size)
+
+    assert frame_proxy.build(first) and frame_proxy.build(second)
+    os.utime(first + frame_proxy.INDEX_SUFFIX, (1, 1))
+    os.utime(second + frame_proxy.INDEX_SUFFIX, (2, 2))
+    # Rendering from the first makes it the most recently used.
+    assert frame_proxy.open_proxy(first) is not None
+
+    assert frame_proxy.build(third)
+    assert frame_proxy.open_proxy(second) is None
+    assert not os.path.exists(second + frame_proxy.FRAMES_SUFFIX)
+    assert frame_proxy.open_proxy(first) is not None and frame_proxy.open_proxy(third) is not None
@@ -0,0 +1,228 @@
+import io
+import numpy as np
+from PIL import Image
+from app.core import gif_encoder
+
+
+def _moving_square_frames(count=8, size=(64, 48)):
+    """Frames with a static gradient background and a small moving square."""
+    width, height = size
+    background = np.zeros((height, width, 3), dtype=np.uint8)
+    background[..., 0] = np.linspace(0, 255, width, dtype=np.uint8)[None, :]
+    background[..., 2] = np.linspace(0, 255, height, dtype=np.uint8)[:, None]
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        frame[10:18, 4 + 4 * i:12 + 4 * i] = (255, 255, 0)
+        frames.append(frame)
+    return frames
+
+
+def test_build_palette_recovers_few_distinct_colors():
+    """
+    With fewer distinct colours than palette slots, median cut should find them exactly.
+    """
+    colors = np.array([[255, 0, 0], [0, 255, 0], [0, 0, 255], [10, 20, 30]], dtype=np.uint8)
+    frame = colors[np.arange(64 * 64) % 4].reshape(64, 64, 3)
+    palette = gif_encoder.build_palette([frame], colors=16)
+
+    assert len(palette) == 4
+    assert {tuple(c) for c in palette} == {tuple(c) for c in colors}
+
+
+def test_lookup_table_maps_palette_colors_to_themselves():
+    """
+    Mapping a frame made only of palette colours should return their own indices.
+    """
+    palette = np.array([[0, 0, 0], [255, 255, 255], [200, 16, 16], [16, 200, 16]], dtype=np.uint8)
+    lut = gif_encoder.build_lookup_table(palette)
+    frame = palette[np.array([[0, 1], [2, 3]])]
+    assert (gif_encoder.map_to_palette(frame, lut) == [[0, 1], [2, 3]]).all()
+
+
+def test_changed_region_bounding_box():
+    """
+    The changed region is the tight bounding box of differing pixels.
+    """
+    previous = np.zeros((10, 10), dtype=np.uint8)
+    current = previous.copy()
+    assert gif_encoder.changed_region(previous, current) is None
+
+    current[2, 3] = 1
+    current[5, 7] = 1
+    (top, bottom, left, right), mask = gif_encoder.changed_region(previous, current)
+    assert (top, bottom, left, right) == (2, 6, 3, 8)
+    assert mask.sum() == 2
+
+
+def test_frame_delays_track_timeline():
+    """
+    Rounded centisecond delays should add up to the real clip duration.
+    """
+    delays = gif_encoder.frame_delays(12, 12)
+    assert sum(delays) == 100
+    assert set(delays) <= {8, 9}
+
+
+def test_encode_gif_round_trips_through_pillow(tmp_path):
+    """
+    Decoding the written GIF with Pillow must reproduce the palette-mapped frames
+    exactly, and later frames should only carry the moving square's region.
+    """
+    frames = _moving_square_frames()
+    output_path = str(tmp_path / "out.gif")
+    gif_encoder.encode_gif(frames, output_path, fps=10, dedupe_threshold=0)
+
+    palette, transparent, parts = gif_encoder.plan_frames(frames)
+    lut = gif_encoder.build_lookup_table(palette)
+    for left, top, indices in parts[1:]:
+        assert indices.shape[0] <= 8 and indices.shape[1] <= 12
+
+    with Image.open(output_path) as gif:
+        assert gif.n_frames == len(frames)
+        assert gif.info["loop"] == 0
+        for i, frame in enumerate(frames):
+            gif.seek(i)
+            decoded = np.asarray(gif.convert("RGB"))
+            expected = palette[gif_encoder.map_to_palette(frame, lut)]
+            assert (decoded == expected).all(), f"frame {i} differs"
+
+
+def test_encode_gif_handles_static_frames(tmp_path):
+    """
+    Unchanged frames are emitted as a 1x1 transparent tile and still decode correctly.
+    """
+    frames = [_moving_square_frames(1)[0]] * 3
+    output_path = str(tmp_path / "static.gif")
+
+    with gif_encoder.GifEncoder(output_path, fps=5, dedupe_threshold=0) as writer:
+        for frame in frames:
+            writer.append_data(frame)
+
+    with Image.open(output_path) as gif:
+        assert gif.n_frames == 3
+        gif.seek(0)
+        first = np.asarray(gif.convert("RGB"))
+        gif.seek(2)
+        assert (np.asarray(gif.convert("RGB")) == first).all()
+
+
+def test_parallel_lzw_encoding_matches_serial(tmp_path):
+    """
+    Encoding frames on several threads must produce the same byte stream as
+    encoding them serially, and the result must decode cleanly with Pillow.
+    """
+    frames = _moving_square_frames(count=12)
+    palette, transparent, parts = gif_encoder.plan_frames(frames)
+    delays = gif_encoder.frame_delays(len(frames), 12)
+
+    serial_path = tmp_path / "serial.gif"
+    parallel_path = tmp_path / "parallel.gif"
+    gif_encoder.write_gif(str(serial_path), (64, 48), palette, transparent, parts, delays, workers=1)
+    gif_encoder.write_gif(str(parallel_path), (64, 48), palette, transparent, parts, delays, workers=4)
+
+    assert serial_path.read_bytes() == parallel_path.read_bytes()
+    with Image.open(parallel_path) as gif:
+        assert gif.n_frames == len(frames)
+        for i in range(gif.n_frames):
+            gif.seek(i)
+            gif.convert("RGB").load()
+
+
+def test_drop_duplicate_frames_merges_delays():
+    """
+    Near-identical frames are dropped and their delay is added to the kept frame.
+    """
+    base = _moving_square_frames(1)[0]
+    noisy = base.copy()
+    noisy[0, 0] = 255 - noisy[0, 0]
+    moved = _moving_square_frames(3)[2]
+
+    frames, delays, dropped = gif_encoder.drop_duplicate_frames(
+        [base, noisy, base, moved], [10, 10, 10, 10], threshold=1.0
+    )
+    assert dropped == 2
+    assert delays == [30, 10]
+    assert frames[0] is base and frames[1] is moved
+
+
+def test_drop_duplicate_frames_disabled_with_zero_threshold():
+    """
+    A threshold of 0 keeps every frame.
+    """
+    frame = _moving_square_frames(1)[0]
+    frames, delays, dropped = gif_encoder.drop_duplicate_frames([frame, frame], [5, 5], threshold=0)
+    assert dropped == 0 and delays == [5, 5] and len(frames) == 2
+
+
+def test_encode_gif_dedupe_preserves_duration(tmp_path):
+    """
+    A clip with a static run encodes fewer frames but keeps its total duration.
+    """
+    frames = _moving_square_frames(4)
+    frames = frames[:1] * 6 + frames[1:]
+    output_path = str(tmp_path / "dedupe.gif")
+    gif_encoder.encode_gif(frames, output_path, fps=10, dedupe_threshold=1.0)
+
+    with Image.open(output_path) as gif:
+        assert gif.n_frames == 4
+        total = 0
+        for i in range(gif.n_frames):
+            gif.seek(i)
+            total += gif.info["duration"]
+    assert total == 900
+
+
+def test_decimate_frames_folds_delays():
+    """
+    Dropping to every n-th frame keeps the total duration.
+    """
+    frames = _moving_square_frames(5)
+    kept, delays = gif_encoder.decimate_frames(frames, [8, 9, 8, 9, 8], 2)
+    assert len(kept) == 3 and kept[1] is frames[2]
+    assert delays == [17, 17, 8]
+
+
+def test_fit_to_budget_meets_byte_budget():
+    """
+    A budget below the full-quality size is met by stepping down the ladder, and
+    the result is still a valid GIF.
+    """
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (96, 128, 3), dtype=np.uint8) for _ in range(12)]
+    delays = gif_encoder.frame_delays(len(frames), 12)
+    full, rung = gif_encoder.fit_to_budget(frames, delays, max_bytes=10 ** 9)
+    assert rung == gif_encoder.BUDGET_LADDER[0]
+
+    budget = len(full) // 3
+    data, rung = gif_encoder.fit_to_budget(frames, delays, max_bytes=budget)
+    assert len(data) <= budget
+    assert rung != gif_encoder.BUDGET_LADDER[0]
+
+    with Image.open(io.BytesIO(data)) as gif:
+        assert gif.size == (round(128 * rung[0]), round(96 * rung[0]))
+        gif.seek(gif.n_frames - 1)
+        gif.convert("RGB").load()
+
+
+def test_fit_to_budget_skips_full_size_encodes_that_cannot_fit(monkeypatch):
+    """
+    The first full-size encode is of the rung predicted to fit, not of the
+    best-quality rung.
+    """
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (96, 128, 3), dtype=np.uint8) for _ in range(12)]
+    delays = gif_encoder.frame_delays(len(frames), 12)
+    budget = len(gif_encoder.gif_bytes(frames, delays)) // 3
+
+    encodes = []
+    real_gif_bytes = gif_encoder.gif_bytes
+
+    def recording_gif_bytes(frames, delays, palette_size=256, subrectangles=True):
+        encodes.append((frames[0].shape, palette_size))
+        return real_gif_bytes(frames, delays, palette_size, subrectangles)
+
+    monkeypatch.setattr(gif_encoder, "gif_bytes", recording_gif_bytes)
+    data, rung = gif_encoder.fit_to_budget(frames, delays, max_bytes=budget)
+    assert len(data) <= budget
+    assert ((96, 128, 3), 256) not in encodes
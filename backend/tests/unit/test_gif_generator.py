@@ -0,0 +1,170 @@
+import pytest
+from PIL import Image
+from app.config import configuration
+from app.core import gif_generator, ffmpeg_renderer
+
+
+def test_build_filtergraph_contains_palette_pipeline():
+    """
+    The ffmpeg filtergraph should scale, overlay the caption and run palettegen/paletteuse.
+    """
+    graph = ffmpeg_renderer.build_filtergraph(12, (320, 180))
+    assert "fps=12" in graph
+    assert "scale=320:180" in graph
+    assert "overlay" in graph
+    assert "palettegen" in graph and "paletteuse" in graph
+
+
+def test_render_caption_image_matches_video_width():
+    """
+    The caption image should be RGBA and exactly as wide as the video.
+    """
+    img = gif_generator.render_caption_image("A short caption for the test", (320, 240))
+    assert img.mode == "RGBA"
+    assert img.size[0] == 320
+    assert img.size[1] < 240
+
+
+def test_ffmpeg_engine_renders_gif(synthetic_video, tmp_path, monkeypatch):
+    """
+    With GIF_ENGINE=ffmpeg, generate_captioned_gif should produce a GIF of the
+    configured size and duration from a synthetic clip.
+    """
+    monkeypatch.setattr(configuration, "GIF_ENGINE", "ffmpeg")
+    monkeypatch.setattr(configuration, "GIF_RESOLUTION", (160, 120))
+    monkeypatch.setattr(configuration, "GIF_FPS", 10)
+
+    output_path = str(tmp_path / "out.gif")
+    result = gif_generator.generate_captioned_gif(synthetic_video, 0.5, 2.5, "Hello from ffmpeg", output_path)
+
+    assert result == output_path
+    with Image.open(output_path) as gif:
+        assert gif.format == "GIF"
+        assert gif.size == (160, 120)
+        assert gif.n_frames == pytest.approx(20, abs=2)
+
+
+def test_ffmpeg_engine_invalid_video_raises(tmp_path, monkeypatch):
+    """
+    Failures inside ffmpeg should surface as GIFGenerationError.
+    """
+    from app.utils.error_handlers import GIFGenerationError
+
+    monkeypatch.setattr(configuration, "GIF_ENGINE", "ffmpeg")
+    bad_video = tmp_path / "bad.mp4"
+    bad_video.write_bytes(b"not a video")
+
+    with pytest.raises(GIFGenerationError):
+        gif_generator.generate_captioned_gif(str(bad_video), 0, 1, "caption", str(tmp_path / "out.gif"))
+
+
+def test_single_pass_renders_all_moments(synthetic_video, tmp_path, monkeypatch):
+    """
+    generate_captioned_gifs should open the source once and produce every GIF,
+    including overlapping and out-of-order moments, isolating a bad range.
+    """
+    monkeypatch.setattr(configuration, "GIF_ENGINE", "moviepy")
+    monkeypatch.setattr(configuration, "GIF_RESOLUTION", (160, 120))
+    monkeypatch.setattr(configuration, "GIF_FPS", 10)
+
+    opened = []
+    real_open = gif_generator.media_info.open_video
+
+    def counting_open(media, *args, **kwargs):
+        opened.append(media.path)
+        return real_open(media, *args, **kwargs)
+
+    monkeypatch.setattr(gif_generator.media_info, "open_video", counting_open)
+
+    jobs = [
+        {"start": 1.5, "end": 2.5, "caption": "late", "output_path": str(tmp_path / "late.gif")},
+        {"start": 0.0, "end": 2.0, "caption": "early", "output_path": str(tmp_path / "early.gif")},
+        {"start": 10.0, "end": 12.0, "caption": "past the end", "output_path": str(tmp_path / "none.gif")},
+    ]
+    results = gif_generator.generate_captioned_gifs(synthetic_video, jobs)
+
+    assert opened == [synthetic_video]
+    assert results[0]["output_path"] == jobs[0]["output_path"]
+    assert results[1]["output_path"] == jobs[1]["output_path"]
+    assert results[2]["output_path"] is None and results[2]["error"]
+    with Image.open(jobs[0]["output_path"]) as gif:
+        assert gif.size == (160, 120)
+        assert _duration_ms(gif) == 1000
+    with Image.open(jobs[1]["output_path"]) as gif:
+        assert _duration_ms(gif) == 2000
+
+
+def test_overlapping_moments_get_only_their_own_caption(synthetic_video, tmp_path, monkeypatch):
+    """
+    Frames shared by overlapping moments are captioned per moment: each GIF of
+    a single pass matches the GIF of its moment rendered alone. Letterboxing
+    makes the decoded frames writable, so compositing would otherwise draw on
+    the frame the other moment reads.
+    """
+    monkeypatch.setattr(configuration, "GIF_ENGINE", "moviepy")
+    monkeypatch.setattr(configuration, "GIF_RESOLUTION", (160, 90))
+    monkeypatch.setattr(configuration, "GIF_RESIZE_MODE", "pad")
+    monkeypatch.setattr(configuration, "GIF_FPS", 10)
+
+    jobs = [
+        {"start": 0.0, "end": 2.0, "caption": "First caption", "output_path": str(tmp_path / "a.gif")},
+        {"start": 1.0, "end": 2.5, "caption": "WWWW MMMM", "output_path": str(tmp_path / "b.gif")},
+    ]
+    gif_generator.generate_captioned_gifs(synthetic_video, jobs)
+    for job in jobs:
+        alone = dict(job, output_path=job["output_path"] + ".alone.gif")
+        gif_generator.generate_captioned_gifs(synthetic_video, [alone])
+        assert _frames(job["output_path"]) == _frames(alone["output_path"])
+
+
+def test_moments_share_source_frames_despite_rounding(synthetic_video, tmp_path, monkeypatch):
+    """
+    Moments are scheduled by source frame index, so times that differ only by
+    rounding still decode each frame once; the frame drawn on in place by one
+    moment never shows up in the other.
+    """
+    monkeypatch.setattr(configuration, "GIF_ENGINE", "moviepy")
+    monkeypatch.setattr(configuration, "GIF_RESOLUTION", (160, 120))
+    monkeypatch.setattr(configuration, "GIF_FPS", 10)
+    decoded = []
+    real_get_frame = gif_generator.media_info.SourceClip.get_frame
+
+    def counting_get_frame(clip, t):
+        decoded.append(t)
+        return real_get_frame(clip, t)
+
+    monkeypatch.setattr(gif_generator.media_info.SourceClip, "get_frame", counting_get_frame)
+
+    jobs = [
+        {"start": 0.5, "end": 1.5, "caption": "First caption", "output_path": str(tmp_path / "a.gif")},
+        {"start": 0.5 + 1e-9, "end": 1.5, "caption": "WWWW MMMM", "output_path": str(tmp_path / "b.gif")},
+    ]
+    gif_generator.generate_captioned_gifs(synthetic_video, jobs)
+    # Besides the first frame, read when the clip is opened.
+    assert len(decoded) == len(set(decoded)) == 1 + 10
+
+    monkeypatch.undo()
+    monkeypatch.setattr(configuration, "GIF_ENGINE", "moviepy")
+    monkeypatch.setattr(configuration, "GIF_RESOLUTION", (160, 120))
+    monkeypatch.setattr(configuration, "GIF_FPS", 10)
+    for job in jobs:
+        alone = dict(job, output_path=job["output_path"] + ".alone.gif")
+        gif_generator.generate_captioned_gifs(synthetic_video, [alone])
+        assert _frames(job["output_path"]) == _frames(alone["output_path"])
+
+
+def _frames(path):
+    frames = []
+    with Image.open(path) as gif:
+        for i in range(gif.n_frames):
+            gif.seek(i)
+            frames.append(gif.convert("RGB").tobytes())
+    return frames
+
+
+def _duration_ms(gif):
+    total = 0
+    for i in range(gif.n_frames):
+        gif.seek(i)
+        total += gif.info["duration"]
+    return total
@@ -0,0 +1,162 @@
+# tests/unit/test_jobs.py
+
+import time
+import threading
+from app.core import jobs, pipeline
+
+
+def test_sqlite_queue_lifecycle(tmp_path):
+    queue = jobs.SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"))
+    job = queue.enqueue({"request_id": "r1"})
+    assert job["status"] == "queued"
+    assert set(job["stages"]) == set(pipeline.STAGES)
+
+    claimed = queue.claim()
+    assert claimed["id"] == job["id"] and claimed["status"] == "running"
+    assert queue.claim() is None
+
+    queue.update_stage(job["id"], "download", {"status": "done", "seconds": 1.5})
+    queue.finish(job["id"], result={"gifs": []})
+    job = queue.get(job["id"])
+    assert job["status"] == "succeeded"
+    assert job["stages"]["download"] == {"status": "done", "seconds": 1.5}
+    assert job["result"] == {"gifs": []}
+    assert queue.get("missing") is None
+
+
+def test_jobs_are_claimed_once_across_threads(tmp_path):
+    queue = jobs.SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"))
+    queued = {queue.enqueue({"n": n})["id"] for n in range(20)}
+    claimed = []
+
+    def drain():
+        own = jobs.SQLiteJobQueue(queue.path)
+        while True:
+            job = own.claim()
+            if job is None:
+                return
+            claimed.append(job["id"])
+
+    threads = [threading.Thread(target=drain) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == sorted(queued)
+
+
+def test_event_log_is_followed_until_the_job_finishes(tmp_path, monkeypatch):
+    from app.config import configuration
+
+    monkeypatch.setattr(configuration, "JOB_DB_PATH", str(tmp_path / "jobs.sqlite3"))
+    jobs._reset()
+    try:
+        queue = jobs.get_queue()
+        job = queue.enqueue({"request_id": "r1"})
+        queue.add_event(job["id"], "progress", {"stage": "download", "percent": 50.0})
+
+        def finish_later():
+            queue.add_event(job["id"], "progress", {"stage": "download", "percent": 100.0})
+            queue.finish(job["id"], error="boom")
+
+        timer = threading.Timer(0.1, finish_later)
+        timer.start()
+        followed = list(jobs.follow(job["id"], poll_interval=0.01, max_seconds=10))
+        timer.join()
+
+        assert [event for _, event, _ in followed] == ["progress", "progress", "job"]
+        assert followed[-1][2] == {"status": "failed", "result": None, "error": "boom"}
+        # Resuming after an event replays only what followed it.
+        resumed = list(jobs.follow(job["id"], after=followed[0][0], poll_interval=0.01, max_seconds=10))
+        assert resumed == followed[1:]
+        # An unfinished job's stream ends at max_seconds.
+        other = queue.enqueue({"request_id": "r2"})
+        assert list(jobs.follow(other["id"], poll_interval=0.01, max_seconds=0.05)) == []
+    finally:
+        jobs._reset()
+
+
+def test_jobs_of_dead_workers_are_requeued_then_failed(tmp_path, monkeypatch):
+    from app.config import configuration
+
+    monkeypatch.setattr(configuration, "JOB_LEASE_SECONDS", 60)
+    monkeypatch.setattr(configuration, "JOB_MAX_ATTEMPTS", 2)
+    queue = jobs.SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"))
+    job = queue.enqueue({"request_id": "r1"})
+
+    def worker_dies():
+        assert queue.claim()["id"] == job["id"]
+        with queue._connect() as db:
+            db.execute("UPDATE jobs SET updated_at = updated_at - 61 WHERE id = ?", (job["id"],))
+
+    worker_dies()
+    # A heartbeating job keeps its lease.
+    other = queue.enqueue({"request_id": "r2"})
+    assert queue.claim()["id"] == job["id"]
+    assert queue.claim()["id"] == other["id"]
+    queue.heartbeat(other["id"])
+
+    with queue._connect() as db:
+        db.execute("UPDATE jobs SET updated_at = updated_at - 61 WHERE id = ?", (job["id"],))
+    assert queue.claim() is None
+    failed = queue.get(job["id"])
+    assert failed["status"] == "failed" and "stopped" in failed["error"]
+    assert queue.events(job["id"])[-1][1] == "job"
+    assert queue.get(other["id"])["status"] == "running"
+
+
+def test_workers_start_with_the_web_worker(tmp_path, monkeypatch):
+    """Jobs queued before a restart run once a web worker forks, without a new submit."""
+    import os
+    import runpy
+    from app.config import configuration
+
+    monkeypatch.setattr(configuration, "JOB_DB_PATH", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(configuration, "JOB_WORKERS", 1)
+    monkeypatch.setattr(configuration, "JOB_POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(pipeline, "generate", lambda request_id, settings, report, **arguments: {"gifs": []})
+    jobs._reset()
+    try:
+        job = jobs.get_queue().enqueue({"request_id": "r1", "settings": {}, "arguments": {"prompt": "p"}})
+        conf = runpy.run_path(os.path.join(os.path.dirname(__file__), "..", "..", "gunicorn.conf.py"))
+        conf["post_fork"](None, None)
+
+        deadline = time.monotonic() + 10
+        while jobs.get(job["id"])["status"] != "succeeded" and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert jobs.get(job["id"])["status"] == "succeeded"
+    finally:
+        jobs._reset()
+
+
+def test_jobs_waiting_too_long_for_capacity_fail_with_retry_after(tmp_path, monkeypatch):
+    from app.config import configuration
+    from app.core import admission
+
+    monkeypatch.setattr(configuration, "ADMISSION_DB_PATH", str(tmp_path / "admission.sqlite3"))
+    monkeypatch.setattr(configuration, "ADMISSION_CPU_BUDGET", 4)
+    monkeypatch.setattr(configuration, "ADMISSION_MEMORY_BUDGET", 8 * admission.GIB)
+    monkeypatch.setattr(configuration, "ADMISSION_QUEUE_MAX", 2)
+    ledger = admission.get_ledger()
+    cost = admission.Cost(cpu=4, memory=1, seconds=60)
+    ledger.admit(cost)
+    ticket = ledger.admit(cost, owned=False)
+
+    def never_runs(*args, **kwargs):
+        raise AssertionError("the job ran without capacity")
+
+    monkeypatch.setattr(pipeline, "generate", never_runs)
+    queue = jobs.SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"))
+    queue.enqueue({
+        "request_id": "r1", "settings": {}, "arguments": {"prompt": "x"},
+        "admission_ticket": ticket, "admission_cost": list(cost), "admission_timeout": 0.2,
+    })
+    job = queue.claim()
+    started = time.time()
+    jobs.run_job(job, queue)
+    assert time.time() - started < 5
+
+    failed = queue.get(job["id"])
+    assert failed["status"] == "failed" and "capacity" in failed["error"]
+    assert failed["result"]["retry_after"] > 0
+    assert ledger.stats()["queued"] == 0
@@ -0,0 +1,51 @@
+# tests/unit/test_media_info.py
+
+import numpy as np
+from app.core import media_info
+from app.utils.ffmpeg_tools import run_ffmpeg
+
+
+def test_load_probes_once_and_caches(synthetic_video, monkeypatch):
+    """
+    One probe of the container header yields the streams and duration of the
+    source, and later loads are served from the JSON cache next to it.
+    """
+    media = media_info.load(synthetic_video)
+    assert (media.width, media.height, media.fps) == (320, 240, 24.0)
+    assert abs(media.duration - 3.0) < 0.1
+    assert media.video_codec == "h264" and media.audio_codec == "aac" and media.has_audio
+
+    def fail_probe(video_path, timeout=None):
+        raise AssertionError("media info should come from the cache")
+
+    monkeypatch.setattr(media_info, "probe", fail_probe)
+    assert media_info.load(synthetic_video) == media
+
+
+def test_rotated_source_without_audio(tmp_path):
+    """
+    Rotation metadata swaps the display size, and frames read through
+    open_video come out upright.
+    """
+    source = str(tmp_path / "plain.mp4")
+    rotated = str(tmp_path / "rotated.mp4")
+    run_ffmpeg([
+        "-f", "lavfi", "-i", "testsrc=size=320x240:rate=10", "-t", "1",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p", source,
+    ])
+    run_ffmpeg(["-display_rotation", "90", "-i", source, "-c", "copy", rotated])
+
+    media = media_info.load(rotated)
+    assert not media.has_audio
+    assert media.rotation in (90, 270)
+    assert media.display_size == (240, 320)
+
+    clip = media_info.open_video(media)
+    try:
+        frame = clip.get_frame(0.5)
+    finally:
+        clip.close()
+    assert frame.shape == (320, 240, 3)
+    assert frame.dtype == np.uint8
+    # Frames are the reader's own arrays, so captions can be drawn in place.
+    assert frame.flags.writeable
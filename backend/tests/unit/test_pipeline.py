@@ -0,0 +1,38 @@
+# tests/unit/test_pipeline.py
+
+import threading
+from app.core import pipeline, transcription, caption_selector, render_pool
+
+
+def test_summary_overlaps_rendering(monkeypatch, stub_media_info, tmp_path):
+    """
+    The summary only needs the transcript: it runs while the GIFs render
+    (this render waits for it), and both results reach the response.
+    """
+    summarized = threading.Event()
+    monkeypatch.setattr(transcription, "transcribe_video", lambda video_path: [{"start": 0, "end": 2, "text": "hi"}])
+    monkeypatch.setattr(
+        caption_selector, "select_key_moments",
+        lambda transcript, prompt: [{"start": 0, "end": 2, "text": "hi"}]
+    )
+    monkeypatch.setattr(
+        caption_selector, "analyze_transcript_content",
+        lambda transcript, prompt: summarized.set() or "summary"
+    )
+
+    def render_gifs(video_path, jobs):
+        assert summarized.wait(5), "summary did not run alongside rendering"
+        return [{"output_path": job["output_path"], "error": None} for job in jobs]
+
+    monkeypatch.setattr(render_pool, "render_gifs", render_gifs)
+    reports = []
+    response = pipeline.generate(
+        "r1", "greetings",
+        settings={"GIF_OUTPUT_DIR": str(tmp_path), "MAX_VIDEO_DURATION": 600, "MAX_GIF_DURATION": 5},
+        video_path="dummy.mp4",
+        report=lambda stage, status, **details: reports.append((stage, status)),
+    )
+
+    assert response["content_analysis"] == "summary"
+    assert response["gifs"][0]["url"] == "/api/gif/download/r1_0.gif"
+    assert reports.index(("summarize", "done")) < reports.index(("render", "done"))
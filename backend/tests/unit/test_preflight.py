@@ -0,0 +1,69 @@
+# tests/unit/test_preflight.py
+
+import io
+import os
+import pytest
+from flask import Flask
+from werkzeug.datastructures import FileStorage
+from app.core import preflight
+from app.utils import storage, validation
+from app.utils.error_handlers import InvalidRequestError
+from app.utils.ffmpeg_tools import run_ffmpeg
+
+
+def test_sniff_container():
+    assert validation.sniff_container(b"\x00\x00\x00\x18ftypisom") == "mp4"
+    assert validation.sniff_container(b"\x00\x00\x00\x14ftypqt  ") == "mp4"
+    assert validation.sniff_container(b"\x1a\x45\xdf\xa3\x9f\x42\x86\x81") == "mkv"
+    assert validation.sniff_container(b"RIFF\x00\x10\x00\x00AVI LIST") == "avi"
+    assert validation.sniff_container(b"\x89PNG\r\n\x1a\n") is None
+
+
+@pytest.mark.parametrize("start, end", [
+    ("nan", "5"), ("0", "nan"), ("0", "inf"), ("-inf", "5"), ("2", "1"), ("-1", "5"), ("a", "5"),
+])
+def test_validate_time_range_rejects_bad_ranges(start, end):
+    with pytest.raises(InvalidRequestError):
+        validation.validate_time_range(start, end)
+    assert validation.validate_time_range("1.5", "4") == (1.5, 4.0)
+
+
+def test_save_uploaded_file_rejects_non_video_before_writing(tmp_path):
+    """
+    Uploads are streamed into the request directory; a file whose first bytes
+    are not a video container is rejected without being stored.
+    """
+    app = Flask(__name__)
+    app.config["UPLOAD_FOLDER"] = str(tmp_path)
+    with app.app_context():
+        upload = FileStorage(io.BytesIO(b"<html>not a video</html>"), filename="clip.mp4")
+        with pytest.raises(InvalidRequestError):
+            storage.save_uploaded_file(upload, "req")
+        assert not os.listdir(tmp_path)
+
+        content = b"\x00\x00\x00\x18ftypisom" + os.urandom(3 * storage.UPLOAD_CHUNK_SIZE)
+        path = storage.save_uploaded_file(FileStorage(io.BytesIO(content), filename="clip.mp4"), "req")
+        assert os.path.dirname(path) == str(tmp_path / "req")
+        with open(path, "rb") as f:
+            assert f.read() == content
+
+
+def test_check_source_accepts_valid_video(synthetic_video):
+    media = preflight.check_source(synthetic_video, max_duration=10)
+    assert media.has_audio and media.duration > 0
+
+
+def test_check_source_rejects_long_corrupt_and_silent(synthetic_video, tmp_path):
+    with pytest.raises(InvalidRequestError, match="maximum is 2s"):
+        preflight.check_source(synthetic_video, max_duration=2)
+
+    corrupt = tmp_path / "corrupt.mp4"
+    with open(synthetic_video, "rb") as f:
+        corrupt.write_bytes(f.read(64))
+    with pytest.raises(InvalidRequestError, match="corrupt"):
+        preflight.check_source(str(corrupt), max_duration=10)
+
+    silent = str(tmp_path / "silent.mp4")
+    run_ffmpeg(["-i", synthetic_video, "-an", "-c", "copy", silent])
+    with pytest.raises(InvalidRequestError, match="no audio"):
+        preflight.check_source(silent, max_duration=10)
@@ -0,0 +1,118 @@
+import os
+import sys
+import runpy
+import subprocess
+import pytest
+import app
+from PIL import Image
+from app.config import configuration
+from app.core import render_pool, gif_generator
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(app.__file__))
+
+
+def test_pool_size_splits_cpu_budget_across_web_workers(monkeypatch):
+    """
+    Without an explicit RENDER_WORKERS, the CPU budget is divided among web workers.
+    """
+    monkeypatch.setattr(configuration, "RENDER_WORKERS", 0)
+    monkeypatch.setattr(configuration, "RENDER_CPU_BUDGET", 8)
+    monkeypatch.setattr(configuration, "WEB_CONCURRENCY", 4)
+    assert render_pool.pool_size() == 2
+
+    monkeypatch.setattr(configuration, "WEB_CONCURRENCY", 17)
+    assert render_pool.pool_size() == 1
+
+    monkeypatch.setattr(configuration, "RENDER_WORKERS", 3)
+    assert render_pool.pool_size() == 3
+
+
+def test_gunicorn_starts_the_web_workers_the_pool_is_sized_for():
+    """gunicorn starts as many workers as the CPU budget is split across."""
+    settings = runpy.run_path(os.path.join(BACKEND_DIR, "gunicorn.conf.py"))
+    assert settings["workers"] == configuration.WEB_CONCURRENCY
+
+
+def test_render_processes_do_not_create_the_flask_app():
+    """Spawned render processes import app.core without building the web app."""
+    code = "import sys, app.core.render_pool; print('app' in vars(sys.modules['app']))"
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip().splitlines()[-1] == "False"
+
+
+def test_inline_render_isolates_failures(monkeypatch):
+    """
+    A failing render is reported in its slot without affecting the others.
+    """
+    monkeypatch.setattr(configuration, "RENDER_WORKERS", 1)
+    monkeypatch.setattr(configuration, "GIF_ENGINE", "ffmpeg")
+
+    def fake_render(video_path, start, end, caption, output_path):
+        if caption == "bad":
+            raise RuntimeError("boom")
+        return output_path
+
+    monkeypatch.setattr(gif_generator, "generate_captioned_gif", fake_render)
+    jobs = [
+        {"start": 0, "end": 1, "caption": "good", "output_path": "a.gif"},
+        {"start": 1, "end": 2, "caption": "bad", "output_path": "b.gif"},
+        {"start": 2, "end": 3, "caption": "good", "output_path": "c.gif"},
+    ]
+    results = render_pool.render_gifs("video.mp4", jobs)
+
+    assert [r["output_path"] for r in results] == ["a.gif", None, "c.gif"]
+    assert results[1]["error"] == "boom"
+
+
+def test_each_result_is_emitted_as_progress(monkeypatch):
+    from app.core import progress
+
+    monkeypatch.setattr(configuration, "RENDER_WORKERS", 1)
+    monkeypatch.setattr(configuration, "GIF_ENGINE", "ffmpeg")
+    monkeypatch.setattr(
+        gif_generator, "generate_captioned_gif",
+        lambda video_path, start, end, caption, output_path: output_path
+    )
+    jobs = [
+        {"start": 0, "end": 1, "caption": "one", "output_path": "a.gif"},
+        {"start": 1, "end": 2, "caption": "two", "output_path": "b.gif"},
+    ]
+    emitted = []
+    with progress.reporting(lambda stage, **details: emitted.append((stage, details))):
+        render_pool.render_gifs("video.mp4", jobs)
+
+    assert emitted == [
+        ("render", {"index": 0, "output_path": "a.gif", "error": None}),
+        ("render", {"index": 1, "output_path": "b.gif", "error": None}),
+    ]
+
+
+def test_process_pool_renders_in_order(synthetic_video, tmp_path, monkeypatch):
+    """
+    With more than one render process, GIFs are rendered in worker processes and
+    returned in job order; a bad job only fails its own slot.
+    """
+    monkeypatch.setattr(configuration, "RENDER_WORKERS", 2)
+    monkeypatch.setenv("GIF_ENGINE", "ffmpeg")
+    monkeypatch.setenv("GIF_RESOLUTION_WIDTH", "160")
+    monkeypatch.setenv("GIF_RESOLUTION_HEIGHT", "120")
+    render_pool._reset_executor()
+
+    jobs = [
+        {"start": 0, "end": 1, "caption": "first", "output_path": str(tmp_path / "0.gif")},
+        {"start": 0, "end": 1, "caption": "broken", "output_path": str(tmp_path / "missing" / "1.gif")},
+        {"start": 1, "end": 2, "caption": "third", "output_path": str(tmp_path / "2.gif")},
+    ]
+    try:
+        results = render_pool.render_gifs(synthetic_video, jobs)
+    finally:
+        render_pool._reset_executor()
+
+    assert results[0]["output_path"] == jobs[0]["output_path"]
+    assert results[1]["output_path"] is None and results[1]["error"]
+    assert results[2]["output_path"] == jobs[2]["output_path"]
+    for index in (0, 2):
+        with Image.open(jobs[index]["output_path"]) as gif:
+            assert gif.size == (160, 120)
@@ -0,0 +1,37 @@
+# tests/unit/test_request_cache.py
+
+import os
+import time
+from app.core import request_cache
+
+
+def test_retained_request_round_trip_and_purge(tmp_path):
+    root = tmp_path / "uploads"
+    outside = tmp_path / "completed_upload.mp4"
+    outside.write_bytes(b"video")
+
+    request_cache.record_source(str(root), "a" * 32, str(outside), None)
+    request_cache.record_transcript(str(root), "a" * 32, [{"start": 0, "end": 1, "text": "hi"}])
+    retained = request_cache.load(str(root), "a" * 32)
+
+    # Sources saved elsewhere are linked into the request, which then owns them.
+    assert os.path.dirname(retained["source"]) == str(root / ("a" * 32))
+    assert os.path.samefile(retained["source"], outside)
+    assert retained["transcript"] == [{"start": 0, "end": 1, "text": "hi"}]
+    assert request_cache.load(str(root), "b" * 32) is None
+
+    sessions = root / "_sessions"
+    (sessions / "abandoned").mkdir(parents=True)
+    (sessions / "abandoned" / "session.json").write_text("{}")
+    (sessions / "active").mkdir()
+    (sessions / "active" / "session.json").write_text("{}")
+    (root / ("b" * 32)).mkdir()
+    stale = time.time() - 3 * 3600
+    for path in (
+        root / ("a" * 32) / request_cache.MANIFEST_FILE, root / ("b" * 32), sessions, sessions / "abandoned" / "session.json"
+    ):
+        os.utime(path, (stale, stale))
+    assert request_cache.purge_expired(str(root), max_age_hours=4) == 0
+    assert request_cache.purge_expired(str(root), max_age_hours=2) == 3
+    assert sorted(os.listdir(root)) == ["_sessions"]
+    assert os.listdir(sessions) == ["active"]
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from PIL import Image
+from app.config import configuration
+from app.core import scaling, gif_generator
+from app.utils.ffmpeg_tools import run_ffmpeg
+
+
+def test_fit_preserves_aspect_ratio_of_vertical_video():
+    """
+    A 1080x1920 source fits inside 640x360 as a narrow, even-sized frame.
+    """
+    scaled, output = scaling.plan_resize((1080, 1920), (640, 360), "fit")
+    assert scaled == output == (202, 360)
+
+
+def test_fit_never_upscales():
+    scaled, output = scaling.plan_resize((320, 240), (640, 360), "fit")
+    assert scaled == output == (320, 240)
+
+
+def test_pad_letterboxes_to_box():
+    scaled, output = scaling.plan_resize((1080, 1920), (640, 360), "pad")
+    assert scaled == (202, 360)
+    assert output == (640, 360)
+    assert scaling.scale_filter(scaled, output) == "scale=202:360:flags=lanczos,pad=640:360:(ow-iw)/2:(oh-ih)/2"
+
+
+def test_stretch_ignores_aspect_ratio():
+    assert scaling.plan_resize((1080, 1920), (640, 360), "stretch") == ((640, 360), (640, 360))
+
+
+def test_letterbox_centres_frame():
+    frame = np.full((4, 2, 3), 255, dtype=np.uint8)
+    padded = scaling.Letterbox((2, 4), (6, 4))(frame)
+    assert padded.shape == (4, 6, 3)
+    assert (padded[:, 2:4] == 255).all()
+    assert padded[:, :2].sum() == 0 and padded[:, 4:].sum() == 0
+
+
+@pytest.mark.parametrize("engine", ["moviepy", "ffmpeg"])
+def test_vertical_video_is_padded_by_both_engines(tmp_path, monkeypatch, engine):
+    """
+    In pad mode both engines emit the configured size with the source centred.
+    """
+    video_path = str(tmp_path / "vertical.mp4")
+    run_ffmpeg([
+        "-f", "lavfi", "-i", "color=c=white:size=180x320:rate=10",
+        "-t", "1", "-c:v", "libx264", "-pix_fmt", "yuv420p", video_path,
+    ])
+    monkeypatch.setattr(configuration, "GIF_ENGINE", engine)
+    monkeypatch.setattr(configuration, "GIF_RESOLUTION", (320, 180))
+    monkeypatch.setattr(configuration, "GIF_RESIZE_MODE", "pad")
+    monkeypatch.setattr(configuration, "GIF_FPS", 5)
+
+    output_path = str(tmp_path / "out.gif")
+    gif_generator.generate_captioned_gif(video_path, 0, 1, "", output_path)
+
+    with Image.open(output_path) as gif:
+        assert gif.size == (320, 180)
+        frame = np.asarray(gif.convert("RGB"), dtype=np.int16)
+    assert frame[90, 160].min() > 200
+    assert frame[90, 10].max() < 40 and frame[90, 310].max() < 40
@@ -0,0 +1,66 @@
+# tests/unit/test_source_cache.py
+
+import os
+import time
+import multiprocessing
+import pytest
+from app.config import configuration
+from app.core import source_cache
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(configuration, "SOURCE_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(configuration, "SOURCE_CACHE_MAX_BYTES", 1024 * 1024)
+    return tmp_path / "cache"
+
+
+def _slow_download(directory, log_path, delay=0.5):
+    with open(log_path, "a") as log:
+        log.write("download\n")
+    time.sleep(delay)
+    path = os.path.join(directory, "source.mp4")
+    with open(path, "wb") as f:
+        f.write(b"x" * 1000)
+    return path
+
+
+def _fetch_in_process(log_path, destination_stem):
+    source_cache.fetch("abc.key", destination_stem, lambda d: _slow_download(d, log_path))
+
+
+def test_concurrent_fetches_share_one_download(cache_dir, tmp_path):
+    """
+    Requests for the same key from several processes wait on one download and
+    each get a hardlink to the cached file.
+    """
+    log_path = str(tmp_path / "downloads.log")
+    # Forked children inherit the patched configuration.
+    context = multiprocessing.get_context("fork")
+    stems = [str(tmp_path / f"request{i}" / "yt") for i in range(4)]
+    processes = [context.Process(target=_fetch_in_process, args=(log_path, stem)) for stem in stems]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+
+    with open(log_path) as log:
+        assert log.read().count("download") == 1
+    inodes = {os.stat(stem + ".mp4").st_ino for stem in stems}
+    assert len(inodes) == 1
+    assert os.stat(stems[0] + ".mp4").st_nlink == 5
+
+
+def test_least_recently_used_entries_are_evicted(cache_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(configuration, "SOURCE_CACHE_MAX_BYTES", 2500)
+    log_path = str(tmp_path / "downloads.log")
+    for key in ("a.k", "b.k"):
+        source_cache.fetch(key, str(tmp_path / f"req_{key}"), lambda d: _slow_download(d, log_path, 0))
+    time.sleep(0.01)
+    source_cache.fetch("a.k", str(tmp_path / "req_a_again"), lambda d: _slow_download(d, log_path, 0))
+    source_cache.fetch("c.k", str(tmp_path / "req_c"), lambda d: _slow_download(d, log_path, 0))
+
+    assert sorted(os.listdir(cache_dir / "entries")) == ["a.k.mp4", "c.k.mp4"]
+    # Requests keep their copies of evicted entries.
+    assert os.path.getsize(tmp_path / "req_b.k.mp4") == 1000
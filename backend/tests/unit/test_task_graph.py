@@ -0,0 +1,53 @@
+# tests/unit/test_task_graph.py
+
+import threading
+import pytest
+from app.core import progress
+from app.core.task_graph import TaskGraph
+
+
+def test_independent_branches_overlap():
+    """
+    Tasks get their dependencies' results, and a task waiting on a sibling
+    branch only finishes because the branches run concurrently.
+    """
+    sibling_ran = threading.Event()
+    graph = TaskGraph()
+    graph.add("source", lambda: 2)
+    graph.add("slow", lambda source: sibling_ran.wait(5) and source * 10, after=("source",))
+    graph.add("fast", lambda source: sibling_ran.set() or source + 1, after=("source",))
+    graph.add("join", lambda slow, fast: slow + fast, after=("slow", "fast"))
+
+    assert graph.run() == {"source": 2, "slow": 20, "fast": 3, "join": 23}
+    assert set(graph.timings) == {"source", "slow", "fast", "join"}
+    assert graph.timings["join"]["started"] >= graph.timings["slow"]["finished"]
+
+
+def test_failure_stops_dependents_and_is_raised():
+    ran = []
+    graph = TaskGraph()
+    graph.add("source", lambda: None)
+    graph.add("broken", lambda source: 1 / 0, after=("source",))
+    graph.add("sibling", lambda source: ran.append("sibling"), after=("source",))
+    graph.add("after_broken", lambda broken: ran.append("after_broken"), after=("broken",))
+
+    with pytest.raises(ZeroDivisionError):
+        graph.run()
+    assert "after_broken" not in ran
+    assert "broken" in graph.timings
+
+
+def test_tasks_run_in_the_callers_context():
+    emitted = []
+    graph = TaskGraph()
+    graph.add("a", lambda: progress.emit("a", n=1))
+    graph.add("b", lambda: progress.emit("b", n=2))
+    with progress.reporting(lambda stage, **details: emitted.append(stage)):
+        graph.run()
+    assert sorted(emitted) == ["a", "b"]
+
+
+def test_dependencies_must_exist():
+    graph = TaskGraph()
+    with pytest.raises(ValueError):
+        graph.add("b", lambda a: a, after=("a",))
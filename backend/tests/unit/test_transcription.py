@@ -0,0 +1,29 @@
+# tests/unit/test_transcription.py
+
+import importlib
+import tqdm
+from app.core import progress
+from app.core import transcription
+
+
+def test_whisper_windows_are_reported_as_progress():
+    """
+    Whisper's own progress bar (advanced once per 30s window, in mel frames)
+    feeds the pipeline's progress stream while a transcription runs, and is
+    left alone otherwise.
+    """
+    whisper_transcribe = importlib.import_module("whisper.transcribe")
+    emitted = []
+    with progress.reporting(lambda stage, **details: emitted.append((stage, details))):
+        with transcription._window_progress():
+            with transcription._window_progress():
+                pass
+            with whisper_transcribe.tqdm.tqdm(total=4500, unit="frames", disable=True) as pbar:
+                pbar.update(3000)
+                pbar.update(1500)
+    assert whisper_transcribe.tqdm is tqdm
+
+    assert emitted == [
+        ("transcribe", {"windows": 1, "seconds": 30.0, "total_seconds": 45.0, "percent": 66.7}),
+        ("transcribe", {"windows": 2, "seconds": 45.0, "total_seconds": 45.0, "percent": 100.0}),
+    ]
@@ -0,0 +1,78 @@
+# tests/unit/test_youtube_service.py
+
+import os
+import pytest
+from app.services import youtube_service
+from app.utils.error_handlers import VideoProcessingError
+
+URL = "https://www.youtube.com/watch?v=HCDVN7DCzYE"
+
+
+def test_metadata_and_download_share_one_extraction(local_youtube, synthetic_video, tmp_path):
+    """
+    The info dict extracted for the metadata is reused for the duration check
+    and the download, and the cache is keyed by video ID rather than URL.
+    """
+    assert youtube_service.get_video_metadata(URL)["length"] == 3
+    path = youtube_service.download_youtube_video(
+        URL + "&feature=share", max_duration=10, output_dir=str(tmp_path)
+    )
+    assert local_youtube == ["HCDVN7DCzYE"]
+    with open(path, "rb") as downloaded, open(synthetic_video, "rb") as source:
+        assert downloaded.read() == source.read()
+
+
+def test_info_cache_expires(local_youtube, monkeypatch):
+    monkeypatch.setattr(youtube_service.configuration, "YOUTUBE_INFO_TTL", 0)
+    youtube_service.get_video_metadata(URL)
+    youtube_service.get_video_metadata(URL)
+    assert local_youtube == ["HCDVN7DCzYE", "HCDVN7DCzYE"]
+
+
+def test_overlong_video_is_rejected_before_download(local_youtube, tmp_path):
+    with pytest.raises(VideoProcessingError, match="exceeds allowed max"):
+        youtube_service.download_youtube_video(URL, max_duration=2, output_dir=str(tmp_path / "out"))
+    assert not os.path.exists(tmp_path / "out")
+
+
+def test_audio_download_picks_smallest_audio_format(local_youtube, tmp_path):
+    path = youtube_service.download_youtube_audio(URL, max_duration=10, output_dir=str(tmp_path / "out"))
+    assert path.endswith(".m4a") and os.path.exists(path)
+    assert local_youtube == ["HCDVN7DCzYE"]
+
+
+def test_range_download_joins_frame_accurate_ranges(local_youtube, synthetic_video, tmp_path):
+    """
+    Only the requested ranges are fetched, joined back to back, and each starts
+    on the source frame at its start time.
+    """
+    import numpy as np
+    from moviepy.editor import VideoFileClip
+    from app.core import media_info
+
+    path, offsets = youtube_service.download_video_ranges(
+        URL, [(0.5, 1.5), (2.0, 2.5)], output_dir=str(tmp_path / "out"), box=(160, 120)
+    )
+    assert offsets == [0.0, 1.0]
+    media = media_info.load(path)
+    assert abs(media.duration - 1.5) < 0.1
+    assert (media.width, media.height) == (160, 120) and not media.has_audio
+
+    with VideoFileClip(path) as ranges, VideoFileClip(synthetic_video, target_resolution=(120, 160)) as source:
+        for offset, start in ((0.0, 0.5), (1.0, 2.0)):
+            frame = ranges.get_frame(offset).astype(int)
+            candidates = [start + k / 24 for k in range(-4, 5)]
+            closest = min(candidates, key=lambda t: np.abs(frame - source.get_frame(t).astype(int)).mean())
+            assert abs(closest - start) <= 1 / 24 + 1e-6
+
+
+def test_repeated_downloads_hardlink_one_cached_file(local_youtube, monkeypatch, tmp_path):
+    """
+    Once a video is in the source cache, later requests neither extract nor
+    download it again, even after the info cache has expired.
+    """
+    monkeypatch.setattr(youtube_service.configuration, "YOUTUBE_INFO_TTL", 0)
+    first = youtube_service.download_youtube_video(URL, output_dir=str(tmp_path / "req1"))
+    second = youtube_service.download_youtube_video(URL, output_dir=str(tmp_path / "req2"))
+    assert local_youtube == ["HCDVN7DCzYE"]
+    assert first != second and os.path.samefile(first, second)